@@ -1,18 +1,46 @@
 """
 Card-related API endpoints.
 """
-from typing import List
+import asyncio
+import json
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple, Union
 from fastapi import HTTPException
-from models.cards import ReactCard
-from models.requests import BoardState, FluidTypeCheckingRequest, CardDescriptionRequest
-from models.responses import TitleResponse, FluidTypeCheckingResponse, FieldValidationResult
+from fastapi.responses import StreamingResponse
+from models.cards import Card, ReactCard
+from models.requests import BoardState, FluidTypeCheckingRequest, FluidTypeCheckingBatchRequest, CardDescriptionRequest
+from models.responses import (
+    TitleResponse,
+    FluidTypeCheckingResponse,
+    FluidTypeCheckingBatchResponse,
+    FieldValidationResult,
+)
 from services.card_service import generate_card, generate_card_with_base_model
 from services.code_service import get_card_types_from_code
 from services.validation_service import perform_fluid_type_checking
 from utils.conversion import cast_react_card_to_pydantic
 from utils.type_checking import has_nested_card_fields
-import litellm
-from config.settings import FAST_MODEL_NAME
+from utils.offload import run_cpu_bound
+from services.blob_store import externalize_inline_images
+from services.speculation_service import (
+    board_digest,
+    schedule_speculation,
+    take_speculative_result,
+    cancel_session_speculation,
+)
+from services.cancellation_service import run_cancellable, GenerationCancelled
+from services.routing_service import routed_call
+from services.ledger_service import BudgetExceededError, bind_session
+from config.settings import FLUID_BATCH_CONCURRENCY, SPECULATION_ENABLED
+
+
+async def replace_inline_images(cards: list) -> None:
+    """
+    Swap base64 images in incoming cards for short image store references,
+    so they are not carried into prompts and validation.
+    """
+    if any((getattr(card, "img_source", None) or "").startswith("data:") for card in cards):
+        replaced = await run_cpu_bound(externalize_inline_images, cards, label="inline_images")
+        print(f"Moved {replaced} inline image(s) to the image store")
 
 
 async def generate_title(request: CardDescriptionRequest) -> TitleResponse:
@@ -34,9 +62,10 @@ Requirements:
 
 Title:"""
 
-        # Call LiteLLM to generate the title
-        response = litellm.completion(
-            model=FAST_MODEL_NAME,
+        # Call LiteLLM to generate the title (imported lazily, it is slow to load)
+        from litellm import acompletion
+        response = await routed_call("fast", "title", lambda model: acompletion(
+            model=model,
             messages=[
                 {
                     "role": "user", 
@@ -45,7 +74,7 @@ Title:"""
             ],
             max_tokens=20,
             temperature=0.7
-        )
+        ))
         
         # Extract the generated title
         generated_title = response.choices[0].message.content.strip()
@@ -55,6 +84,8 @@ Title:"""
         
         return TitleResponse(title=title)
         
+    except BudgetExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -62,34 +93,88 @@ Title:"""
         )
 
 
-async def generate_card_endpoint(request: BoardState) -> List[ReactCard]:
+GENERATION_STRATEGIES = {
+    "default": generate_card,
+    "base_model": generate_card_with_base_model,
+}
+
+
+async def run_generation(
+    request: BoardState,
+    strategy: str,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    scope: str = "generate",
+) -> List[ReactCard]:
+    """
+    Serve a generation from the speculative cache or run the pipeline. The pipeline is
+    cancelled if the client disconnects or a newer generation for the same session and
+    `scope` starts, and so are the session's speculative generations: their boards are
+    already stale.
+    """
+    await bind_session(request.session_id)
+    speculative_cards = await take_speculative_result(request, strategy)
+    if speculative_cards is not None:
+        return speculative_cards
+    try:
+        return await run_cancellable(
+            GENERATION_STRATEGIES[strategy](request),
+            session_id=request.session_id,
+            scope=scope,
+            is_disconnected=is_disconnected,
+        )
+    except GenerationCancelled:
+        if request.session_id:
+            cancel_session_speculation(request.session_id)
+        raise
+
+
+async def generate_card_endpoint(
+    request: BoardState,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+) -> List[ReactCard]:
     """
     Generate a new card based on the board state and intention.
     """
     try:
-        return await generate_card(request)
+        await replace_inline_images(request.cards)
+        return await run_generation(request, "default", is_disconnected)
+    except GenerationCancelled as e:
+        raise HTTPException(status_code=409, detail=f"Generation cancelled: {e.reason}")
+    except BudgetExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         print(f"Error in generate_card: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate card: {str(e)}")
 
 
-async def fluid_type_checking(request: FluidTypeCheckingRequest) -> FluidTypeCheckingResponse:
+async def load_card_types(sidepanel_code: str) -> dict:
     """
-    Perform fluid type checking on a card by validating field values against their descriptions.
+    Execute the sidepanel code and return its card types.
+
+    Raises:
+        HTTPException: 400 if the code fails or defines no card types
     """
-    try:
-        # Execute the sidepanel code to get card types
-        success, error_msg, card_types = get_card_types_from_code(request.sidepanel_code)
+    success, error_msg, card_types = await run_cpu_bound(
+        get_card_types_from_code, sidepanel_code, label="sidepanel_code"
+    )
 
-        if not success:
-            raise HTTPException(status_code=400, detail=f"Failed to execute sidepanel code: {error_msg}")
-        
-        if not card_types:
-            raise HTTPException(status_code=400, detail="No card types found in sidepanel code")
-        
+    if not success:
+        raise HTTPException(status_code=400, detail=f"Failed to execute sidepanel code: {error_msg}")
+    
+    if not card_types:
+        raise HTTPException(status_code=400, detail="No card types found in sidepanel code")
+    return card_types
+
+
+async def check_card(card: Union[ReactCard, Card], card_types: dict) -> FluidTypeCheckingResponse:
+    """
+    Perform fluid type checking on one card against already loaded card types.
+    Casting errors are reported in the response rather than raised.
+    """
+    try:
         # Check for nested card types first
-        if isinstance(request.card, ReactCard):
-            card_type_name = request.card.card_type
+        if isinstance(card, ReactCard):
+            card_type_name = card.card_type
             card_type_class = card_types.get(card_type_name)
             
             # Nested card types coming from ReactCards are not supported yet. Need to implement card reference in the
@@ -100,15 +185,13 @@ async def fluid_type_checking(request: FluidTypeCheckingRequest) -> FluidTypeChe
                 )
             
             # Cast ReactCard to the correct Pydantic card type
-            pydantic_card = cast_react_card_to_pydantic(request.card, card_types)
+            pydantic_card = cast_react_card_to_pydantic(card, card_types)
         else:
             # Already a Card instance
-            pydantic_card = request.card
-            card_type_class = card_types.get(pydantic_card.__class__.__name__)
+            pydantic_card = card
         
         # Perform fluid type checking
-        result = await perform_fluid_type_checking(pydantic_card, card_types)
-        return result
+        return await perform_fluid_type_checking(pydantic_card, card_types)
         
     except ValueError as e:
         print(f"Error in fluid_type_checking: {e}")
@@ -139,18 +222,128 @@ async def fluid_type_checking(request: FluidTypeCheckingRequest) -> FluidTypeChe
                 errors=[f"**ValidationError**: {str(e)}"], 
                 field_scores={'ValidationError': FieldValidationResult(score=0, reasoning=str(e))}
             )
+
+
+async def fluid_type_checking(request: FluidTypeCheckingRequest) -> FluidTypeCheckingResponse:
+    """
+    Perform fluid type checking on a card by validating field values against their descriptions.
+    """
+    try:
+        await replace_inline_images([request.card])
+        card_types = await load_card_types(request.sidepanel_code)
+        return await check_card(request.card, card_types)
+    except HTTPException:
+        raise
+    except BudgetExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         print(f"Error in fluid_type_checking: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to perform fluid type checking: {str(e)}")
 
 
-async def generate_card_with_base_model_endpoint(request: BoardState) -> List[ReactCard]:
+async def iter_batch_results(
+    request: FluidTypeCheckingBatchRequest
+) -> AsyncIterator[Tuple[int, FluidTypeCheckingResponse]]:
+    """
+    Load the card types once, then check all cards concurrently (at most
+    FLUID_BATCH_CONCURRENCY at a time), yielding (index, result) as cards finish.
+    A card whose check fails unexpectedly gets the error in its own result.
+    """
+    await replace_inline_images(request.cards)
+    card_types = await load_card_types(request.sidepanel_code)
+    semaphore = asyncio.Semaphore(FLUID_BATCH_CONCURRENCY)
+
+    async def check_one(index: int, card) -> Tuple[int, FluidTypeCheckingResponse]:
+        async with semaphore:
+            try:
+                return index, await check_card(card, card_types)
+            except Exception as e:
+                print(f"Error in fluid_type_checking for card {index}: {e}")
+                return index, FluidTypeCheckingResponse(
+                    errors=[f"**Error**: {str(e)}"],
+                    field_scores={'Error': FieldValidationResult(score=0, reasoning=str(e))}
+                )
+
+    tasks = [asyncio.ensure_future(check_one(index, card)) for index, card in enumerate(request.cards)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def fluid_type_checking_batch(request: FluidTypeCheckingBatchRequest) -> FluidTypeCheckingBatchResponse:
+    """
+    Perform fluid type checking on many cards sharing one copy of the sidepanel code.
+    """
+    results: List[Optional[FluidTypeCheckingResponse]] = [None] * len(request.cards)
+    async for index, result in iter_batch_results(request):
+        results[index] = result
+    return FluidTypeCheckingBatchResponse(results=results)
+
+
+async def stream_fluid_type_checking_batch(request: FluidTypeCheckingBatchRequest) -> StreamingResponse:
+    """
+    Like fluid_type_checking_batch, but streams one NDJSON line {"index", "result"} per card
+    as soon as it is checked. Sidepanel code errors are still raised before streaming starts.
+    """
+    results = iter_batch_results(request)
+    try:
+        first = await results.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    def line(index: int, result: FluidTypeCheckingResponse) -> str:
+        return json.dumps({"index": index, "result": result.model_dump()}) + "\n"
+
+    async def lines():
+        try:
+            if first is not None:
+                yield line(*first)
+                async for index, result in results:
+                    yield line(index, result)
+        finally:
+            await results.aclose()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def generate_card_with_base_model_endpoint(
+    request: BoardState,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+) -> List[ReactCard]:
     """
     Generate cards using the base model strategy with Claude completions.
     This endpoint uses the enhanced two-step approach: first generate raw notes, then cards.
     """
     try:
-        return await generate_card_with_base_model(request)
+        await replace_inline_images(request.cards)
+        return await run_generation(request, "base_model", is_disconnected)
+    except GenerationCancelled as e:
+        raise HTTPException(status_code=409, detail=f"Generation cancelled: {e.reason}")
+    except BudgetExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         print(f"Error in generate_card_with_base_model: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to generate cards with base model: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to generate cards with base model: {str(e)}")
+
+
+async def speculate_cards_endpoint(request: BoardState, strategy: str) -> dict:
+    """
+    Start generating cards for the current board in the background. A later generation
+    request with the same session and an unchanged board returns the result right away.
+    Nothing is started unless SPECULATION_ENABLED.
+    """
+    if not request.session_id:
+        raise HTTPException(status_code=400, detail="session_id is required for speculative generation")
+    
+    generate = GENERATION_STRATEGIES.get(strategy)
+    if generate is None:
+        raise HTTPException(status_code=400, detail=f"Unknown strategy: {strategy}")
+    if not SPECULATION_ENABLED:
+        return {"scheduled": False, "board_digest": board_digest(request)}
+    
+    await replace_inline_images(request.cards)
+    scheduled, digest = schedule_speculation(request, strategy, generate)
+    return {"scheduled": scheduled, "board_digest": digest}
\ No newline at end of file
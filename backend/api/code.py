@@ -4,6 +4,7 @@ Code execution API endpoints.
 from models.requests import CodeExecutionRequest
 from models.responses import CodeExecutionResponse, CardTypeConfig
 from services.code_service import execute_python_code_for_config
+from utils.offload import run_cpu_bound
 
 
 async def execute_code(request: CodeExecutionRequest) -> CodeExecutionResponse:
@@ -12,7 +13,9 @@ async def execute_code(request: CodeExecutionRequest) -> CodeExecutionResponse:
     Expected: Pydantic classes inheriting from CardLayout.
     """
     try:
-        success, error_msg, react_config = execute_python_code_for_config(request.code)
+        success, error_msg, react_config = await run_cpu_bound(
+            execute_python_code_for_config, request.code, label="sidepanel_code"
+        )
         
         if not success:
             return CodeExecutionResponse(
@@ -1,7 +1,20 @@
 """
-Image generation API endpoints.
+Image generation and storage API endpoints.
 """
-from services.image_service import generate_image_with_runware
+import json
+from typing import Optional
+from fastapi import HTTPException, Response
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from models.responses import DeferredImageResponse
+from services.image_cache import generate_cached_image, find_cached_image, regenerate_evicted_image
+from services.deferred_images import wait_for_deferred_image, iter_deferred_images
+from services.image_variants import variants_available, snap_width, choose_format, get_variant_path, record_variant_failure, VARIANT_CONTENT_TYPES
+from services.blob_store import get_image_store, image_ref_url, sniff_image_type, decode_data_url
+from utils.offload import run_cpu_bound
+from config.settings import IMAGE_UPLOAD_MAX_BYTES, IMAGE_VARIANT_WIDTHS, DEFERRED_IMAGE_MAX_WAIT_SECONDS
+
+# Blobs are content-addressed, so a given URL never changes content
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
 
 async def generate_image_endpoint(request: dict) -> dict:
@@ -10,5 +23,110 @@ async def generate_image_endpoint(request: dict) -> dict:
     if not prompt:
         return {"success": False, "error": "No prompt provided"}
     
-    image_url = await generate_image_with_runware(prompt)
-    return {"success": bool(image_url), "image_url": image_url}
\ No newline at end of file
+    image_url = await generate_cached_image(prompt)
+    return {"success": bool(image_url), "image_url": image_url}
+
+
+async def upload_image_endpoint(body: bytes) -> dict:
+    """
+    Store an uploaded image and return its content-addressed reference.
+    The body is either raw image bytes or a `data:image/...;base64,` URL.
+    """
+    if len(body) > IMAGE_UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image larger than {IMAGE_UPLOAD_MAX_BYTES} bytes")
+
+    if body[:5] == b"data:":
+        decoded = decode_data_url(body.decode("ascii", errors="ignore"))
+        if decoded is None:
+            raise HTTPException(status_code=400, detail="Invalid base64 image data URL")
+        body = decoded[0]
+
+    content_type = sniff_image_type(body)
+    if content_type is None:
+        raise HTTPException(status_code=415, detail="Unsupported image format (expected PNG, JPEG, GIF, WebP or AVIF)")
+
+    digest = await run_cpu_bound(get_image_store().put, body, label="image_store")
+    return {"digest": digest, "url": image_ref_url(digest), "content_type": content_type}
+
+
+async def serve_image_endpoint(
+    digest: str,
+    if_none_match: Optional[str],
+    width: Optional[int] = None,
+    image_format: Optional[str] = None,
+    accept: Optional[str] = None,
+) -> Response:
+    """
+    Serve a stored image with long-lived cache headers.
+    With `width` or `image_format`, serve a resized/re-encoded variant instead (see
+    image_variants.choose_format); the original is served when variants are unavailable.
+    Generated images evicted from the cache redirect to a new image of their prompt.
+    """
+    # Uploaded and inlined images first, then generated images
+    path = get_image_store().path(digest) or find_cached_image(digest)
+    if path is None:
+        # A generated image evicted from the cache: redirect to a new image of the same prompt
+        url = await regenerate_evicted_image(digest)
+        if url is None or url == image_ref_url(digest):
+            raise HTTPException(status_code=404, detail="Image not found")
+        query = "&".join(f"{name}={value}" for name, value in (("w", width), ("format", image_format)) if value is not None)
+        if query and url.startswith(image_ref_url("")):
+            url = f"{url}?{query}"
+        return RedirectResponse(url, status_code=307, headers={"Cache-Control": "no-cache"})
+
+    with open(path, "rb") as f:
+        header = f.read(32)
+    media_type = sniff_image_type(header) or "application/octet-stream"
+    etag = f'"{digest}"'
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+
+    if (width is not None or image_format is not None) and variants_available():
+        variant_width = snap_width(width) if width is not None else max(IMAGE_VARIANT_WIDTHS)
+        fmt = choose_format(image_format, accept, media_type)
+        if fmt is not None:
+            if fmt != image_format:
+                # Not the explicitly requested format (auto or unsupported): it depends on the Accept header
+                headers["Vary"] = "Accept"
+            etag = f'"{digest}-{variant_width}.{fmt}"'
+            if if_none_match and etag in if_none_match:
+                return Response(status_code=304, headers={"ETag": etag, **headers})
+            try:
+                variant_path = await get_variant_path(digest, path, variant_width, fmt)
+            except Exception as e:
+                # Pillow could not decode or encode the image, fall back to the original
+                print(f"Error rendering image variant {etag}: {e}")
+                record_variant_failure()
+                etag = f'"{digest}"'
+            else:
+                path, media_type = variant_path, VARIANT_CONTENT_TYPES[fmt]
+
+    if if_none_match and etag in if_none_match:
+        return Response(status_code=304, headers={"ETag": etag, **headers})
+    return FileResponse(path, media_type=media_type, headers={"ETag": etag, **headers})
+
+
+async def get_deferred_image_endpoint(token: str, timeout: float = 0.0) -> DeferredImageResponse:
+    """
+    Return the status of a deferred image. With a timeout (capped at
+    DEFERRED_IMAGE_MAX_WAIT_SECONDS), long-poll until it is ready or failed.
+    """
+    timeout = max(0.0, min(timeout, DEFERRED_IMAGE_MAX_WAIT_SECONDS))
+    image = await wait_for_deferred_image(token, timeout)
+    if image is None:
+        raise HTTPException(status_code=404, detail=f"Deferred image not found: {token}")
+    return DeferredImageResponse(**image)
+
+
+async def stream_deferred_images_endpoint(tokens: str, timeout: float) -> StreamingResponse:
+    """
+    Server-sent events for comma-separated tokens: one `image` event per token as soon as
+    it is ready or failed, until all are done or the timeout expires.
+    """
+    token_list = [token for token in tokens.split(",") if token]
+    timeout = max(0.0, min(timeout, DEFERRED_IMAGE_MAX_WAIT_SECONDS))
+
+    async def events():
+        async for image in iter_deferred_images(token_list, timeout):
+            yield f"event: image\ndata: {json.dumps(image)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -0,0 +1,56 @@
+"""
+Job API endpoints for long-running generation requests.
+"""
+from typing import Any, Dict, Optional
+from fastapi import HTTPException
+from models.requests import BoardState, JobGenerateRequest
+from models.responses import JobResponse
+from services.job_queue import register_job_handler, submit_job, get_job, wait_for_job, cancel_job
+from api.cards import replace_inline_images, run_generation
+from config.settings import JOB_MAX_WAIT_SECONDS
+
+
+async def run_generation_job(payload: Dict[str, Any]) -> list:
+    """
+    Run a queued card generation and return the cards as JSON-ready dicts. Jobs have their
+    own cancellation scope, so they do not supersede the session's interactive generations.
+    """
+    board = BoardState.model_validate(payload["board"])
+    cards = await run_generation(board, payload["strategy"], scope="job")
+    return [card.model_dump() for card in cards]
+
+
+register_job_handler("generate", run_generation_job)
+
+
+def _to_response(job: Optional[Dict[str, Any]], job_id: str) -> JobResponse:
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return JobResponse(**{name: job[name] for name in JobResponse.model_fields})
+
+
+async def submit_generation_job(request: JobGenerateRequest, idempotency_key: Optional[str]) -> JobResponse:
+    """
+    Queue a card generation. The Idempotency-Key header (or the idempotency_key field)
+    makes client retries return the same job instead of starting the pipeline again.
+    """
+    await replace_inline_images(request.board.cards)
+    payload = {"board": request.board.model_dump(), "strategy": request.strategy}
+    job = await submit_job("generate", payload, idempotency_key or request.idempotency_key)
+    return _to_response(job, job["id"])
+
+
+async def get_job_endpoint(job_id: str) -> JobResponse:
+    """Return the current state of a job."""
+    return _to_response(await get_job(job_id), job_id)
+
+
+async def wait_job_endpoint(job_id: str, timeout: float) -> JobResponse:
+    """Long-poll a job until it finishes or the timeout (capped at JOB_MAX_WAIT_SECONDS) expires."""
+    timeout = max(0.0, min(timeout, JOB_MAX_WAIT_SECONDS))
+    return _to_response(await wait_for_job(job_id, timeout), job_id)
+
+
+async def cancel_job_endpoint(job_id: str) -> JobResponse:
+    """Cancel a queued or running job and stop its pipeline."""
+    return _to_response(await cancel_job(job_id), job_id)
\ No newline at end of file
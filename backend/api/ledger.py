@@ -0,0 +1,21 @@
+"""
+Cost ledger API endpoints.
+"""
+from typing import Optional
+from fastapi import HTTPException
+from services.ledger_service import get_ledger, get_ledger_totals
+
+
+async def get_ledger_totals_endpoint(group_by: str, since: Optional[float], limit: int) -> dict:
+    """Tokens and estimated cost of the recorded requests, summed per endpoint or per session."""
+    if group_by not in ("endpoint", "session"):
+        raise HTTPException(status_code=400, detail="group_by must be 'endpoint' or 'session'")
+    return {"group_by": group_by, "totals": await get_ledger_totals(group_by, since, limit)}
+
+
+async def get_request_ledger_endpoint(ledger_id: str) -> dict:
+    """Return every call recorded for one request (the ID is in its X-Ledger-Id header)."""
+    ledger = await get_ledger(ledger_id)
+    if ledger is None:
+        raise HTTPException(status_code=404, detail=f"Ledger not found: {ledger_id}")
+    return ledger
@@ -0,0 +1,51 @@
+"""
+Runtime metrics and readiness API endpoints.
+"""
+from fastapi import HTTPException
+from utils.offload import get_offload_metrics
+from utils.board_serializer import get_board_metrics
+from services.speculation_service import get_speculation_metrics
+from services.job_queue import get_job_metrics
+from services.cancellation_service import get_cancellation_metrics
+from services.hedging_service import get_hedging_metrics
+from services.routing_service import get_routing_metrics
+from services.base_model_service import get_note_dedup_metrics
+from services.repair_service import get_repair_metrics
+from services.validation_service import get_validation_metrics
+from services.image_cache import get_image_cache_metrics
+from services.image_variants import get_variant_metrics
+from services.deferred_images import get_deferred_image_metrics
+from services.session_store import get_session_metrics
+from services.ledger_service import get_ledger_metrics
+from services.agent_pool import get_agent_pool_metrics
+from services.warmup_service import get_readiness
+
+
+async def get_metrics() -> dict:
+    """Collect runtime metrics from the backend subsystems."""
+    return {
+        "offload": get_offload_metrics(),
+        "board_serializer": get_board_metrics(),
+        "speculation": get_speculation_metrics(),
+        "jobs": get_job_metrics(),
+        "cancellation": get_cancellation_metrics(),
+        "hedging": get_hedging_metrics(),
+        "routing": get_routing_metrics(),
+        "note_dedup": get_note_dedup_metrics(),
+        "repair": get_repair_metrics(),
+        "validation": get_validation_metrics(),
+        "image_cache": get_image_cache_metrics(),
+        "image_variants": get_variant_metrics(),
+        "deferred_images": get_deferred_image_metrics(),
+        "sessions": get_session_metrics(),
+        "ledger": get_ledger_metrics(),
+        "agent_pool": get_agent_pool_metrics(),
+    }
+
+
+async def get_readiness_endpoint() -> dict:
+    """Report whether this worker finished warming up; 503 until it has."""
+    readiness = get_readiness()
+    if not readiness["ready"]:
+        raise HTTPException(status_code=503, detail=readiness)
+    return readiness
@@ -0,0 +1,43 @@
+"""
+Profiling API endpoints.
+"""
+from typing import Optional
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
+from services.profiling_service import (
+    is_profiling_authorized,
+    list_profiles,
+    get_profile_path,
+    render_profile,
+)
+
+
+def _check_admin_token(admin_token: Optional[str]) -> None:
+    if not is_profiling_authorized(admin_token):
+        raise HTTPException(status_code=403, detail="Profiling is disabled or the admin token is invalid")
+
+
+async def list_profiles_endpoint(admin_token: Optional[str]) -> dict:
+    """List stored request profiles."""
+    _check_admin_token(admin_token)
+    return {"profiles": list_profiles()}
+
+
+async def get_profile_endpoint(profile_id: str, admin_token: Optional[str], format: str, sort: str, limit: int):
+    """
+    Return a stored profile, either as a text summary or as the raw pstats file
+    (load it with `python -m pstats` or snakeviz).
+    """
+    _check_admin_token(admin_token)
+
+    path = get_profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+
+    if format == "pstats":
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.pstats")
+
+    try:
+        return PlainTextResponse(render_profile(profile_id, sort=sort, limit=limit))
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Invalid sort key: {sort}")
@@ -0,0 +1,69 @@
+"""
+Session persistence API endpoints.
+"""
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from models.requests import SessionSnapshotRequest, SessionDeltaRequest
+from models.responses import SessionSummary, SessionStateResponse, SearchResponse
+from services.session_store import (
+    SessionConflict,
+    search_session_cards,
+    save_session_snapshot,
+    append_session_delta,
+    get_session_state,
+    list_sessions,
+)
+from api.cards import replace_inline_images
+
+
+async def _externalize_images(cards: list) -> Dict[str, str]:
+    """Move inline images to the image store and return the new references by card id."""
+    inline = [card for card in cards if (card.img_source or "").startswith("data:")]
+    await replace_inline_images(inline)
+    return {card.id: card.img_source for card in inline if not card.img_source.startswith("data:")}
+
+
+async def save_snapshot_endpoint(session_id: str, request: SessionSnapshotRequest) -> SessionSummary:
+    """
+    Replace the saved board of a session with the full set of cards. Inline images are
+    stored once and their references returned, for the client to use from then on.
+    """
+    image_refs = await _externalize_images(request.cards)
+    cards = [card.model_dump(exclude_none=True) for card in request.cards]
+    return SessionSummary(**await save_session_snapshot(session_id, cards, request.intention), image_refs=image_refs)
+
+
+async def append_delta_endpoint(session_id: str, request: SessionDeltaRequest) -> SessionSummary:
+    """
+    Apply the cards changed and removed since the last save. A stale `base_seq` returns 409
+    with the current seq, and the client should resend a full snapshot.
+    """
+    image_refs = await _externalize_images(request.upserts)
+    upserts = [card.model_dump(exclude_none=True) for card in request.upserts]
+    try:
+        summary = await append_session_delta(session_id, upserts, request.deletes, request.intention, request.base_seq)
+    except SessionConflict as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "seq": e.actual})
+    return SessionSummary(**summary, image_refs=image_refs)
+
+
+async def get_session_endpoint(session_id: str, at: Optional[float] = None) -> SessionStateResponse:
+    """Return the latest board of a session, or the board as it was at timestamp `at`."""
+    state = await get_session_state(session_id, at)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+    return SessionStateResponse(**state)
+
+
+async def list_sessions_endpoint(limit: int, offset: int) -> List[SessionSummary]:
+    """List saved sessions, most recently updated first."""
+    return [SessionSummary(**session) for session in await list_sessions(limit, offset)]
+
+
+async def search_endpoint(query: str, limit: int, offset: int, session_id: Optional[str] = None) -> SearchResponse:
+    """Full-text search over the saved cards of all sessions, best matches first."""
+    try:
+        result = await search_session_cards(query, limit, offset, session_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return SearchResponse(query=query, limit=limit, offset=offset, **result)
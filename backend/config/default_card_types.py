@@ -0,0 +1,61 @@
+"""
+Default sidepanel code, kept identical to the initial code of the frontend SidePanel so that
+warming it up at startup serves the first requests of new boards.
+"""
+
+DEFAULT_SIDEPANEL_CODE = '''# Define your card types using Pydantic classes
+# Each class should inherit from Card
+# Use "user_only: bool = True" or "generation_only: bool = True" to restrict the card usage
+# Add the img_prompt field for image generation
+
+class Idea(Card):
+    """Unconstrained idea"""
+    title: None
+    body: Optional[str] = Field(None, description="The body of the idea, unconstrained.")
+    user_only: bool = True
+    
+class Context(Card):
+    """A raw copy paste of a ressource that is useful to add in context."""
+    title: Optional[str] = Field(None, description="The title of the ressource")
+    body: Optional[str] = Field(None, description="The raw copy paste of the ressource.")
+    user_only: bool = True
+
+class Example(Card):
+    """A concrete example."""
+    title: Optional[str] = Field(None, description="A short title defining the card")
+    body: Optional[str] = Field(None, description="The body of the example, in 1-2 sentences.")
+
+class Image(Card):
+    """A visual illustration to concretize."""
+    title: None
+    body: None
+    img_prompt: str = Field(..., description="The prompt for AI image generation. The prompt should be creative, and not instruct the creation of any diagram or any image containing text elements.")
+
+class Question(Card):
+    """A card representing a question."""
+    title: Optional[str] = Field(None, description="The question. It should be short, interogative tone and finish with interogation point.")
+    body: None
+
+class Claim(Card):
+    """A card representing a claim."""
+    title: Optional[str] = Field(None, description="A precise worded sentence making a claim. The claim should not be a tautology and should 'try to stick its head out'.'")
+    body: None
+
+class Property(Card):
+    """A card representing a property that can vary in degree. A property need to be able to have more of X or less of X, or an example need to be more of X or less of X. To check if it's a property, you need to find an example where the natural sentence 'Example E is/has more X than example B' makes sense."""
+    title: Optional[str] = Field(None, description="Short name for the property")
+    body: Optional[str] = Field(None, description="Short description.")
+    low_example: Optional[str] = Field(None, description="The title of a card in the whiteboard that has low amount of the property")
+    high_example: Optional[str] = Field(None, description="he title of a card in the whiteboard that has high amount of the property")
+
+
+class Metaphor(Card):
+    """A metaphor, or an intuition pump that translate some of the intuition to another domains."""
+    title: Optional[str] = Field(None, description="Short name for the metaphor")
+    body: Optional[str] = Field(None, description="The body of the metaphor. It should be a clearly worded")
+
+class FocusingCard(Card):
+    """A card for providing focus comments. Give a general comment when my activity is getting out of the theme OR getting out of the intention set for the session."""
+    title: str = Field(..., description="General comment about activity focus")
+    generation_only: bool = True
+'''
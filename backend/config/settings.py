@@ -1,10 +1,24 @@
 """
 Configuration settings for the Butterfly backend.
 """
+import json
+import os
 
 # Model configuration
 PYDANTIC_MODEL_NAME = "openai:gpt-5-mini-2025-08-07" #"groq:llama-3.3-70b-versatile" #"openai:gpt-5-mini-2025-08-07"
 FAST_MODEL_NAME = "groq/llama-3.3-70b-versatile"
+RAW_NOTES_MODEL_NAME = "claude-sonnet-4-20250514"
+
+
+def _model_list(env_var: str, default: str) -> list:
+    return [name.strip() for name in os.getenv(env_var, default).split(",") if name.strip()]
+
+
+# Equivalent models per role, in order of preference (comma-separated in the environment).
+# Calls go to the healthiest, fastest candidate and fail over to the next one on errors.
+STRUCTURED_MODELS = _model_list("BUTTERFLY_STRUCTURED_MODELS", PYDANTIC_MODEL_NAME)
+FAST_MODELS = _model_list("BUTTERFLY_FAST_MODELS", FAST_MODEL_NAME)
+RAW_NOTES_MODELS = _model_list("BUTTERFLY_RAW_NOTES_MODELS", RAW_NOTES_MODEL_NAME)  # Anthropic model IDs
 
 # Available colors for card types (will cycle through these)
 AVAILABLE_COLORS = [
@@ -20,6 +34,178 @@ DEFAULT_CARD_PADDING = 25
 # Image generation settings
 IMAGE_WIDTH = 512
 IMAGE_HEIGHT = 256
+IMAGE_MODEL = "runware:101@1"
 
 # CORS settings
-ALLOWED_ORIGINS = ["http://localhost:3000", "http://localhost:5173", "http://localhost:5174"]
\ No newline at end of file
+ALLOWED_ORIGINS = ["http://localhost:3000", "http://localhost:5173", "http://localhost:5174"]
+
+# CPU offload settings (0 workers runs everything inline on the event loop)
+CPU_EXECUTOR_MAX_WORKERS = int(os.getenv("BUTTERFLY_CPU_WORKERS", "4"))
+# Boards with fewer cards than this are processed inline, larger ones in the executor
+CPU_OFFLOAD_MIN_CARDS = int(os.getenv("BUTTERFLY_CPU_OFFLOAD_MIN_CARDS", "50"))
+
+# Server settings (used by `python main.py`)
+SERVER_MODE = os.getenv("BUTTERFLY_SERVER_MODE", "dev")  # "dev" (single process, reload) or "prod"
+SERVER_HOST = os.getenv("BUTTERFLY_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("BUTTERFLY_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("BUTTERFLY_WORKERS", str(os.cpu_count() or 1)))
+# Seconds in-flight requests get to finish after SIGTERM before the worker exits
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("BUTTERFLY_GRACEFUL_TIMEOUT", "30"))
+
+# Startup settings
+LOGFIRE_ENABLED = os.getenv("BUTTERFLY_LOGFIRE", "1") == "1"
+# Warm up each worker in the background right after startup instead of on the first requests:
+# import provider SDKs, compile the default card types (plus the sidepanel code in the
+# BUTTERFLY_WARMUP_CARD_TYPES file, if set), build their schemas and agents and open the
+# provider clients. GET /ready answers 503 until this is done
+WARMUP_ON_STARTUP = os.getenv("BUTTERFLY_WARMUP", "0") == "1"
+WARMUP_CARD_TYPES_FILE = os.getenv("BUTTERFLY_WARMUP_CARD_TYPES", "")
+# Also make one cheap authenticated call so the first connection is already established
+WARMUP_CONNECT = os.getenv("BUTTERFLY_WARMUP_CONNECT", "1") == "1"
+WARMUP_CONNECT_TIMEOUT = float(os.getenv("BUTTERFLY_WARMUP_CONNECT_TIMEOUT", "10"))
+
+# Per-request profiling (disabled while no admin token is set)
+PROFILING_ADMIN_TOKEN = os.getenv("BUTTERFLY_PROFILING_TOKEN", "")
+PROFILE_OUTPUT_DIR = os.getenv("BUTTERFLY_PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("BUTTERFLY_PROFILE_MAX_FILES", "50"))
+
+# Image blob store (content-addressed by SHA-256)
+IMAGE_STORE_DIR = os.getenv("BUTTERFLY_IMAGE_STORE_DIR", "data/images")
+IMAGE_UPLOAD_MAX_BYTES = int(os.getenv("BUTTERFLY_IMAGE_UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+# Base URL the browser uses to reach this backend, used to build image references
+PUBLIC_BASE_URL = os.getenv("BUTTERFLY_PUBLIC_URL", "http://localhost:8000")
+
+# JSON fast path: orjson responses and request bodies validated directly from raw bytes (opt-in)
+FAST_JSON_ENABLED = os.getenv("BUTTERFLY_FAST_JSON", "0") == "1"
+# Request bodies larger than this are validated in the CPU executor
+FAST_JSON_OFFLOAD_MIN_BYTES = int(os.getenv("BUTTERFLY_FAST_JSON_OFFLOAD_MIN_BYTES", str(256 * 1024)))
+
+# Response compression (gzip, or brotli when the `brotli` package is installed)
+COMPRESSION_ENABLED = os.getenv("BUTTERFLY_COMPRESSION", "1") == "1"
+COMPRESSION_MIN_BYTES = int(os.getenv("BUTTERFLY_COMPRESSION_MIN_BYTES", "1024"))
+# Response bodies larger than this are compressed in the CPU executor
+COMPRESSION_OFFLOAD_MIN_BYTES = int(os.getenv("BUTTERFLY_COMPRESSION_OFFLOAD_MIN_BYTES", str(256 * 1024)))
+
+# Speculative pre-generation (results are cached per worker process). Opt-in, since every
+# speculation runs the full paid pipeline whether or not its result is used
+SPECULATION_ENABLED = os.getenv("BUTTERFLY_SPECULATION", "0") == "1"
+# Minimum time between two speculations started for the same session
+SPECULATION_MIN_INTERVAL_SECONDS = float(os.getenv("BUTTERFLY_SPECULATION_MIN_INTERVAL", "120"))
+SPECULATION_MAX_PER_SESSION = int(os.getenv("BUTTERFLY_SPECULATION_MAX_PER_SESSION", "1"))
+SPECULATION_MAX_CONCURRENT = int(os.getenv("BUTTERFLY_SPECULATION_MAX_CONCURRENT", "4"))
+SPECULATION_TTL_SECONDS = float(os.getenv("BUTTERFLY_SPECULATION_TTL", "600"))
+
+# Durable job queue (SQLite, shared by all workers on the host)
+JOB_DB_PATH = os.getenv("BUTTERFLY_JOB_DB", "data/jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("BUTTERFLY_JOB_WORKERS", "2"))  # concurrent jobs per server process
+JOB_RESULT_TTL_SECONDS = float(os.getenv("BUTTERFLY_JOB_RESULT_TTL", "3600"))
+JOB_MAX_ATTEMPTS = int(os.getenv("BUTTERFLY_JOB_MAX_ATTEMPTS", "3"))
+# Running jobs whose worker has not sent a heartbeat for this long are requeued
+JOB_STALE_SECONDS = float(os.getenv("BUTTERFLY_JOB_STALE_SECONDS", "120"))
+JOB_POLL_INTERVAL_SECONDS = 0.5
+# How often a running job checks whether it was cancelled from another process
+JOB_CANCEL_CHECK_SECONDS = 2.0
+JOB_MAX_WAIT_SECONDS = 60.0
+
+# How often in-flight generations check whether their client has disconnected
+DISCONNECT_POLL_INTERVAL_SECONDS = float(os.getenv("BUTTERFLY_DISCONNECT_POLL_INTERVAL", "0.5"))
+
+# LLM call deadlines and hedging: a duplicate request is sent when a call is slower than the
+# tracked latency percentile, as long as the share of hedged calls stays under the cap
+LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("BUTTERFLY_LLM_TIMEOUT", "60"))
+AGENT_CALL_TIMEOUT_SECONDS = float(os.getenv("BUTTERFLY_AGENT_TIMEOUT", "180"))
+HEDGING_ENABLED = os.getenv("BUTTERFLY_HEDGING", "1") == "1"
+HEDGE_PERCENTILE = float(os.getenv("BUTTERFLY_HEDGE_PERCENTILE", "95"))
+HEDGE_MAX_RATIO = float(os.getenv("BUTTERFLY_HEDGE_MAX_RATIO", "0.1"))
+HEDGE_MIN_SAMPLES = 20  # latencies needed before hedging starts for a call type
+HEDGE_WINDOW = 200  # recent calls used for percentiles and the hedge ratio
+
+# Raw note deduplication (base model strategy): notes whose word-shingle Jaccard similarity
+# with an already kept note reaches the threshold are dropped (1.0 drops only exact duplicates)
+NOTE_DEDUP_THRESHOLD = float(os.getenv("BUTTERFLY_NOTE_DEDUP_THRESHOLD", "0.6"))
+# Issue completions in waves (one per suffix) and stop once a wave brings too few novel notes
+NOTE_EARLY_STOP = os.getenv("BUTTERFLY_NOTE_EARLY_STOP", "0") == "1"
+NOTE_MIN_NOVELTY = float(os.getenv("BUTTERFLY_NOTE_MIN_NOVELTY", "0.34"))
+
+# Model routing health: a model whose recent error rate reaches the limit is skipped
+# (unless every candidate is unhealthy) until the cooldown has passed
+ROUTER_WINDOW = 50  # recent calls per model used for latency and error rate
+ROUTER_MIN_SAMPLES = 3  # calls before a model's latency is used for ranking
+ROUTER_MAX_ERROR_RATE = float(os.getenv("BUTTERFLY_ROUTER_MAX_ERROR_RATE", "0.5"))
+ROUTER_COOLDOWN_SECONDS = float(os.getenv("BUTTERFLY_ROUTER_COOLDOWN", "30"))
+
+# Cards failing fluid type checking get their failing fields regenerated up to this many
+# times; cards still failing afterwards are dropped from the response (0 disables repair)
+REPAIR_MAX_ATTEMPTS = int(os.getenv("BUTTERFLY_REPAIR_ATTEMPTS", "2"))
+
+# Distilled fluid type check scorer: LLM verdicts can be logged to train a local model
+# (`python train_scorer.py`); fields it scores with enough confidence skip the LLM, and a
+# small sample of those is still sent to the LLM to measure live agreement
+# Opt-in, since verdicts include the users' field values
+VERDICT_LOG_ENABLED = os.getenv("BUTTERFLY_VERDICT_LOG", "0") == "1"
+# Only the latest verdicts of each card type field are kept
+VERDICT_MAX_PER_FIELD = int(os.getenv("BUTTERFLY_VERDICT_MAX_PER_FIELD", "1000"))
+VERDICT_DB_PATH = os.getenv("BUTTERFLY_VERDICT_DB", "data/verdicts.sqlite3")
+SCORER_MODEL_PATH = os.getenv("BUTTERFLY_SCORER_MODEL", "data/fluid_scorer.json")
+SCORER_CONFIDENCE = float(os.getenv("BUTTERFLY_SCORER_CONFIDENCE", "0.9"))
+SCORER_SHADOW_RATE = float(os.getenv("BUTTERFLY_SCORER_SHADOW_RATE", "0.05"))
+
+# Cards of a /fluid-type-checking/batch request validated at the same time
+FLUID_BATCH_CONCURRENCY = int(os.getenv("BUTTERFLY_FLUID_BATCH_CONCURRENCY", "8"))
+
+# Generated image cache: images are keyed by (normalized prompt, model, width, height), downloaded
+# from the provider and served from /images; least recently used images are evicted over the cap
+IMAGE_CACHE_ENABLED = os.getenv("BUTTERFLY_IMAGE_CACHE", "1") == "1"
+IMAGE_CACHE_DIR = os.getenv("BUTTERFLY_IMAGE_CACHE_DIR", "data/image_cache")
+IMAGE_CACHE_DB_PATH = os.getenv("BUTTERFLY_IMAGE_CACHE_DB", "data/image_cache.sqlite3")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("BUTTERFLY_IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Image variants (`GET /images/{digest}?w=256&format=webp`), rendered lazily with Pillow when it
+# is installed; requested widths are rounded up to one of these so few variants exist per image
+IMAGE_VARIANT_DIR = os.getenv("BUTTERFLY_IMAGE_VARIANT_DIR", "data/image_variants")
+IMAGE_VARIANT_WIDTHS = [int(width) for width in os.getenv("BUTTERFLY_IMAGE_VARIANT_WIDTHS", "128,256,512").split(",")]
+IMAGE_VARIANT_QUALITY = int(os.getenv("BUTTERFLY_IMAGE_VARIANT_QUALITY", "80"))
+
+# Deferred images (`defer_images` in a generation request): tokens are resolved through
+# /deferred-images; a token still pending after the TTL is reported as failed
+DEFERRED_IMAGE_TTL_SECONDS = float(os.getenv("BUTTERFLY_DEFERRED_IMAGE_TTL", "600"))
+DEFERRED_IMAGE_POLL_INTERVAL_SECONDS = 0.5
+DEFERRED_IMAGE_MAX_WAIT_SECONDS = 60.0
+
+# Session store: boards saved as card-level deltas, compacted into a snapshot every N deltas
+SESSION_DB_PATH = os.getenv("BUTTERFLY_SESSION_DB", "data/sessions.sqlite3")
+SESSION_SNAPSHOT_EVERY = int(os.getenv("BUTTERFLY_SESSION_SNAPSHOT_EVERY", "50"))
+
+# Board serialization in prompts: card positions and sizes are rounded to this quantum;
+# the "groups" layout clusters cards closer than BOARD_GROUP_GAP and gives each cluster's
+# area instead of per-card coordinates
+BOARD_LAYOUT = os.getenv("BUTTERFLY_BOARD_LAYOUT", "coordinates")
+BOARD_COORDINATE_QUANTUM = int(os.getenv("BUTTERFLY_BOARD_QUANTUM", "50"))
+BOARD_GROUP_GAP = int(os.getenv("BUTTERFLY_BOARD_GROUP_GAP", "100"))
+
+# Cost ledger: every LLM and image call is recorded per request with its tokens, latency and
+# estimated cost (X-Request-Cost header, GET /ledger). Budgets are in USD, 0 disables them;
+# a request or session that has spent its budget gets 429 on its next call
+LEDGER_ENABLED = os.getenv("BUTTERFLY_LEDGER", "1") == "1"
+LEDGER_DB_PATH = os.getenv("BUTTERFLY_LEDGER_DB", "data/ledger.sqlite3")
+REQUEST_BUDGET_USD = float(os.getenv("BUTTERFLY_REQUEST_BUDGET_USD", "0"))
+SESSION_BUDGET_USD = float(os.getenv("BUTTERFLY_SESSION_BUDGET_USD", "0"))
+# Each call reserves its estimated cost against the budgets until it finishes: the cost of the
+# last call of the same kind and model, or this many input tokens (and a quarter as many
+# output tokens) for the first one
+BUDGET_RESERVE_TOKENS = int(os.getenv("BUTTERFLY_BUDGET_RESERVE_TOKENS", "4000"))
+# USD per million input, output and cached input tokens, matched with or without the provider
+# prefix; add or override models with BUTTERFLY_MODEL_PRICES='{"model": [input, output, cached]}'
+MODEL_PRICES = {
+    "gpt-5-mini-2025-08-07": (0.25, 2.0, 0.025),
+    "llama-3.3-70b-versatile": (0.59, 0.79, 0.59),
+    "claude-sonnet-4-20250514": (3.0, 15.0, 0.30),
+    **{name: tuple(prices) for name, prices in json.loads(os.getenv("BUTTERFLY_MODEL_PRICES", "{}")).items()},
+}
+IMAGE_COST_USD = float(os.getenv("BUTTERFLY_IMAGE_COST_USD", "0.002"))
+
+# Compiled sidepanel card types (per distinct code) and pydantic-ai agents (per model and
+# output types) reused across requests; agents unused for the idle time are dropped
+CARD_TYPES_CACHE_SIZE = int(os.getenv("BUTTERFLY_CARD_TYPES_CACHE_SIZE", "64"))
+AGENT_POOL_SIZE = int(os.getenv("BUTTERFLY_AGENT_POOL_SIZE", "64"))
+AGENT_POOL_IDLE_SECONDS = float(os.getenv("BUTTERFLY_AGENT_POOL_IDLE_SECONDS", "3600"))
@@ -4,51 +4,120 @@ Butterfly Backend API
 A simple FastAPI server with LiteLLM integration for card management.
 """
 
-import os
-import logfire
-import nest_asyncio
-from typing import List
-from fastapi import FastAPI
+import argparse
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
+# Load environment variables before the settings module reads them
+load_dotenv()
+
 # Import models
 from models.cards import ReactCard
 from models.requests import (
     CardDescriptionRequest, 
     CodeExecutionRequest, 
     BoardState, 
-    FluidTypeCheckingRequest
+    FluidTypeCheckingRequest,
+    FluidTypeCheckingBatchRequest,
+    JobGenerateRequest,
+    SessionSnapshotRequest,
+    SessionDeltaRequest
 )
 from models.responses import (
     TitleResponse, 
     CodeExecutionResponse, 
-    FluidTypeCheckingResponse
+    FluidTypeCheckingResponse,
+    FluidTypeCheckingBatchResponse,
+    DeferredImageResponse,
+    JobResponse,
+    SessionSummary,
+    SessionStateResponse,
+    SearchResponse
 )
 
 # Import API handlers
-from api.cards import generate_title, generate_card_endpoint, generate_card_with_base_model_endpoint, fluid_type_checking
+from api.cards import (
+    generate_title,
+    generate_card_endpoint,
+    generate_card_with_base_model_endpoint,
+    fluid_type_checking,
+    fluid_type_checking_batch,
+    stream_fluid_type_checking_batch,
+    speculate_cards_endpoint,
+)
 from api.code import execute_code
-from api.images import generate_image_endpoint
+from api.images import (
+    generate_image_endpoint,
+    upload_image_endpoint,
+    serve_image_endpoint,
+    get_deferred_image_endpoint,
+    stream_deferred_images_endpoint,
+)
+from api.metrics import get_metrics, get_readiness_endpoint
+from api.jobs import submit_generation_job, get_job_endpoint, wait_job_endpoint, cancel_job_endpoint
+from api.sessions import (
+    save_snapshot_endpoint,
+    append_delta_endpoint,
+    get_session_endpoint,
+    list_sessions_endpoint,
+    search_endpoint,
+)
+from api.ledger import get_ledger_totals_endpoint, get_request_ledger_endpoint
+from api.profiles import list_profiles_endpoint, get_profile_endpoint
+
+from services.clients import close_clients
+from services.warmup_service import start_warmup
+from services.profiling_service import profiling_requested, run_profiled, buffer_body
+from services.job_queue import start_job_workers, stop_job_workers
+from services.deferred_images import cancel_deferred_images
+from services.ledger_service import open_ledger, close_ledger, bind_session, save_ledger, ledger_header
+from utils.offload import shutdown_cpu_executor
+from utils.fast_json import FastJSONResponse, body_of
+from utils.compression import CompressionMiddleware
 
 # Import configuration
-from config.settings import ALLOWED_ORIGINS
+from config.settings import (
+    ALLOWED_ORIGINS,
+    SERVER_MODE,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_WORKERS,
+    SERVER_GRACEFUL_TIMEOUT,
+    FAST_JSON_ENABLED,
+    COMPRESSION_ENABLED,
+    COMPRESSION_MIN_BYTES,
+    COMPRESSION_OFFLOAD_MIN_BYTES,
+)
 
-# Apply nested asyncio for compatibility
-nest_asyncio.apply()
 
-# Configure logging
-logfire.configure()  
-logfire.instrument_pydantic_ai() 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Per-worker startup and teardown of shared resources."""
+    # Provider SDKs, card types and agents load lazily; optionally prepare them now without
+    # delaying startup, and only report the worker ready (GET /ready) once that is done
+    warmup_task = start_warmup()
+    await start_job_workers()
+    yield
+    # Jobs still running are requeued and picked up by another worker
+    await stop_job_workers()
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    await cancel_deferred_images()
+    # Uvicorn only gets here once in-flight requests have drained (or the graceful timeout expired)
+    await close_clients()
+    shutdown_cpu_executor(wait=False)
 
-# Load environment variables
-load_dotenv()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Butterfly Backend",
     description="FastAPI backend for Butterfly card management",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
+    **({"default_response_class": FastJSONResponse} if FAST_JSON_ENABLED else {})
 )
 
 # Add CORS middleware to allow frontend requests
@@ -58,38 +127,140 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-Cost", "X-Ledger-Id"],
 )
 
+if COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware, minimum_size=COMPRESSION_MIN_BYTES, offload_size=COMPRESSION_OFFLOAD_MIN_BYTES
+    )
+
+
+@app.middleware("http")
+async def profiling_middleware(request: Request, call_next):
+    """
+    Run a single request under cProfile when asked with an admin token. The response body is
+    produced inside the profile, so profiled streaming responses (NDJSON, SSE) are buffered
+    and sent at once.
+    """
+    if not profiling_requested(request.headers, request.query_params):
+        return await call_next(request)
+
+    async def call():
+        return await buffer_body(await call_next(request))
+
+    response, profile_id = await run_profiled(call, label=request.url.path)
+    if profile_id:
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+@app.middleware("http")
+async def ledger_middleware(request: Request, call_next):
+    """Record the LLM and image calls of each request and report their cost in headers."""
+    ledger, token = open_ledger(request.url.path)
+    if ledger is None:
+        return await call_next(request)
+    try:
+        # Generation requests also bind the session_id of their board
+        await bind_session(request.headers.get("x-session-id"))
+        response = await call_next(request)
+    except Exception:
+        await save_ledger(ledger)
+        raise
+    finally:
+        close_ledger(token)
+
+    if ledger.entries:
+        response.headers["X-Request-Cost"] = ledger_header(ledger)
+        response.headers["X-Ledger-Id"] = ledger.id
+    # Streamed bodies can still make calls after the headers are sent: save once the body is done
+    body_iterator = response.body_iterator
+
+    async def body():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            await save_ledger(ledger)
+
+    response.body_iterator = body()
+    return response
+
 
 # API Routes
 @app.post("/generate-title", response_model=TitleResponse)
-async def generate_title_endpoint(request: CardDescriptionRequest):
+async def generate_title_endpoint(request: CardDescriptionRequest = body_of(CardDescriptionRequest)):
     """Generate a concise title from a card description using AI."""
     return await generate_title(request)
 
 
 @app.post("/execute-code", response_model=CodeExecutionResponse)
-async def execute_code_endpoint(request: CodeExecutionRequest):
+async def execute_code_endpoint(request: CodeExecutionRequest = body_of(CodeExecutionRequest)):
     """Execute Python code safely and return card type configurations."""
     return await execute_code(request)
 
 
 @app.post("/fluid-type-checking", response_model=FluidTypeCheckingResponse)
-async def fluid_type_checking_endpoint(request: FluidTypeCheckingRequest):
+async def fluid_type_checking_endpoint(request: FluidTypeCheckingRequest = body_of(FluidTypeCheckingRequest)):
     """Perform fluid type checking on a card by validating field values against their descriptions."""
     return await fluid_type_checking(request)
 
 
+@app.post("/fluid-type-checking/batch", response_model=FluidTypeCheckingBatchResponse)
+async def fluid_type_checking_batch_endpoint(
+    request: FluidTypeCheckingBatchRequest = body_of(FluidTypeCheckingBatchRequest),
+    stream: bool = False
+):
+    """Fluid type check many cards with one copy of the sidepanel code; `stream=true` returns NDJSON as cards finish."""
+    if stream:
+        return await stream_fluid_type_checking_batch(request)
+    return await fluid_type_checking_batch(request)
+
+
 @app.post("/generate-card", response_model=List[ReactCard])
-async def generate_card_route(request: BoardState):
+async def generate_card_route(http_request: Request, request: BoardState = body_of(BoardState)):
     """Generate a new card based on the board state and intention."""
-    return await generate_card_endpoint(request)
+    return await generate_card_endpoint(request, http_request.is_disconnected)
 
 
 @app.post("/generate-card-base-model", response_model=List[ReactCard])
-async def generate_card_base_model_route(request: BoardState):
+async def generate_card_base_model_route(http_request: Request, request: BoardState = body_of(BoardState)):
     """Generate cards using the enhanced base model strategy with Claude completions."""
-    return await generate_card_with_base_model_endpoint(request)
+    return await generate_card_with_base_model_endpoint(request, http_request.is_disconnected)
+
+
+@app.post("/speculate", status_code=202)
+async def speculate_route(request: BoardState = body_of(BoardState), strategy: str = "base_model"):
+    """Pre-generate cards for a session's current board so the next generation request returns instantly."""
+    return await speculate_cards_endpoint(request, strategy)
+
+
+@app.post("/jobs/generate", response_model=JobResponse, status_code=202)
+async def submit_generation_job_route(
+    request: JobGenerateRequest = body_of(JobGenerateRequest),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """Queue a card generation and return its job ID immediately."""
+    return await submit_generation_job(request, idempotency_key)
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job_route(job_id: str):
+    """Poll the state and result of a job."""
+    return await get_job_endpoint(job_id)
+
+
+@app.delete("/jobs/{job_id}", response_model=JobResponse)
+async def cancel_job_route(job_id: str):
+    """Cancel a queued or running job."""
+    return await cancel_job_endpoint(job_id)
+
+
+@app.get("/jobs/{job_id}/wait", response_model=JobResponse)
+async def wait_job_route(job_id: str, timeout: float = 30.0):
+    """Long-poll a job until it finishes or the timeout expires."""
+    return await wait_job_endpoint(job_id, timeout)
 
 
 @app.post("/generate-image")
@@ -98,14 +269,145 @@ async def generate_image_route(request: dict):
     return await generate_image_endpoint(request)
 
 
+@app.post("/images")
+async def upload_image_route(request: Request):
+    """Upload an image (raw bytes or base64 data URL) and get back a short URL reference."""
+    return await upload_image_endpoint(await request.body())
+
+
+@app.get("/deferred-images", response_model=None)
+async def stream_deferred_images_route(tokens: str, timeout: float = 60.0):
+    """Stream server-sent events as the deferred images of the given comma-separated tokens finish."""
+    return await stream_deferred_images_endpoint(tokens, timeout)
+
+
+@app.get("/deferred-images/{token}", response_model=DeferredImageResponse)
+async def get_deferred_image_route(token: str, timeout: float = 0.0):
+    """Poll (or long-poll with `timeout`) an image deferred with `defer_images`."""
+    return await get_deferred_image_endpoint(token, timeout)
+
+
+@app.get("/images/{digest}")
+async def serve_image_route(
+    digest: str,
+    w: Optional[int] = Query(None, gt=0, description="Resize to at most this width (rounded up to a variant width)"),
+    format: Optional[str] = Query(None, description="avif, webp, jpeg, png or auto (best format the client accepts)"),
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None)
+):
+    """Serve a stored image by its SHA-256 digest, optionally as a resized/re-encoded variant."""
+    return await serve_image_endpoint(digest, if_none_match, w, format, accept)
+
+
+@app.get("/sessions", response_model=List[SessionSummary])
+async def list_sessions_route(limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    """List saved sessions, most recently updated first."""
+    return await list_sessions_endpoint(limit, offset)
+
+
+@app.get("/sessions/{session_id}", response_model=SessionStateResponse)
+async def get_session_route(
+    session_id: str,
+    at: Optional[float] = Query(None, description="Unix timestamp to rebuild the board at; latest if omitted")
+):
+    """Fetch the latest saved board of a session, or the board at a past timestamp."""
+    return await get_session_endpoint(session_id, at)
+
+
+@app.post("/sessions/{session_id}/snapshot", response_model=SessionSummary)
+async def save_session_snapshot_route(session_id: str, request: SessionSnapshotRequest = body_of(SessionSnapshotRequest)):
+    """Save the full board of a session."""
+    return await save_snapshot_endpoint(session_id, request)
+
+
+@app.post("/sessions/{session_id}/deltas", response_model=SessionSummary)
+async def append_session_delta_route(session_id: str, request: SessionDeltaRequest = body_of(SessionDeltaRequest)):
+    """Save the cards changed and removed since the last save of a session."""
+    return await append_delta_endpoint(session_id, request)
+
+
+@app.get("/search", response_model=SearchResponse)
+async def search_route(
+    q: str = Query(..., min_length=1, description="Words to search for in card titles, bodies and extra fields"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    session_id: Optional[str] = Query(None, description="Only search this session")
+):
+    """Search the cards of all saved sessions, ranked by relevance."""
+    return await search_endpoint(q, limit, offset, session_id)
+
+
+@app.get("/ledger")
+async def ledger_totals_route(
+    group_by: str = Query("endpoint", description="endpoint or session"),
+    since: Optional[float] = Query(None, description="Only count requests after this Unix timestamp"),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Tokens and estimated cost of LLM and image calls, summed per endpoint or per session."""
+    return await get_ledger_totals_endpoint(group_by, since, limit)
+
+
+@app.get("/ledger/{ledger_id}")
+async def request_ledger_route(ledger_id: str):
+    """Every LLM and image call made for one request, from its X-Ledger-Id header."""
+    return await get_request_ledger_endpoint(ledger_id)
+
+
+@app.get("/ready")
+async def readiness_route():
+    """Readiness probe: 503 while the worker is still warming up."""
+    return await get_readiness_endpoint()
+
+
+@app.get("/metrics")
+async def metrics_route():
+    """Return runtime metrics such as CPU offload queueing delays."""
+    return await get_metrics()
+
+
+@app.get("/profiles")
+async def list_profiles_route(x_admin_token: Optional[str] = Header(None)):
+    """List stored request profiles (requires the X-Admin-Token header)."""
+    return await list_profiles_endpoint(x_admin_token)
+
+
+@app.get("/profiles/{profile_id}")
+async def get_profile_route(
+    profile_id: str,
+    format: str = "text",
+    sort: str = "cumulative",
+    limit: int = 50,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Return a stored request profile as text or as a raw pstats file (?format=pstats)."""
+    return await get_profile_endpoint(profile_id, x_admin_token, format, sort, limit)
+
+
+def server_options(mode: str, host: str, port: int, workers: int) -> dict:
+    """Keyword arguments for uvicorn.run in the given mode."""
+    if mode == "prod":
+        # Each worker is a separate process with its own event loop and lifespan.
+        # On SIGTERM uvicorn stops accepting connections and waits for in-flight requests.
+        return {
+            "host": host,
+            "port": port,
+            "workers": workers,
+            "timeout_graceful_shutdown": SERVER_GRACEFUL_TIMEOUT,
+            "proxy_headers": True,
+            "log_level": "info",
+        }
+    return {"host": host, "port": port, "reload": True, "log_level": "info"}
+
+
 if __name__ == "__main__":
     import uvicorn
-    
-    # Run the server
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    )
\ No newline at end of file
+
+    parser = argparse.ArgumentParser(description="Run the Butterfly backend")
+    parser.add_argument("--mode", choices=["dev", "prod"], default=SERVER_MODE,
+                        help="dev: single process with auto-reload, prod: multiple workers")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    args = parser.parse_args()
+
+    uvicorn.run("main:app", **server_options(args.mode, args.host, args.port, args.workers))
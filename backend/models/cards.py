@@ -1,7 +1,7 @@
 """
 Base Card model and related types.
 """
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -27,5 +27,12 @@ class ReactCard(BaseModel):
     card_type: str
     img_prompt: Optional[str] = None
     img_source: Optional[str] = None
+    img_token: Optional[str] = None  # image still being generated, resolve with GET /deferred-images/{token}
     extra_fields: Optional[dict[str, str]] = None
-    createdAt: Optional[float] = None  # seconds since session start
\ No newline at end of file
+    createdAt: Optional[float] = None  # seconds since session start
+    repaired_fields: Optional[List[str]] = None  # fields regenerated after failing fluid type checking
+
+
+class SessionCard(ReactCard):
+    """A card saved in the session store, identified by its whiteboard shape ID."""
+    id: str
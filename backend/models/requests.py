@@ -1,9 +1,9 @@
 """
 Request models for API endpoints.
 """
-from typing import Union, List
+from typing import Literal, Optional, Union, List
 from pydantic import BaseModel, Field
-from .cards import ReactCard, Card
+from .cards import ReactCard, Card, SessionCard
 
 
 class CardDescriptionRequest(BaseModel):
@@ -18,8 +18,34 @@ class BoardState(BaseModel):
     cards: List[ReactCard]
     sidepanel_code: str = Field(..., description="Python code from the sidepanel defining card types")
     intention: str = Field(..., description="User's intention/goal for the session")
+    session_id: Optional[str] = Field(None, description="Identifier of the user's session, enables per-session caching")
+    defer_images: bool = Field(False, description="Return cards before their images are generated, with an img_token to resolve later")
+    past_context: int = Field(0, ge=0, le=20, description="Number of cards from other saved sessions matching the intention to add to the prompt")
 
 
 class FluidTypeCheckingRequest(BaseModel):
     card: Union[ReactCard, Card]
-    sidepanel_code: str
\ No newline at end of file
+    sidepanel_code: str
+
+
+class FluidTypeCheckingBatchRequest(BaseModel):
+    cards: List[Union[ReactCard, Card]]
+    sidepanel_code: str
+
+
+class JobGenerateRequest(BaseModel):
+    board: BoardState
+    strategy: Literal["default", "base_model"] = Field("base_model", description="Generation pipeline to run")
+    idempotency_key: Optional[str] = Field(None, description="Retries with the same key return the existing job")
+
+
+class SessionSnapshotRequest(BaseModel):
+    cards: List[SessionCard]
+    intention: Optional[str] = None
+
+
+class SessionDeltaRequest(BaseModel):
+    upserts: List[SessionCard] = Field(default=[], description="Cards added or changed since the last save")
+    deletes: List[str] = Field(default=[], description="IDs of cards removed since the last save")
+    intention: Optional[str] = None
+    base_seq: Optional[int] = Field(None, description="Sequence number the delta applies to; a mismatch is rejected with 409")
@@ -1,8 +1,9 @@
 """
 Response models for API endpoints.
 """
-from typing import Optional, Dict, List, Union
+from typing import Any, Optional, Dict, List, Union
 from pydantic import BaseModel, Field
+from .cards import SessionCard
 
 
 class TitleResponse(BaseModel):
@@ -32,4 +33,64 @@ class FluidTypeCheckLLMResponse(BaseModel):
 
 class FluidTypeCheckingResponse(BaseModel):
     errors: List[str] = Field(default=[], description="List of error messages for fields with score < 5")
-    field_scores: Dict[str, FieldValidationResult] = Field(default={}, description="Detailed scores and reasoning for each field")
\ No newline at end of file
+    field_scores: Dict[str, FieldValidationResult] = Field(default={}, description="Detailed scores and reasoning for each field")
+
+
+class FluidTypeCheckingBatchResponse(BaseModel):
+    results: List[FluidTypeCheckingResponse] = Field(..., description="One result per card, in request order")
+
+
+class DeferredImageResponse(BaseModel):
+    token: str
+    status: str = Field(..., description="pending, ready or failed")
+    url: Optional[str] = None
+
+
+class JobResponse(BaseModel):
+    id: str
+    kind: str
+    status: str = Field(..., description="queued, running, succeeded, failed or cancelled")
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    attempts: int = 0
+    result: Optional[Any] = None
+    error: Optional[str] = None
+
+
+class SessionSummary(BaseModel):
+    session_id: str
+    intention: Optional[str] = None
+    created_at: float
+    updated_at: float
+    seq: int = Field(..., description="Number of saves applied to the session")
+    card_count: int
+    image_refs: Dict[str, str] = Field(
+        default_factory=dict,
+        description="Image store references that replaced inline images in this save, by card id",
+    )
+
+
+class SessionStateResponse(BaseModel):
+    session_id: str
+    seq: int
+    timestamp: float = Field(..., description="Time of the last save included in this state")
+    intention: Optional[str] = None
+    cards: List[SessionCard]
+
+
+class SearchHit(BaseModel):
+    session_id: str
+    intention: Optional[str] = None
+    updated_at: float
+    score: float = Field(..., description="BM25 relevance, higher is better")
+    snippet: str = Field(..., description="Matching excerpt with terms wrapped in <mark> tags")
+    card: SessionCard
+
+
+class SearchResponse(BaseModel):
+    query: str
+    total: int
+    limit: int
+    offset: int
+    hits: List[SearchHit]
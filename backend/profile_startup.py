@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Startup profiler for the Butterfly backend.
+
+Imports the app in a fresh interpreter under `python -X importtime` and writes a
+summary of the slowest imports to a file.
+
+Usage:
+    python profile_startup.py [--module main] [--output startup_profile.txt] [--top 30]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+
+def run_importtime(module: str) -> Tuple[List[Tuple[int, int, int, str]], float]:
+    """
+    Import `module` in a subprocess with -X importtime.
+    Returns the parsed (self_us, cumulative_us, depth, name) rows and the wall time in seconds.
+    """
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+
+    wall_time = float(result.stdout.strip().splitlines()[-1])
+    return rows, wall_time
+
+
+def build_report(module: str, rows: List[Tuple[int, int, int, str]], wall_time: float, top: int) -> str:
+    """Format the slowest imports and the per-package totals as plain text."""
+    per_package: Dict[str, int] = defaultdict(int)
+    for self_us, _, _, name in rows:
+        per_package[name.split(".")[0]] += self_us
+
+    lines = [
+        f"Startup import profile for `{module}`",
+        f"Wall time: {wall_time:.3f}s, modules imported: {len(rows)}",
+        "",
+        f"Top {top} packages by total self time:",
+    ]
+    for package, total_us in sorted(per_package.items(), key=lambda item: item[1], reverse=True)[:top]:
+        lines.append(f"  {total_us / 1000:9.1f} ms  {package}")
+
+    lines += ["", f"Top {top} imports by cumulative time:"]
+    for self_us, cumulative_us, depth, name in sorted(rows, key=lambda row: row[1], reverse=True)[:top]:
+        lines.append(f"  {cumulative_us / 1000:9.1f} ms  (self {self_us / 1000:7.1f} ms)  {'  ' * depth}{name}")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile backend import time")
+    parser.add_argument("--module", default="main", help="Module to import (default: main)")
+    parser.add_argument("--output", default="startup_profile.txt", help="Where to write the report")
+    parser.add_argument("--top", type=int, default=30, help="Number of entries per section")
+    args = parser.parse_args()
+
+    rows, wall_time = run_importtime(args.module)
+    report = build_report(args.module, rows, wall_time, args.top)
+    with open(args.output, "w") as f:
+        f.write(report)
+    print(report)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
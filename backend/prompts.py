@@ -1,5 +1,17 @@
 # %%
-def create_card_generation_prompt(intention: str, board_json: str, available_types: list[str], pydantic_classes_description: str) -> str:
+def past_notes_section(past_notes: str) -> str:
+    """Prompt section with cards recalled from the user's other sessions, empty if there are none."""
+    if not past_notes:
+        return ""
+    return f"""
+## Notes from past sessions
+Cards the user wrote in earlier sessions on related topics. Build on them, don't repeat them.
+
+{past_notes}
+"""
+
+
+def create_card_generation_prompt(intention: str, board_json: str, available_types: list[str], pydantic_classes_description: str, past_notes: str = "") -> str:
     """
     Create a complete prompt for card generation including user intention and constraints.
     
@@ -7,6 +19,7 @@ def create_card_generation_prompt(intention: str, board_json: str, available_typ
         intention: User's stated intention/goal
         board_json: JSON representation of current board state
         available_types: List of available card type names
+        past_notes: Cards recalled from other sessions, one per line
     
     Returns:
         Complete formatted prompt string
@@ -17,7 +30,7 @@ Global user's thinking goal: {intention}
 
 ## Current state of the board
 {board_json}
-
+{past_notes_section(past_notes)}
 ## Answer format
 You must respond with one of the following card types: [{', '.join(available_types)}] following the json format.
 
@@ -58,3 +71,29 @@ The card should be relevant to the user's stated intention: "{intention}"
 
 
 # %%
+
+
+def create_field_repair_prompt(intention: str, card_type: str, card_json: str, field_feedback: str) -> str:
+    """
+    Create a prompt asking to rewrite only the fields of a card that failed fluid type checking.
+    
+    Args:
+        intention: User's stated intention/goal
+        card_type: Name of the card type
+        card_json: JSON representation of the generated card
+        field_feedback: One line per failing field with its description, score and reasoning
+    
+    Returns:
+        Complete formatted prompt string
+    """
+    return f"""A card of type {card_type} was generated for a whiteboard, but some of its fields do not match their description.
+
+Global user's thinking goal: {intention}
+
+## Generated card
+{card_json}
+
+## Fields to rewrite
+{field_feedback}
+
+Rewrite only these fields so that each value matches its description, keeping the meaning of the rest of the card. Respond with the rewritten fields only."""
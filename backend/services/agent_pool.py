@@ -0,0 +1,104 @@
+"""
+Pool of pydantic-ai agents reused across requests, keyed by model and output types.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Sequence, Tuple, Union
+from config.settings import AGENT_POOL_SIZE, AGENT_POOL_IDLE_SECONDS
+
+if TYPE_CHECKING:
+    from pydantic_ai import Agent
+
+OutputTypes = Union[type, Sequence[type]]
+
+
+def _model_key(model: Any) -> Any:
+    # Models are given either as "provider:name" strings or as model instances
+    return model if isinstance(model, str) else id(model)
+
+
+def _output_key(output_type: OutputTypes) -> Tuple[type, ...]:
+    if isinstance(output_type, type):
+        return (output_type,)
+    return tuple(output_type)
+
+
+class AgentPool:
+    """
+    Bounded least-recently-used pool of agents. Agents hold no per-run state, so one agent is
+    shared by every request using the same model and output types, and its output schema is
+    built once. Agents unused for `idle_seconds` are dropped, e.g. when the sidepanel code
+    that defined their card types was changed. Safe to use from threads and the event loop.
+    """
+
+    def __init__(self, max_size: int, idle_seconds: float):
+        self.max_size = max_size
+        self.idle_seconds = idle_seconds
+        self._agents: "OrderedDict[Tuple[Any, Tuple[type, ...]], Tuple['Agent', float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, model: Any, output_type: OutputTypes) -> "Agent":
+        """Return the agent for `model` and `output_type`, creating it on first use."""
+        key = (_model_key(model), _output_key(output_type))
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._agents.get(key)
+            if entry is not None:
+                self._agents[key] = (entry[0], now, entry[2])
+                self._agents.move_to_end(key)
+                self.metrics["hits"] += 1
+                return entry[0]
+            self.metrics["misses"] += 1
+
+        from pydantic_ai import Agent
+
+        # Building the output schema is the expensive part, keep it outside the lock
+        agent = Agent(model, output_type=output_type)
+        if self.max_size <= 0:
+            return agent
+        with self._lock:
+            # Keep a reference to the model so its id is not reused while it is a key
+            entry = self._agents.setdefault(key, (agent, now, model))
+            while len(self._agents) > self.max_size:
+                self._agents.popitem(last=False)
+                self.metrics["evictions"] += 1
+        return entry[0]
+
+    def _evict_idle(self, now: float) -> None:
+        while self._agents:
+            key, (_, last_used, _) = next(iter(self._agents.items()))
+            if now - last_used <= self.idle_seconds:
+                break
+            del self._agents[key]
+            self.metrics["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._agents.clear()
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+
+_pool = AgentPool(AGENT_POOL_SIZE, AGENT_POOL_IDLE_SECONDS)
+
+
+def get_agent(model: Any, output_type: OutputTypes) -> "Agent":
+    """Return a shared agent producing `output_type` with `model`."""
+    return _pool.get(model, output_type)
+
+
+def get_agent_pool_metrics() -> Dict[str, Any]:
+    """Return agent reuse counters and the compiled card type cache counters."""
+    from services.code_service import get_card_types_cache_metrics
+
+    lookups = _pool.metrics["hits"] + _pool.metrics["misses"]
+    return {
+        **_pool.metrics,
+        "size": len(_pool),
+        "hit_rate": _pool.metrics["hits"] / lookups if lookups else 0.0,
+        "card_types": get_card_types_cache_metrics(),
+    }
@@ -2,10 +2,20 @@
 Service for base model card generation using Claude completion.
 """
 import asyncio
-from typing import List, Optional
-import anthropic
+from typing import List, Optional, Tuple
 from models.requests import BoardState
 from models.cards import ReactCard
+from utils.offload import run_cpu_bound
+from utils.board_serializer import serialize_board
+from services.clients import get_anthropic_client
+from services.routing_service import routed_call
+from services.agent_pool import get_agent
+from utils.dedup import find_novel
+from prompts import past_notes_section
+from config.settings import NOTE_DEDUP_THRESHOLD, NOTE_EARLY_STOP, NOTE_MIN_NOVELTY
+
+# Running totals of the raw note deduplication, reported in /metrics
+_note_dedup_metrics = {"notes_generated": 0, "notes_dropped": 0, "tokens_saved": 0, "completions_skipped": 0}
 
 
 def board_to_bullet_point(board_state: BoardState) -> str:
@@ -48,17 +58,17 @@ async def call_anthropic(prompt: str) -> str:
     """
     Call Anthropic Claude API with a completion-style prompt.
     """
-    client = anthropic.AsyncAnthropic()
+    client = get_anthropic_client()
     USER_MESSAGE = "<cmd>cat Untitled.txt</cmd>"
     
-    response = await client.messages.create(
-        model="claude-sonnet-4-20250514",
+    response = await routed_call("raw_notes", "raw_notes", lambda model: client.messages.create(
+        model=model,
         max_tokens=100,
         messages=[
             {"role": "user", "content": USER_MESSAGE},
             {"role": "assistant", "content": prompt}
         ]
-    )
+    ))
     
     try:
         return response.content[0].text
@@ -75,12 +85,56 @@ async def complete_prompts(prompts: List[str]) -> List[str]:
     return responses
 
 
+async def complete_prompts_until_saturated(prompts: List[str], wave_size: int) -> List[str]:
+    """
+    Complete prompts in waves of `wave_size`, stopping early once a wave contributes
+    fewer than NOTE_MIN_NOVELTY novel notes. Returns the responses that were obtained.
+    """
+    responses: List[str] = []
+    seen = []
+    for wave_start in range(0, len(prompts), wave_size):
+        wave_responses = await complete_prompts(prompts[wave_start:wave_start + wave_size])
+        responses.extend(wave_responses)
+        novel_indices, seen = find_novel(wave_responses, NOTE_DEDUP_THRESHOLD, seen)
+        if wave_start > 0 and len(novel_indices) / len(wave_responses) < NOTE_MIN_NOVELTY:
+            skipped = len(prompts) - len(responses)
+            _note_dedup_metrics["completions_skipped"] += skipped
+            print(f"Raw notes saturated, skipping {skipped} remaining completions")
+            break
+    return responses
+
+
+def dedupe_raw_notes(prompts: List[str], responses: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Drop near-duplicate notes before they are concatenated into the final prompt.
+    Returns the kept (prompts, responses) pairs.
+    """
+    kept_indices, _ = find_novel(responses, NOTE_DEDUP_THRESHOLD)
+    kept = set(kept_indices)
+    dropped = [response for i, response in enumerate(responses) if i not in kept]
+    # Rough estimate: ~4 characters per token, plus ~80 characters of header and prompt tail per note
+    tokens_saved = sum(len(note) + 80 for note in dropped) // 4
+
+    _note_dedup_metrics["notes_generated"] += len(responses)
+    _note_dedup_metrics["notes_dropped"] += len(dropped)
+    _note_dedup_metrics["tokens_saved"] += tokens_saved
+    if dropped:
+        print(f"Dropped {len(dropped)}/{len(responses)} near-duplicate raw notes (~{tokens_saved} tokens saved)")
+    return [prompts[i] for i in kept_indices], [responses[i] for i in kept_indices]
+
+
+def get_note_dedup_metrics() -> dict:
+    """Return running totals of the raw note deduplication."""
+    return dict(_note_dedup_metrics)
+
+
 def create_base_model_to_card_list_prompt(
     intention: str, 
     board_json: str, 
     available_types: List[str], 
     pydantic_classes_description: str, 
-    raw_notes: str
+    raw_notes: str,
+    past_notes: str = ""
 ) -> str:
     """
     Create the specialized prompt for base model card generation.
@@ -104,7 +158,7 @@ The intention of the user is to think about {intention}
 ## Board state
 
 {board_json}
-
+{past_notes_section(past_notes)}
 ## Raw notes
 
 {raw_notes}
@@ -132,11 +186,46 @@ Example output:
 """
 
 
+def build_base_model_card_prompt(board_state: BoardState, card_types: dict, raw_notes: str, past_notes: str = "") -> str:
+    """
+    Build the final structured-generation prompt from the board, the card type schemas and the raw notes.
+    """
+    available_types = list(card_types.keys())
+    card_descriptions = [
+        f"**{name}**\n\n {pydantic_type.model_json_schema()}" 
+        for name, pydantic_type in card_types.items()
+    ]
+    
+    # Cast ReactCards to pydantic cards before giving to prompt
+    from utils.conversion import cast_react_card_to_pydantic
+    pydantic_cards = []
+    for react_card in board_state.cards:
+        try:
+            pydantic_card = cast_react_card_to_pydantic(react_card, card_types)
+            pydantic_cards.append(pydantic_card)
+        except ValueError as e:
+            print(f"Warning: Could not cast card {react_card.card_type} to pydantic: {e}")
+            # Skip cards that can't be cast
+            continue
+    
+    board = serialize_board(pydantic_cards)
+    print(f"Board of {len(pydantic_cards)} card(s) serialized to ~{board.tokens} tokens ({'cl100k' if board.tokenized else 'length'} estimate)")
+    return create_base_model_to_card_list_prompt(
+        intention=board_state.intention,
+        board_json=board.text,
+        available_types=available_types,
+        pydantic_classes_description=str(card_descriptions),
+        raw_notes=raw_notes,
+        past_notes=past_notes
+    )
+
+
 async def generate_cards_with_base_model_strategy(
     board_state: BoardState,
     card_types: dict,
     suffixes: Optional[List[str]] = None,
-    N: int = 3
+    N: int = 3,
+    past_notes: str = ""
 ) -> List[ReactCard]:
     """
     Generate cards using the base model strategy with Claude completions.
@@ -146,6 +235,7 @@ async def generate_cards_with_base_model_strategy(
         card_types: Dictionary of available card types
         suffixes: List of prompt suffixes to generate different perspectives
         N: Number of completions to generate per suffix
+        past_notes: Cards recalled from other sessions, added to the structured prompt
     
     Returns:
         List of generated ReactCard objects
@@ -158,14 +248,21 @@ async def generate_cards_with_base_model_strategy(
         ]
     
     # Generate prompts for Claude completion
-    board_bullet_points = board_to_bullet_point(board_state)
+    board_bullet_points = await run_cpu_bound(
+        board_to_bullet_point, board_state, size=len(board_state.cards), label="bullet_points"
+    )
     prompts = []
     
-    for suffix in suffixes:
-        prompts.extend([board_bullet_points + suffix] * N)
+    # Interleave suffixes so that each wave of completions covers every perspective
+    for _ in range(N):
+        prompts.extend(board_bullet_points + suffix for suffix in suffixes)
     
     # Get responses from Claude
-    responses = await complete_prompts(prompts)
+    if NOTE_EARLY_STOP:
+        responses = await complete_prompts_until_saturated(prompts, wave_size=len(suffixes))
+    else:
+        responses = await complete_prompts(prompts)
+    prompts, responses = dedupe_raw_notes(prompts[:len(responses)], responses)
     
     # Concatenate responses into raw notes
     responses_concat = ""
@@ -174,40 +271,28 @@ async def generate_cards_with_base_model_strategy(
         responses_concat += "..." + prompts[i][-50:] + response
     
     # Create the final card generation prompt
-    available_types = list(card_types.keys())
-    card_descriptions = [
-        f"**{name}**\n\n {pydantic_type.model_json_schema()}" 
-        for name, pydantic_type in card_types.items()
-    ]
-    
-    # Cast ReactCards to pydantic cards before giving to prompt
-    from utils.conversion import cast_react_card_to_pydantic
-    pydantic_cards = []
-    for react_card in board_state.cards:
-        try:
-            pydantic_card = cast_react_card_to_pydantic(react_card, card_types)
-            pydantic_cards.append(pydantic_card)
-        except ValueError as e:
-            print(f"Warning: Could not cast card {react_card.card_type} to pydantic: {e}")
-            # Skip cards that can't be cast
-            continue
-    
-    base_prompt = create_base_model_to_card_list_prompt(
-        intention=board_state.intention,
-        board_json=str(pydantic_cards),
-        available_types=available_types,
-        pydantic_classes_description=str(card_descriptions),
-        raw_notes=responses_concat
+    base_prompt = await run_cpu_bound(
+        build_base_model_card_prompt,
+        board_state,
+        card_types,
+        responses_concat,
+        past_notes,
+        size=len(board_state.cards),
+        label="base_model_prompt",
     )
     
     # Generate cards using pydantic-ai
-    from pydantic_ai import Agent
-    from config.settings import PYDANTIC_MODEL_NAME
+    from config.settings import AGENT_CALL_TIMEOUT_SECONDS
+    from utils.observability import configure_observability
+    configure_observability()
     
     card_type_classes = list(card_types.values())
-    agent = Agent(PYDANTIC_MODEL_NAME, output_type=card_type_classes)
-    
-    result = await agent.run(base_prompt)
+    result = await routed_call(
+        "structured",
+        "generate_cards",
+        lambda model: get_agent(model, card_type_classes).run(base_prompt),
+        timeout=AGENT_CALL_TIMEOUT_SECONDS,
+    )
     pydantic_card = result.output
     
     # Convert to ReactCards
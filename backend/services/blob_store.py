@@ -0,0 +1,142 @@
+"""
+Content-addressed image storage on local disk.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from typing import Iterable, Optional, Tuple
+from models.cards import Card, ReactCard
+from config.settings import IMAGE_STORE_DIR, PUBLIC_BASE_URL
+
+_DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+_DATA_URL_PATTERN = re.compile(r"^data:(image/[A-Za-z0-9.+-]+);base64,", re.IGNORECASE)
+
+# Leading bytes of the raster formats we accept (SVG is refused since it can carry scripts)
+_IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def sniff_image_type(data: bytes) -> Optional[str]:
+    """Detect the MIME type of image bytes from their header, or None if not a known image format."""
+    for signature, content_type in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    return None
+
+
+def decode_data_url(value: str) -> Optional[Tuple[bytes, str]]:
+    """
+    Decode a `data:image/...;base64,` URL.
+    Returns (bytes, declared MIME type), or None if the value is not a base64 image data URL.
+    """
+    match = _DATA_URL_PATTERN.match(value)
+    if not match:
+        return None
+    try:
+        data = base64.b64decode(value[match.end():], validate=False)
+    except (binascii.Error, ValueError):
+        return None
+    return data, match.group(1).lower()
+
+
+class BlobStore:
+    """
+    Stores blobs under `<root>/<first two hex digits>/<sha256>`.
+    Writes are atomic and idempotent: storing the same bytes twice returns the same digest.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data: bytes) -> str:
+        """Store bytes and return their SHA-256 hex digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if os.path.exists(path):
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest
+
+    def path(self, digest: str) -> Optional[str]:
+        """Return the file path of a stored blob, or None if the digest is invalid or unknown."""
+        if not _DIGEST_PATTERN.match(digest):
+            return None
+        path = self._path(digest)
+        return path if os.path.isfile(path) else None
+
+    def read(self, digest: str) -> Optional[bytes]:
+        """Return the bytes of a stored blob, or None if it is unknown."""
+        path = self.path(digest)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def delete(self, digest: str) -> bool:
+        """Delete a stored blob. Returns whether it existed."""
+        path = self.path(digest)
+        if path is None:
+            return False
+        os.remove(path)
+        return True
+
+
+_image_store: Optional[BlobStore] = None
+
+
+def get_image_store() -> BlobStore:
+    """Return the store holding uploaded and inlined card images."""
+    global _image_store
+    if _image_store is None:
+        _image_store = BlobStore(IMAGE_STORE_DIR)
+    return _image_store
+
+
+def image_ref_url(digest: str) -> str:
+    """Build the short URL that replaces an inline image in a card."""
+    return f"{PUBLIC_BASE_URL}/images/{digest}"
+
+
+def externalize_inline_images(cards: Iterable[object]) -> int:
+    """
+    Move base64 `img_source` data URLs into the image store and replace them with
+    short references, in place. Returns the number of images replaced.
+    """
+    store = get_image_store()
+    replaced = 0
+    for card in cards:
+        if not isinstance(card, (ReactCard, Card)):
+            continue
+        img_source = getattr(card, "img_source", None)
+        if not img_source or not img_source.startswith("data:"):
+            continue
+        decoded = decode_data_url(img_source)
+        if decoded is None or sniff_image_type(decoded[0]) is None:
+            continue
+        card.img_source = image_ref_url(store.put(decoded[0]))
+        replaced += 1
+    return replaced
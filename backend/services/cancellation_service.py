@@ -0,0 +1,84 @@
+"""
+Service for cancelling generation work that nobody is waiting for anymore.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+from config.settings import DISCONNECT_POLL_INTERVAL_SECONDS
+
+T = TypeVar("T")
+
+
+class GenerationCancelled(Exception):
+    """Raised when generation work was cancelled because its result is no longer wanted."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+# (session_id, scope) -> the task currently doing work for that session
+_active: Dict[Tuple[str, str], asyncio.Task] = {}
+# Tasks cancelled on purpose, with the reason
+_cancel_reasons: Dict[asyncio.Task, str] = {}
+_metrics = {"superseded": 0, "disconnected": 0}
+
+
+def _cancel(task: asyncio.Task, reason: str) -> None:
+    if not task.done():
+        _cancel_reasons[task] = reason
+        _metrics[reason] += 1
+        task.cancel()
+
+
+async def _watch_disconnect(task: asyncio.Task, is_disconnected: Callable[[], Awaitable[bool]]) -> None:
+    while not task.done():
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL_SECONDS)
+        if await is_disconnected():
+            _cancel(task, "disconnected")
+            return
+
+
+async def run_cancellable(
+    work: Awaitable[T],
+    session_id: Optional[str] = None,
+    scope: str = "generate",
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+) -> T:
+    """
+    Run `work` as a task that is cancelled, together with everything it awaits
+    (provider HTTP calls, gathered completions, semaphore slots), when:
+      - the client disconnects (`is_disconnected` returns True), or
+      - a newer call with the same session_id and scope starts.
+
+    Raises:
+        GenerationCancelled: if the work was cancelled for one of these reasons
+    """
+    task = asyncio.ensure_future(work)
+    key = (session_id, scope) if session_id else None
+    if key is not None:
+        previous = _active.get(key)
+        if previous is not None:
+            _cancel(previous, "superseded")
+        _active[key] = task
+
+    watcher = asyncio.create_task(_watch_disconnect(task, is_disconnected)) if is_disconnected else None
+    try:
+        return await task
+    except asyncio.CancelledError:
+        reason = _cancel_reasons.pop(task, None)
+        if reason is None:
+            # Our caller was cancelled: make sure the work stops too
+            task.cancel()
+            raise
+        raise GenerationCancelled(reason)
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        if key is not None and _active.get(key) is task:
+            del _active[key]
+        _cancel_reasons.pop(task, None)
+
+
+def get_cancellation_metrics() -> Dict[str, int]:
+    """Return how many tasks were cancelled per reason, and how many are tracked."""
+    return {**_metrics, "active_sessions": len(_active)}
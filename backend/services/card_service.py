@@ -2,17 +2,90 @@
 Service for card generation and processing.
 """
 from typing import List
-from pydantic_ai import Agent, UnexpectedModelBehavior
 from models.cards import ReactCard
 from models.requests import BoardState, FluidTypeCheckingRequest
 from utils.conversion import pydantic_to_react_content
-from utils.type_checking import has_nested_card_fields
 from services.code_service import get_card_types_from_code
-from services.validation_service import perform_fluid_type_checking
-from services.image_service import generate_image_with_runware
+from services.agent_pool import get_agent
+from services.repair_service import validate_and_repair_cards
+from services.image_cache import generate_cached_image
+from services.deferred_images import defer_card_images
 from services.base_model_service import generate_cards_with_base_model_strategy
+from services.session_store import search_session_cards
+from utils.offload import run_cpu_bound
+from utils.board_serializer import serialize_board
+from utils.observability import configure_observability
 from prompts import create_card_generation_prompt
-from config.settings import PYDANTIC_MODEL_NAME
+from services.routing_service import routed_call, AllModelsFailedError
+from config.settings import AGENT_CALL_TIMEOUT_SECONDS
+
+
+def build_card_generation_prompt(request: BoardState, card_types: dict, past_notes: str = "") -> str:
+    """
+    Render the board and the card type schemas into the card generation prompt.
+    """
+    available_types = list(card_types.keys())
+
+    card_descriptions = [f"**{name}**\n\n {pydantic_type.schema()}" for name, pydantic_type in card_types.items()]
+    board = serialize_board(request.cards)
+    print(f"Board of {len(request.cards)} card(s) serialized to ~{board.tokens} tokens ({'cl100k' if board.tokenized else 'length'} estimate)")
+    return create_card_generation_prompt(
+        intention=request.intention,
+        board_json=board.text,
+        available_types=available_types,
+        pydantic_classes_description=str(card_descriptions),
+        past_notes=past_notes
+    )
+
+
+def format_past_cards(hits: List[dict]) -> str:
+    """Render search hits as one `- [card_type] title: body` line per card."""
+    lines = []
+    for hit in hits:
+        card = hit["card"]
+        lines.append(f"- [{card.get('card_type', '')}] {card.get('title', '')}: {card.get('body', '')}")
+    return "\n".join(lines)
+
+
+async def recall_past_cards(request: BoardState) -> str:
+    """
+    Return the `past_context` cards from other saved sessions that best match the intention,
+    formatted for the generation prompt, or an empty string.
+    """
+    if not request.past_context:
+        return ""
+    try:
+        result = await search_session_cards(
+            request.intention,
+            limit=request.past_context,
+            exclude_session_id=request.session_id,
+            any_term=True,
+        )
+    except Exception as e:
+        # Past context is a bonus, generate without it
+        print(f"Could not search past sessions: {e}")
+        return ""
+    print(f"Recalled {len(result['hits'])} card(s) from past sessions")
+    return format_past_cards(result["hits"])
+
+
+async def attach_card_images(cards: List[ReactCard], defer: bool = False) -> None:
+    """
+    Generate images for cards that have img_prompt but no img_source. With `defer`, the
+    cards get an img_token instead and the images are generated in the background.
+    """
+    if defer:
+        deferred = await defer_card_images(cards)
+        print(f"Deferred {deferred} image(s)")
+        return
+
+    for card in cards:
+        if card.img_prompt and not card.img_source:
+            print(f"Generating image for prompt: {card.img_prompt}")
+            generated_image_url = await generate_cached_image(card.img_prompt)
+            if generated_image_url:
+                card.img_source = generated_image_url
+                print(f"Image generated successfully and assigned to card: {generated_image_url}")
 
 
 async def generate_card(request: BoardState) -> List[ReactCard]:
@@ -20,7 +93,9 @@ async def generate_card(request: BoardState) -> List[ReactCard]:
     Generate a new card based on the board state and intention.
     """
     # Execute the sidepanel code to get fresh card types
-    success, error_msg, card_types = get_card_types_from_code(request.sidepanel_code, generation=True)
+    success, error_msg, card_types = await run_cpu_bound(
+        get_card_types_from_code, request.sidepanel_code, generation=True, label="sidepanel_code"
+    )
     
     if not success:
         raise ValueError(f"Failed to execute sidepanel code: {error_msg}")
@@ -29,28 +104,27 @@ async def generate_card(request: BoardState) -> List[ReactCard]:
         raise ValueError("No card types found in sidepanel code")
     
     # Create a prompt that includes the available card types and user intention
-    available_types = list(card_types.keys())
-
-    card_descriptions = [f"**{name}**\n\n {pydantic_type.schema()}" for name, pydantic_type in card_types.items()]
-    prompt = create_card_generation_prompt(
-        intention=request.intention,
-        board_json=str(request.cards),
-        available_types=available_types,
-        pydantic_classes_description=str(card_descriptions)
+    past_notes = await recall_past_cards(request)
+    prompt = await run_cpu_bound(
+        build_card_generation_prompt, request, card_types, past_notes, size=len(request.cards), label="generation_prompt"
     )
 
     # Build the union type
     card_type_classes = list(card_types.values())
 
     # Make single LLM call with Union wrapper type
-    agent = Agent(
-        PYDANTIC_MODEL_NAME,
-        output_type=card_type_classes, 
-    )
+    from pydantic_ai import UnexpectedModelBehavior
+    configure_observability()
     try:
-        result = await agent.run(prompt)
-    except UnexpectedModelBehavior:
-        print("unexpected behavior!")
+        result = await routed_call(
+            "structured",
+            "generate_card",
+            lambda model: get_agent(model, card_type_classes).run(prompt),
+            timeout=AGENT_CALL_TIMEOUT_SECONDS,
+        )
+    except AllModelsFailedError as e:
+        if isinstance(e.__cause__, UnexpectedModelBehavior):
+            print("unexpected behavior!")
         raise
 
     pydantic_card = result.output
@@ -60,48 +134,11 @@ async def generate_card(request: BoardState) -> List[ReactCard]:
     generated_cards = pydantic_to_react_content(pydantic_card)
     print("generated_cards", generated_cards)
     
-    # Apply fluid typechecking to the output
+    # Apply fluid typechecking to the output, repairing the fields that fail
     print(f"Available card types for validation: {list(card_types.keys())}")
-    for card in generated_cards:
-        print(f"Validating card: {card.card_type}")
-        
-        # Skip validation for cards with nested fields
-        card_type_class = card_types.get(card.card_type)
-        if card_type_class and has_nested_card_fields(card_type_class):
-            print(f"Skipping fluid type checking for card with nested fields: {card.card_type}")
-            continue
-            
-        validation_result = None
-        try:
-            # Use the validation service directly to avoid circular import
-            from utils.conversion import cast_react_card_to_pydantic
-            pydantic_card = cast_react_card_to_pydantic(card, card_types)
-            validation_result = await perform_fluid_type_checking(pydantic_card, card_types)
-        except ValueError as e:
-            # Handle unknown card type errors gracefully
-            if "Unknown card type:" in str(e):
-                print(f"Skipping fluid type checking for unknown card type: {card.card_type}")
-                continue
-            else:
-                print(f"Error performing fluid type checking on generated pydantic card: {e}")
-                raise ValueError(f"Failed to run fluid typechecking: {str(e)}")
-        except Exception as e:
-            print(f"Error performing fluid type checking on generated pydantic card: {e}")
-            raise ValueError(f"Failed to run fluid typechecking: {str(e)}")
-
-        assert validation_result is not None
-        if len(validation_result.errors) > 0:
-            print(f"Error performing fluid type checking on generated pydantic card: {validation_result.errors}")
-            raise ValueError(f"Fluid Typechecking error: {validation_result.errors}")
-
-    # Generate images for cards that have img_prompt but no img_source
-    for card in generated_cards:
-        if card.img_prompt and not card.img_source:
-            print(f"Generating image for prompt: {card.img_prompt}")
-            generated_image_url = await generate_image_with_runware(card.img_prompt)
-            if generated_image_url:
-                card.img_source = generated_image_url
-                print(f"Image generated successfully and assigned to card: {generated_image_url}")
+    generated_cards = await validate_and_repair_cards(generated_cards, card_types, request.intention)
+
+    await attach_card_images(generated_cards, defer=request.defer_images)
 
     return generated_cards
 
@@ -112,7 +149,9 @@ async def generate_card_with_base_model(request: BoardState) -> List[ReactCard]:
     This is the new enhanced strategy that uses Claude to generate raw notes first.
     """
     # Execute the sidepanel code to get fresh card types
-    success, error_msg, card_types = get_card_types_from_code(request.sidepanel_code, generation=True)
+    success, error_msg, card_types = await run_cpu_bound(
+        get_card_types_from_code, request.sidepanel_code, generation=True, label="sidepanel_code"
+    )
     
     if not success:
         raise ValueError(f"Failed to execute sidepanel code: {error_msg}")
@@ -123,50 +162,14 @@ async def generate_card_with_base_model(request: BoardState) -> List[ReactCard]:
     # Use the base model strategy to generate cards
     generated_cards = await generate_cards_with_base_model_strategy(
         board_state=request,
-        card_types=card_types
+        card_types=card_types,
+        past_notes=await recall_past_cards(request)
     )
     
-    # Apply the same validation and image generation as the original service
+    # Apply the same validation, repair and image generation as the original service
     print(f"Available card types for validation: {list(card_types.keys())}")
-    for card in generated_cards:
-        print(f"Validating card: {card.card_type}")
-        
-        # Skip validation for cards with nested fields
-        card_type_class = card_types.get(card.card_type)
-        if card_type_class and has_nested_card_fields(card_type_class):
-            print(f"Skipping fluid type checking for card with nested fields: {card.card_type}")
-            continue
-            
-        validation_result = None
-        try:
-            # Use the validation service directly to avoid circular import
-            from utils.conversion import cast_react_card_to_pydantic
-            pydantic_card = cast_react_card_to_pydantic(card, card_types)
-            validation_result = await perform_fluid_type_checking(pydantic_card, card_types)
-        except ValueError as e:
-            # Handle unknown card type errors gracefully
-            if "Unknown card type:" in str(e):
-                print(f"Skipping fluid type checking for unknown card type: {card.card_type}")
-                continue
-            else:
-                print(f"Error performing fluid type checking on generated pydantic card: {e}")
-                raise ValueError(f"Failed to run fluid typechecking: {str(e)}")
-        except Exception as e:
-            print(f"Error performing fluid type checking on generated pydantic card: {e}")
-            raise ValueError(f"Failed to run fluid typechecking: {str(e)}")
-
-        assert validation_result is not None
-        if len(validation_result.errors) > 0:
-            print(f"Error performing fluid type checking on generated pydantic card: {validation_result.errors}")
-            raise ValueError(f"Fluid Typechecking error: {validation_result.errors}")
-
-    # Generate images for cards that have img_prompt but no img_source
-    for card in generated_cards:
-        if card.img_prompt and not card.img_source:
-            print(f"Generating image for prompt: {card.img_prompt}")
-            generated_image_url = await generate_image_with_runware(card.img_prompt)
-            if generated_image_url:
-                card.img_source = generated_image_url
-                print(f"Image generated successfully and assigned to card: {generated_image_url}")
+    generated_cards = await validate_and_repair_cards(generated_cards, card_types, request.intention)
+
+    await attach_card_images(generated_cards, defer=request.defer_images)
 
     return generated_cards
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""
+Shared provider clients, created once per worker and closed on shutdown.
+"""
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import anthropic
+    import httpx
+
+_anthropic_client: Optional["anthropic.AsyncAnthropic"] = None
+_http_client: Optional["httpx.AsyncClient"] = None
+
+
+def get_anthropic_client() -> "anthropic.AsyncAnthropic":
+    """
+    Return the worker-wide Anthropic client so its HTTP connection pool is reused across calls.
+    The SDK is imported on first use to keep worker startup fast.
+    """
+    global _anthropic_client
+    if _anthropic_client is None:
+        import anthropic
+        _anthropic_client = anthropic.AsyncAnthropic()
+    return _anthropic_client
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    """Return the worker-wide HTTP client used to download provider assets such as generated images."""
+    global _http_client
+    if _http_client is None:
+        import httpx
+        _http_client = httpx.AsyncClient(timeout=30, follow_redirects=True)
+    return _http_client
+
+
+async def close_clients() -> None:
+    """Close the shared provider clients and their connection pools."""
+    global _anthropic_client, _http_client
+    if _anthropic_client is not None:
+        await _anthropic_client.close()
+        _anthropic_client = None
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
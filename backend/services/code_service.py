@@ -1,18 +1,57 @@
 """
 Service for executing and validating Python code.
 """
+import hashlib
 import inspect
+import threading
+from collections import OrderedDict
 from typing import Dict, Type, Tuple, Any, Optional, Literal
 from pydantic import BaseModel, Field
 from models.cards import Card
 from utils.conversion import pydantic_to_react_layout
+from config.settings import CARD_TYPES_CACHE_SIZE
 
+CardTypesResult = Tuple[bool, str, Dict[str, Type[Card]]]
 
-def get_card_types_from_code(code: str, generation: bool = False, user_card: bool = False) -> Tuple[bool, str, Dict[str, Type[Card]]]:
+_card_types_cache: "OrderedDict[Tuple[str, bool, bool], CardTypesResult]" = OrderedDict()
+_card_types_lock = threading.Lock()
+_card_types_metrics = {"hits": 0, "misses": 0}
+
+
+def get_card_types_from_code(code: str, generation: bool = False, user_card: bool = False) -> CardTypesResult:
     """
     Execute Python code in a safe environment and extract Card subclasses.
     Returns (success, error_message, card_type_classes)
+
+    Successful results are cached for the CARD_TYPES_CACHE_SIZE most recent codes, so the
+    same sidepanel code gives the same classes on every request (and agents built for them
+    can be reused, see agent_pool).
     """
+    key = (hashlib.sha256(code.encode("utf-8")).hexdigest(), generation, user_card)
+    with _card_types_lock:
+        cached = _card_types_cache.get(key)
+        if cached is not None:
+            _card_types_cache.move_to_end(key)
+            _card_types_metrics["hits"] += 1
+            return cached[0], cached[1], dict(cached[2])
+        _card_types_metrics["misses"] += 1
+
+    result = _compile_card_types(code, generation, user_card)
+    if result[0] and CARD_TYPES_CACHE_SIZE > 0:
+        with _card_types_lock:
+            # A concurrent compilation of the same code may have won: keep its classes
+            result = _card_types_cache.setdefault(key, result)
+            while len(_card_types_cache) > CARD_TYPES_CACHE_SIZE:
+                _card_types_cache.popitem(last=False)
+    return result[0], result[1], dict(result[2])
+
+
+def get_card_types_cache_metrics() -> Dict[str, int]:
+    """Return compiled card type cache counters."""
+    return {**_card_types_metrics, "size": len(_card_types_cache)}
+
+
+def _compile_card_types(code: str, generation: bool, user_card: bool) -> CardTypesResult:
     try:
         # Create a restricted execution environment with Pydantic support
         safe_globals = {
@@ -0,0 +1,174 @@
+"""
+Deferred image delivery: cards are returned before their images are generated, and each
+image is resolved later through a token.
+"""
+import asyncio
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set
+from models.cards import ReactCard
+from services.image_cache import generate_cached_image
+from services.ledger_service import track_costs
+from utils.sqlite import connect
+from config.settings import (
+    IMAGE_CACHE_DB_PATH,
+    DEFERRED_IMAGE_TTL_SECONDS,
+    DEFERRED_IMAGE_POLL_INTERVAL_SECONDS,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deferred_images (
+    token TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    url TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS deferred_images_created ON deferred_images (created_at);
+"""
+
+
+class DeferredImageStore:
+    """
+    Status of deferred images, shared by all worker processes so a token can be polled
+    on any of them. All methods are blocking; call them through asyncio.to_thread.
+    """
+
+    def __init__(self, db_path: str):
+        self._connection = connect(db_path)
+        self._lock = threading.Lock()
+        self._connection.executescript(_SCHEMA)
+
+    def create(self, token: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO deferred_images (token, status, created_at) VALUES (?, 'pending', ?)", (token, time.time())
+            )
+
+    def finish(self, token: str, url: Optional[str]) -> None:
+        """Mark an image ready with its URL, or failed when `url` is empty."""
+        with self._lock:
+            self._connection.execute(
+                "UPDATE deferred_images SET status = ?, url = ?, finished_at = ? WHERE token = ?",
+                ("ready" if url else "failed", url or None, time.time(), token),
+            )
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT token, status, url, created_at FROM deferred_images WHERE token = ?", (token,)
+            ).fetchone()
+        if row is None:
+            return None
+        image = dict(row)
+        created_at = image.pop("created_at")
+        # The worker generating it went away (e.g. restarted)
+        if image["status"] == "pending" and time.time() - created_at > DEFERRED_IMAGE_TTL_SECONDS:
+            image["status"] = "failed"
+        return image
+
+    def purge_expired(self) -> int:
+        """Delete tokens older than the TTL. Returns how many were removed."""
+        with self._lock:
+            cursor = self._connection.execute(
+                "DELETE FROM deferred_images WHERE created_at < ?", (time.time() - 2 * DEFERRED_IMAGE_TTL_SECONDS,)
+            )
+        return cursor.rowcount
+
+
+_store: Optional[DeferredImageStore] = None
+_tasks: Set[asyncio.Task] = set()
+_deferred_metrics = {"deferred": 0, "ready": 0, "failed": 0}
+
+
+def get_deferred_image_store() -> DeferredImageStore:
+    global _store
+    if _store is None:
+        _store = DeferredImageStore(IMAGE_CACHE_DB_PATH)
+    return _store
+
+
+async def _deliver(store: DeferredImageStore, token: str, prompt: str) -> None:
+    url = ""
+    try:
+        # Finishes after the response, so it is recorded in a ledger of its own
+        async with track_costs("deferred-image"):
+            url = await generate_cached_image(prompt)
+    except Exception as e:
+        print(f"Error generating deferred image {token}: {e}")
+    finally:
+        # Runs on cancellation too (worker shutdown), so pollers see a failure instead of waiting out the TTL.
+        # The write completes in its thread even if this task is cancelled again while waiting for it.
+        await asyncio.to_thread(store.finish, token, url)
+        _deferred_metrics["ready" if url else "failed"] += 1
+
+
+async def defer_card_images(cards: Iterable[ReactCard]) -> int:
+    """
+    Give every card with an `img_prompt` but no image an `img_token` and generate the
+    images in the background. Returns the number of images deferred.
+    """
+    store = await asyncio.to_thread(get_deferred_image_store)
+    deferred = 0
+    for card in cards:
+        if not card.img_prompt or card.img_source:
+            continue
+        token = uuid.uuid4().hex
+        await asyncio.to_thread(store.create, token)
+        card.img_token = token
+        # Not tied to the request: the image keeps generating after the cards are returned
+        task = asyncio.create_task(_deliver(store, token, card.img_prompt))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+        deferred += 1
+    _deferred_metrics["deferred"] += deferred
+    if deferred:
+        await asyncio.to_thread(store.purge_expired)
+    return deferred
+
+
+async def get_deferred_image(token: str) -> Optional[Dict[str, Any]]:
+    """Return the status and URL of a deferred image, or None for an unknown token."""
+    store = await asyncio.to_thread(get_deferred_image_store)
+    return await asyncio.to_thread(store.get, token)
+
+
+async def wait_for_deferred_image(token: str, timeout: float) -> Optional[Dict[str, Any]]:
+    """Poll a deferred image until it is no longer pending or the timeout expires."""
+    deadline = time.monotonic() + timeout
+    while True:
+        image = await get_deferred_image(token)
+        if image is None or image["status"] != "pending" or time.monotonic() >= deadline:
+            return image
+        await asyncio.sleep(DEFERRED_IMAGE_POLL_INTERVAL_SECONDS)
+
+
+async def iter_deferred_images(tokens: List[str], timeout: float) -> AsyncIterator[Dict[str, Any]]:
+    """Yield each deferred image once it is ready, failed or unknown, until all are done or the timeout expires."""
+    remaining = list(dict.fromkeys(tokens))
+    deadline = time.monotonic() + timeout
+    while remaining:
+        for token in list(remaining):
+            image = await get_deferred_image(token)
+            if image is None:
+                image = {"token": token, "status": "failed", "url": None}
+            if image["status"] != "pending":
+                remaining.remove(token)
+                yield image
+        if not remaining or time.monotonic() >= deadline:
+            return
+        await asyncio.sleep(DEFERRED_IMAGE_POLL_INTERVAL_SECONDS)
+
+
+async def cancel_deferred_images() -> None:
+    """Stop this worker's background image generations (called on shutdown)."""
+    for task in list(_tasks):
+        task.cancel()
+    if _tasks:
+        await asyncio.gather(*_tasks, return_exceptions=True)
+
+
+def get_deferred_image_metrics() -> Dict[str, int]:
+    """Return counters of deferred, delivered and failed images."""
+    return {**_deferred_metrics, "in_progress": len(_tasks)}
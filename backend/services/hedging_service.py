@@ -0,0 +1,159 @@
+"""
+Service for deadline-aware hedged LLM calls.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+from config.settings import (
+    LLM_CALL_TIMEOUT_SECONDS,
+    HEDGING_ENABLED,
+    HEDGE_PERCENTILE,
+    HEDGE_MAX_RATIO,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_WINDOW,
+)
+
+T = TypeVar("T")
+
+
+class LLMTimeoutError(Exception):
+    """Raised when an LLM call (including its hedge) did not answer before its deadline."""
+
+
+class _CallStats:
+    """Rolling latency and hedge statistics for one kind of call (e.g. `fluid_check:groq/llama`)."""
+
+    def __init__(self):
+        self.latencies: Deque[float] = deque(maxlen=HEDGE_WINDOW)
+        self.recent_hedges: Deque[bool] = deque(maxlen=HEDGE_WINDOW)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def can_hedge(self) -> bool:
+        if not self.recent_hedges:
+            return True
+        return sum(self.recent_hedges) / len(self.recent_hedges) < HEDGE_MAX_RATIO
+
+
+_stats: Dict[str, _CallStats] = {}
+
+
+def _cancel_all(tasks) -> None:
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+
+
+async def hedged_call(
+    key: str,
+    factory: Callable[[], Awaitable[T]],
+    timeout: float = LLM_CALL_TIMEOUT_SECONDS,
+    on_loser: Optional[Callable[[Optional[T], float], None]] = None,
+) -> T:
+    """
+    Await `factory()` with a deadline, hedging slow calls.
+
+    If the call has not answered after the HEDGE_PERCENTILE latency observed for `key`,
+    a second identical call is started and whichever succeeds first wins; the other is
+    cancelled. Hedges are skipped once more than HEDGE_MAX_RATIO of recent calls were hedged.
+    Primaries beaten by their hedge or timed out are sampled with their elapsed time when
+    cancelled (a lower bound of their latency), so slow calls keep weighing on the percentile.
+
+    Args:
+        key: Identifies the call type and model, latencies are tracked per key
+        factory: Creates a new call each time it is invoked
+        timeout: Deadline in seconds for the call including its hedge
+        on_loser: Called when a hedged call succeeds, for the request that lost the race
+            (it was paid for too), with its result if it also finished, else None, and
+            the seconds since it was sent
+
+    Raises:
+        LLMTimeoutError: if no call succeeded before the deadline
+    """
+    stats = _stats.setdefault(key, _CallStats())
+    stats.calls += 1
+    start = time.monotonic()
+    deadline = start + timeout
+    primary = asyncio.ensure_future(factory())
+    tasks = [primary]
+    # When each request was sent, to record the winner's own latency
+    sent_at = {primary: start}
+    hedged = False
+
+    try:
+        threshold = stats.percentile(HEDGE_PERCENTILE) if HEDGING_ENABLED else None
+        if threshold is not None and threshold < timeout:
+            done, _ = await asyncio.wait({primary}, timeout=threshold)
+            if not done and stats.can_hedge():
+                hedged = True
+                stats.hedged += 1
+                hedge = asyncio.ensure_future(factory())
+                tasks.append(hedge)
+                sent_at[hedge] = time.monotonic()
+
+        pending = set(tasks)
+        last_error: Optional[BaseException] = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.cancelled():
+                    continue
+                if task.exception() is not None:
+                    last_error = task.exception()
+                    continue
+                if task is not primary:
+                    stats.hedge_wins += 1
+                    # Sample the slow primary too, censored at its cancellation, so the tail
+                    # that triggers hedges stays in the percentile
+                    stats.latencies.append(time.monotonic() - start)
+                stats.latencies.append(time.monotonic() - sent_at[task])
+                if on_loser is not None:
+                    for other in tasks:
+                        if other is not task:
+                            finished = other.done() and not other.cancelled() and other.exception() is None
+                            on_loser(other.result() if finished else None, time.monotonic() - sent_at[other])
+                return task.result()
+
+        if last_error is not None and not pending:
+            stats.errors += 1
+            raise last_error
+        stats.timeouts += 1
+        stats.latencies.append(time.monotonic() - start)
+        raise LLMTimeoutError(f"{key} did not answer within {timeout:.0f}s")
+    finally:
+        stats.recent_hedges.append(hedged)
+        _cancel_all(tasks)
+
+
+def get_hedging_metrics() -> Dict[str, Any]:
+    """Return per call type latency percentiles, hedge rate and hedge win rate."""
+    metrics = {}
+    for key, stats in _stats.items():
+        ordered = sorted(stats.latencies)
+        metrics[key] = {
+            "calls": stats.calls,
+            "hedged": stats.hedged,
+            "hedge_rate": stats.hedged / stats.calls if stats.calls else 0.0,
+            "hedge_wins": stats.hedge_wins,
+            "hedge_win_rate": stats.hedge_wins / stats.hedged if stats.hedged else 0.0,
+            "timeouts": stats.timeouts,
+            "errors": stats.errors,
+            "p50_s": ordered[len(ordered) // 2] if ordered else None,
+            "p95_s": ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)] if ordered else None,
+        }
+    return metrics
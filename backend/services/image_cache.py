@@ -0,0 +1,252 @@
+"""
+Prompt-keyed cache of generated images, stored locally and served from /images.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from services.blob_store import BlobStore, image_ref_url, sniff_image_type
+from services.clients import get_http_client
+from services.image_service import generate_image_with_runware
+from services.image_variants import get_variant_store
+from utils.offload import run_cpu_bound
+from utils.sqlite import connect
+from config.settings import (
+    IMAGE_MODEL,
+    IMAGE_WIDTH,
+    IMAGE_HEIGHT,
+    IMAGE_CACHE_ENABLED,
+    IMAGE_CACHE_DIR,
+    IMAGE_CACHE_DB_PATH,
+    IMAGE_CACHE_MAX_BYTES,
+    IMAGE_UPLOAD_MAX_BYTES,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_lru ON images (last_used_at);
+-- Kept after eviction, so saved boards referencing an evicted image can get it regenerated
+CREATE TABLE IF NOT EXISTS image_prompts (
+    digest TEXT PRIMARY KEY,
+    prompt TEXT NOT NULL
+);
+"""
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case-fold and collapse whitespace so trivially different prompts share an image."""
+    return " ".join(prompt.casefold().split())
+
+
+def prompt_cache_key(prompt: str, model: str = IMAGE_MODEL, width: int = IMAGE_WIDTH, height: int = IMAGE_HEIGHT) -> str:
+    raw = f"{normalize_prompt(prompt)}\x00{model}\x00{width}x{height}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    """
+    Index from prompt keys to image blobs, with a least-recently-used size cap.
+    All methods are blocking; call them through asyncio.to_thread from async code.
+    Several server processes can share the index and the blob directory.
+    """
+
+    def __init__(self, db_path: str, blob_dir: str, max_bytes: int):
+        self.store = BlobStore(blob_dir)
+        self.max_bytes = max_bytes
+        self._connection = connect(db_path)
+        self._lock = threading.Lock()
+        self._connection.executescript(_SCHEMA)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the digest cached for `key` and mark it as recently used, or None."""
+        with self._lock:
+            row = self._connection.execute("SELECT digest FROM images WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.store.path(row["digest"]) is None:
+                # The blob was removed behind our back
+                self._connection.execute("DELETE FROM images WHERE key = ?", (key,))
+                return None
+            self._connection.execute("UPDATE images SET last_used_at = ? WHERE key = ?", (time.time(), key))
+        return row["digest"]
+
+    def put(self, key: str, data: bytes, prompt: str = "") -> str:
+        """Store image bytes for `key` (generated from `prompt`), evict over the size cap and return the digest."""
+        digest = self.store.put(data)
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO images (key, digest, size, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                (key, digest, len(data), now, now),
+            )
+            if prompt:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO image_prompts (digest, prompt) VALUES (?, ?)", (digest, prompt)
+                )
+        self.evict()
+        return digest
+
+    def prompt_for(self, digest: str) -> Optional[str]:
+        """Return the prompt an image was generated from, including evicted images, or None."""
+        with self._lock:
+            row = self._connection.execute("SELECT prompt FROM image_prompts WHERE digest = ?", (digest,)).fetchone()
+        return row["prompt"] if row is not None else None
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM images").fetchone()[0]
+
+    def evict(self) -> List[str]:
+        """Drop least recently used images until the cache fits in max_bytes. Returns the evicted keys."""
+        evicted = []
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM images").fetchone()[0]
+                rows = self._connection.execute("SELECT key, digest, size FROM images ORDER BY last_used_at").fetchall()
+                orphaned = set()
+                for row in rows:
+                    # Always keep the most recent image, even if it alone exceeds the cap
+                    if total <= self.max_bytes or len(evicted) == len(rows) - 1:
+                        break
+                    self._connection.execute("DELETE FROM images WHERE key = ?", (row["key"],))
+                    total -= row["size"]
+                    evicted.append(row["key"])
+                    orphaned.add(row["digest"])
+                for digest in orphaned:
+                    shared = self._connection.execute("SELECT 1 FROM images WHERE digest = ?", (digest,)).fetchone()
+                    if shared is None:
+                        self.store.delete(digest)
+                        get_variant_store().delete_all(digest)
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        _cache_metrics["evictions"] += len(evicted)
+        return evicted
+
+
+class _InFlight:
+    """A generation shared by every request for the same prompt key."""
+
+    def __init__(self, task: "asyncio.Task[str]"):
+        self.task = task
+        self.waiters = 0
+
+
+async def _wait_shared(entry: _InFlight) -> str:
+    # The generation survives the cancellation of one waiter, and is cancelled with the last one
+    entry.waiters += 1
+    try:
+        return await asyncio.shield(entry.task)
+    finally:
+        entry.waiters -= 1
+        if entry.waiters == 0 and not entry.task.done():
+            entry.task.cancel()
+
+
+_cache: Optional[ImageCache] = None
+_in_flight: Dict[str, _InFlight] = {}
+_cache_metrics = {"hits": 0, "misses": 0, "coalesced": 0, "download_failures": 0, "evictions": 0, "regenerated": 0}
+
+
+def get_image_cache() -> ImageCache:
+    global _cache
+    if _cache is None:
+        _cache = ImageCache(IMAGE_CACHE_DB_PATH, IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES)
+    return _cache
+
+
+async def download_image(url: str) -> Optional[bytes]:
+    """Fetch a generated image from the provider, or None if it is not a usable image."""
+    try:
+        response = await get_http_client().get(url)
+        response.raise_for_status()
+    except Exception as e:
+        print(f"Error downloading generated image {url}: {e}")
+        return None
+    data = response.content
+    if len(data) > IMAGE_UPLOAD_MAX_BYTES or sniff_image_type(data) is None:
+        print(f"Generated image {url} is not a supported image of at most {IMAGE_UPLOAD_MAX_BYTES} bytes")
+        return None
+    return data
+
+
+async def _generate_and_store(key: str, prompt: str) -> str:
+    image_url = await generate_image_with_runware(prompt)
+    if not image_url:
+        return ""
+    data = await download_image(image_url)
+    if data is None:
+        # Fall back to the provider URL rather than losing the image
+        _cache_metrics["download_failures"] += 1
+        return image_url
+    cache = get_image_cache()
+    digest = await run_cpu_bound(cache.put, key, data, prompt, label="image_cache")
+    return image_ref_url(digest)
+
+
+async def generate_cached_image(prompt: str) -> str:
+    """
+    Return a URL for an image of `prompt`, generating it only if no image was cached for the
+    same normalized prompt, model and size. Concurrent requests for one prompt share a single
+    generation. Returns an empty string if generation failed.
+    """
+    if not IMAGE_CACHE_ENABLED:
+        return await generate_image_with_runware(prompt)
+
+    key = prompt_cache_key(prompt)
+    entry = _in_flight.get(key)
+    if entry is not None:
+        _cache_metrics["coalesced"] += 1
+        return await _wait_shared(entry)
+
+    cache = await asyncio.to_thread(get_image_cache)
+    digest = await asyncio.to_thread(cache.get, key)
+    if digest is not None:
+        _cache_metrics["hits"] += 1
+        return image_ref_url(digest)
+
+    entry = _in_flight.get(key)
+    if entry is None:
+        _cache_metrics["misses"] += 1
+        entry = _InFlight(asyncio.ensure_future(_generate_and_store(key, prompt)))
+        _in_flight[key] = entry
+        entry.task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    else:
+        _cache_metrics["coalesced"] += 1
+    return await _wait_shared(entry)
+
+
+async def regenerate_evicted_image(digest: str) -> Optional[str]:
+    """
+    Return a URL for a new image of the prompt an evicted image was generated from, generating
+    it unless it is cached again. Returns None for unknown digests or if generation failed.
+    """
+    cache = await asyncio.to_thread(get_image_cache)
+    prompt = await asyncio.to_thread(cache.prompt_for, digest)
+    if prompt is None:
+        return None
+    _cache_metrics["regenerated"] += 1
+    return await generate_cached_image(prompt) or None
+
+
+def find_cached_image(digest: str) -> Optional[str]:
+    """Return the file path of a cached generated image, or None."""
+    return get_image_cache().store.path(digest)
+
+
+def get_image_cache_metrics() -> Dict[str, Any]:
+    """Return cache hit/miss counters."""
+    lookups = _cache_metrics["hits"] + _cache_metrics["misses"]
+    return {
+        **_cache_metrics,
+        "hit_rate": _cache_metrics["hits"] / lookups if lookups else 0.0,
+    }
@@ -2,8 +2,9 @@
 Service for image generation using Runware API.
 """
 import os
-from runware import Runware, IImageInference
-from config.settings import IMAGE_WIDTH, IMAGE_HEIGHT
+import time
+from services.ledger_service import reserve_budget, release_budget, record_image_call
+from config.settings import IMAGE_WIDTH, IMAGE_HEIGHT, IMAGE_MODEL
 
 
 async def generate_image_with_runware(prompt: str) -> str:
@@ -14,9 +15,16 @@ async def generate_image_with_runware(prompt: str) -> str:
         prompt: The text prompt for image generation
         
     Returns:
-        Image URL string for the generated image
+        Image URL string for the generated image, empty if generation failed or the
+        request's cost budget is spent
     """
+    runware = None
+    start = None
+    reserved = 0.0
     try:
+        reserved = reserve_budget("image", IMAGE_MODEL)
+        from runware import Runware, IImageInference
+
         # Initialize Runware client
         runware = Runware(api_key=os.environ["RUNWARE_API_KEY"])
         await runware.connect()
@@ -24,13 +32,15 @@ async def generate_image_with_runware(prompt: str) -> str:
         # Create image generation request
         request = IImageInference(
             positivePrompt=prompt,
-            model="runware:101@1",
+            model=IMAGE_MODEL,
             width=IMAGE_WIDTH,  # Smaller size for card images
             height=IMAGE_HEIGHT
         )
         
         # Generate image
+        start = time.monotonic()
         images = await runware.imageInference(requestImage=request)
+        record_image_call(IMAGE_MODEL, time.monotonic() - start, ok=bool(images))
         
         if images and len(images) > 0:
             image_url = images[0].imageURL
@@ -40,5 +50,15 @@ async def generate_image_with_runware(prompt: str) -> str:
             return ""
             
     except Exception as e:
+        if start is not None:
+            record_image_call(IMAGE_MODEL, time.monotonic() - start, ok=False)
         print(f"Error generating image with Runware: {e}")
-        return ""
\ No newline at end of file
+        return ""
+    finally:
+        release_budget(reserved)
+        # Also runs on cancellation, so abandoned requests do not leave sockets open
+        if runware is not None:
+            try:
+                await runware.disconnect()
+            except Exception as e:
+                print(f"Error disconnecting from Runware: {e}")
\ No newline at end of file
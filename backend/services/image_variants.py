@@ -0,0 +1,161 @@
+"""
+Resized and re-encoded variants of stored images, rendered lazily and kept on disk.
+"""
+import asyncio
+import glob
+import io
+import os
+import tempfile
+from typing import Dict, Optional
+from utils.offload import run_cpu_bound
+from config.settings import IMAGE_VARIANT_DIR, IMAGE_VARIANT_WIDTHS, IMAGE_VARIANT_QUALITY
+
+try:
+    from PIL import Image, features
+except ImportError:  # optional dependency
+    Image = None
+
+VARIANT_CONTENT_TYPES = {
+    "avif": "image/avif",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+}
+# Fallback output format for each source type when the client accepts neither AVIF nor WebP
+_SOURCE_FORMATS = {"image/jpeg": "jpeg", "image/png": "png", "image/gif": "png", "image/webp": "png", "image/avif": "png"}
+
+_variant_metrics = {"rendered": 0, "served": 0, "coalesced": 0, "failed": 0}
+
+
+def variants_available() -> bool:
+    return Image is not None
+
+
+def _supports(fmt: str) -> bool:
+    if Image is None:
+        return False
+    if fmt in ("avif", "webp"):
+        return bool(features.check(fmt))
+    return True
+
+
+def snap_width(width: int) -> int:
+    """Round a requested width up to the closest configured variant width."""
+    for allowed in sorted(IMAGE_VARIANT_WIDTHS):
+        if width <= allowed:
+            return allowed
+    return max(IMAGE_VARIANT_WIDTHS)
+
+
+def choose_format(requested: Optional[str], accept: Optional[str], source_type: str) -> Optional[str]:
+    """
+    Resolve the output format: an explicit `avif`/`webp`/`jpeg`/`png` if supported, otherwise
+    (`auto` or unsupported) the best format the client accepts, falling back to the source's own.
+    Returns None if the format cannot be produced here.
+    """
+    if requested in VARIANT_CONTENT_TYPES and _supports(requested):
+        return requested
+    accept = accept or ""
+    for fmt in ("avif", "webp"):
+        if VARIANT_CONTENT_TYPES[fmt] in accept and _supports(fmt):
+            return fmt
+    fmt = _SOURCE_FORMATS.get(source_type)
+    return fmt if fmt is not None and _supports(fmt) else None
+
+
+def render_variant(data: bytes, width: int, fmt: str) -> bytes:
+    """Resize image bytes to at most `width` pixels wide (never upscaling) and encode them as `fmt`."""
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA")
+        output = io.BytesIO()
+        image.save(output, format=fmt.upper(), quality=IMAGE_VARIANT_QUALITY)
+    return output.getvalue()
+
+
+class VariantStore:
+    """Stores variants under `<root>/<first two hex digits>/<sha256>-<width>.<format>`."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, digest: str, width: int, fmt: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}-{width}.{fmt}")
+
+    def ensure(self, digest: str, source_path: str, width: int, fmt: str) -> str:
+        """Return the path of a variant, rendering and storing it first if needed. Blocking."""
+        path = self.path(digest, width, fmt)
+        if os.path.exists(path):
+            return path
+
+        with open(source_path, "rb") as f:
+            data = render_variant(f.read(), width, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        _variant_metrics["rendered"] += 1
+        return path
+
+    def delete_all(self, digest: str) -> int:
+        """Delete every variant of an image. Returns how many were removed."""
+        removed = 0
+        for path in glob.glob(os.path.join(self.root, digest[:2], f"{digest}-*")):
+            os.remove(path)
+            removed += 1
+        return removed
+
+
+_store: Optional[VariantStore] = None
+_in_flight: Dict[str, "asyncio.Task[str]"] = {}
+
+
+def get_variant_store() -> VariantStore:
+    global _store
+    if _store is None:
+        _store = VariantStore(IMAGE_VARIANT_DIR)
+    return _store
+
+
+async def get_variant_path(digest: str, source_path: str, width: int, fmt: str) -> str:
+    """
+    Return the path of a variant, rendering it in the CPU executor on first request.
+    Concurrent requests for the same variant share one rendering.
+    """
+    store = get_variant_store()
+    path = store.path(digest, width, fmt)
+    _variant_metrics["served"] += 1
+    if os.path.exists(path):
+        return path
+
+    task = _in_flight.get(path)
+    if task is None:
+        task = asyncio.ensure_future(
+            run_cpu_bound(store.ensure, digest, source_path, width, fmt, label="image_variant")
+        )
+        _in_flight[path] = task
+        task.add_done_callback(lambda _: _in_flight.pop(path, None))
+    else:
+        _variant_metrics["coalesced"] += 1
+    return await asyncio.shield(task)
+
+
+def record_variant_failure() -> None:
+    _variant_metrics["failed"] += 1
+
+
+def get_variant_metrics() -> Dict[str, int]:
+    """Return variant rendering counters."""
+    return {**_variant_metrics, "available": variants_available()}
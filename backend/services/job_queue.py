@@ -0,0 +1,404 @@
+"""
+Durable job queue backed by SQLite, with an in-process worker pool.
+"""
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from utils.sqlite import connect
+from services.ledger_service import track_costs
+from config.settings import (
+    JOB_DB_PATH,
+    JOB_WORKERS,
+    JOB_RESULT_TTL_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_STALE_SECONDS,
+    JOB_POLL_INTERVAL_SECONDS,
+    JOB_CANCEL_CHECK_SECONDS,
+)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    idempotency_key TEXT UNIQUE,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, kind, created_at);
+CREATE INDEX IF NOT EXISTS jobs_expiry ON jobs (expires_at);
+"""
+
+
+def _row_to_job(row) -> Optional[Dict[str, Any]]:
+    if row is None:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+
+class JobQueue:
+    """
+    Job storage. All methods are blocking; call them through asyncio.to_thread from async code.
+    Several server processes can share one database file: claiming a job is a single
+    IMMEDIATE transaction, so a job is only ever handed to one worker.
+    """
+
+    def __init__(self, db_path: str):
+        self._connection = connect(db_path)
+        self._lock = threading.Lock()
+        self._connection.executescript(_SCHEMA)
+
+    def submit(self, kind: str, payload: Dict[str, Any], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Enqueue a job. If a job with the same idempotency key exists and has not expired,
+        that job is returned instead of creating a new one.
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                if idempotency_key is not None:
+                    existing = self._connection.execute(
+                        "SELECT * FROM jobs WHERE idempotency_key = ?", (idempotency_key,)
+                    ).fetchone()
+                    if existing is not None and (existing["expires_at"] is None or existing["expires_at"] > now):
+                        self._connection.execute("COMMIT")
+                        return _row_to_job(existing)
+                    if existing is not None:
+                        self._connection.execute("DELETE FROM jobs WHERE id = ?", (existing["id"],))
+
+                job_id = uuid.uuid4().hex
+                self._connection.execute(
+                    "INSERT INTO jobs (id, kind, idempotency_key, status, payload, created_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                    (job_id, kind, idempotency_key, json.dumps(payload, separators=(",", ":")), now),
+                )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row)
+
+    def claim(self, kinds: List[str], worker: str) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job of one of `kinds` to running and return it."""
+        now = time.time()
+        placeholders = ",".join("?" for _ in kinds)
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._connection.execute(
+                    f"SELECT id FROM jobs WHERE status = 'queued' AND kind IN ({placeholders}) ORDER BY created_at LIMIT 1",
+                    kinds,
+                ).fetchone()
+                if row is None:
+                    self._connection.execute("COMMIT")
+                    return None
+                self._connection.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                    "started_at = ?, heartbeat_at = ? WHERE id = ?",
+                    (worker, now, now, row["id"]),
+                )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return self.get(row["id"])
+
+    def heartbeat(self, job_id: str) -> None:
+        with self._lock:
+            self._connection.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'", (time.time(), job_id))
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> bool:
+        # A job cancelled while running keeps its cancelled status when the handler returns
+        now = time.time()
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, expires_at = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (
+                    status,
+                    json.dumps(result, separators=(",", ":")) if result is not None else None,
+                    error,
+                    now,
+                    now + JOB_RESULT_TTL_SECONDS,
+                    job_id,
+                ),
+            )
+        return cursor.rowcount > 0
+
+    def complete(self, job_id: str, result: Any) -> None:
+        self._finish(job_id, "succeeded", result=result)
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._finish(job_id, "failed", error=error)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if it had already finished."""
+        return self._finish(job_id, "cancelled", error="Cancelled")
+
+    def requeue(self, job_id: str) -> None:
+        """Put a running job back in the queue, e.g. when its worker shuts down."""
+        with self._lock:
+            self._connection.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL WHERE id = ? AND status = 'running'", (job_id,)
+            )
+
+    def recover_stale(self) -> int:
+        """
+        Requeue running jobs whose worker stopped sending heartbeats (crashed process),
+        or fail them once they have used up JOB_MAX_ATTEMPTS. Returns the number of jobs recovered.
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'Worker lost too many times', finished_at = ?, expires_at = ? "
+                    "WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+                    (now, now + JOB_RESULT_TTL_SECONDS, now - JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS),
+                )
+                cursor = self._connection.execute(
+                    "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND heartbeat_at < ?",
+                    (now - JOB_STALE_SECONDS,),
+                )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return cursor.rowcount
+
+    def purge_expired(self) -> int:
+        """Delete finished jobs whose result TTL has passed."""
+        with self._lock:
+            cursor = self._connection.execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connection.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+class JobWorkerPool:
+    """Runs queued jobs with at most `concurrency` jobs in flight in this process."""
+
+    def __init__(self, queue: JobQueue, handlers: Dict[str, JobHandler], concurrency: int):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.worker_name = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._finished: Dict[str, asyncio.Event] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancelled: set = set()
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker_loop()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._maintenance_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Wake idle workers after a job was submitted from this process."""
+        self._wakeup.set()
+
+    async def wait_finished(self, job_id: str, timeout: float) -> None:
+        """Wait up to `timeout` for a job run by this process to finish."""
+        event = self._finished.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def cancel_running(self, job_id: str) -> bool:
+        """Cancel the handler of a job running in this process. Returns whether it was running here."""
+        task = self._running.get(job_id)
+        if task is None or task.done():
+            return False
+        self._cancelled.add(job_id)
+        task.cancel()
+        return True
+
+    def forget(self, job_id: str) -> None:
+        """Drop the wakeup event of a job that waiters no longer need."""
+        self._finished.pop(job_id, None)
+
+    async def _worker_loop(self) -> None:
+        kinds = list(self.handlers.keys())
+        while True:
+            job = await asyncio.to_thread(self.queue.claim, kinds, self.worker_name)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+        handler_task = asyncio.ensure_future(self._run_handler(job))
+        self._running[job_id] = handler_task
+        heartbeat = asyncio.create_task(self._heartbeat_loop(job_id))
+        try:
+            result = await handler_task
+            await asyncio.to_thread(self.queue.complete, job_id, result)
+        except asyncio.CancelledError:
+            if job_id in self._cancelled:
+                # Cancelled through the API: the job is already marked cancelled
+                return
+            # Shutting down: stop the handler and hand the job to another worker
+            handler_task.cancel()
+            await asyncio.to_thread(self.queue.requeue, job_id)
+            raise
+        except Exception as e:
+            print(f"Job {job_id} ({job['kind']}) failed: {e}")
+            await asyncio.to_thread(self.queue.fail, job_id, str(e))
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job_id, None)
+            self._cancelled.discard(job_id)
+            self._finished.pop(job_id, asyncio.Event()).set()
+
+    async def _run_handler(self, job: Dict[str, Any]) -> Any:
+        # Jobs outlive the request that submitted them, so their calls get a ledger of their own
+        async with track_costs(f"job:{job['kind']}"):
+            return await self.handlers[job["kind"]](job["payload"])
+
+    async def _heartbeat_loop(self, job_id: str) -> None:
+        """Keep the job marked alive and stop it if it was cancelled from another process."""
+        last_heartbeat = time.monotonic()
+        while True:
+            await asyncio.sleep(JOB_CANCEL_CHECK_SECONDS)
+            job = await asyncio.to_thread(self.queue.get, job_id)
+            if job is None or job["status"] == "cancelled":
+                self.cancel_running(job_id)
+                return
+            if time.monotonic() - last_heartbeat >= JOB_STALE_SECONDS / 4:
+                await asyncio.to_thread(self.queue.heartbeat, job_id)
+                last_heartbeat = time.monotonic()
+
+    async def _maintenance_loop(self) -> None:
+        while True:
+            recovered = await asyncio.to_thread(self.queue.recover_stale)
+            if recovered:
+                print(f"Requeued {recovered} job(s) from lost workers")
+            await asyncio.to_thread(self.queue.purge_expired)
+            await asyncio.sleep(JOB_STALE_SECONDS / 2)
+
+
+_handlers: Dict[str, JobHandler] = {}
+_queue: Optional[JobQueue] = None
+_pool: Optional[JobWorkerPool] = None
+
+
+def register_job_handler(kind: str, handler: JobHandler) -> None:
+    """Register the coroutine that runs jobs of a given kind. Must be called before the pool starts."""
+    _handlers[kind] = handler
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = JobQueue(JOB_DB_PATH)
+    return _queue
+
+
+async def start_job_workers() -> None:
+    """Start this process's job workers (called from the app lifespan)."""
+    global _pool
+    if JOB_WORKERS <= 0 or not _handlers:
+        return
+    queue = await asyncio.to_thread(get_job_queue)
+    _pool = JobWorkerPool(queue, _handlers, JOB_WORKERS)
+    _pool.start()
+
+
+async def stop_job_workers() -> None:
+    """Stop the workers; jobs still running are requeued for another process."""
+    global _pool
+    if _pool is not None:
+        await _pool.stop()
+        _pool = None
+
+
+async def submit_job(kind: str, payload: Dict[str, Any], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+    """Enqueue a job and wake the local workers."""
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job = await asyncio.to_thread(get_job_queue().submit, kind, payload, idempotency_key)
+    if _pool is not None:
+        _pool.notify()
+    return job
+
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    return await asyncio.to_thread(get_job_queue().get, job_id)
+
+
+async def wait_for_job(job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+    """
+    Long-poll a job until it reaches a terminal status or `timeout` seconds pass.
+    Jobs run by this process wake the waiter immediately; jobs run by other processes are polled.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        job = await get_job(job_id)
+        remaining = deadline - time.monotonic()
+        if job is None or job["status"] in TERMINAL_STATUSES or remaining <= 0:
+            if _pool is not None:
+                _pool.forget(job_id)
+            return job
+        wait = min(remaining, JOB_POLL_INTERVAL_SECONDS)
+        if _pool is not None:
+            await _pool.wait_finished(job_id, wait)
+        else:
+            await asyncio.sleep(wait)
+
+
+async def cancel_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Cancel a queued or running job. A job running in this process stops right away,
+    one running in another process stops at its next cancellation check.
+    """
+    await asyncio.to_thread(get_job_queue().cancel, job_id)
+    if _pool is not None:
+        _pool.cancel_running(job_id)
+    return await get_job(job_id)
+
+
+def get_job_metrics() -> Dict[str, Any]:
+    """Return job counts per status (only once the queue has been opened in this process)."""
+    if _queue is None:
+        return {"workers": JOB_WORKERS if _pool is not None else 0, "counts": {}}
+    return {"workers": _pool.concurrency if _pool is not None else 0, "counts": _queue.counts()}
@@ -0,0 +1,429 @@
+"""
+Per-request ledger of LLM and image calls: tokens, latency and estimated cost.
+
+The ledger of the current request lives in a context variable, so calls made from child
+tasks are recorded too. Finished ledgers are stored in SQLite for per-session and
+per-endpoint totals, and every call reserves its estimated cost against the budgets before
+it starts.
+"""
+import asyncio
+import contextvars
+import json
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from utils.sqlite import connect
+from config.settings import (
+    LEDGER_ENABLED,
+    LEDGER_DB_PATH,
+    REQUEST_BUDGET_USD,
+    SESSION_BUDGET_USD,
+    MODEL_PRICES,
+    IMAGE_COST_USD,
+    BUDGET_RESERVE_TOKENS,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    id TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    session_id TEXT,
+    created_at REAL NOT NULL,
+    calls INTEGER NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cached_tokens INTEGER NOT NULL,
+    latency_seconds REAL NOT NULL,
+    cost_usd REAL NOT NULL,
+    entries TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS requests_session ON requests (session_id);
+CREATE INDEX IF NOT EXISTS requests_endpoint ON requests (endpoint, created_at);
+"""
+_GROUP_COLUMNS = {"endpoint": "endpoint", "session": "session_id"}
+
+
+class BudgetExceededError(Exception):
+    """Raised before a call when the request or its session has spent its budget."""
+
+
+def _price(model: str) -> Optional[Tuple[float, float, float]]:
+    if model in MODEL_PRICES:
+        return MODEL_PRICES[model]
+    # "openai:gpt-5-mini" and "groq/llama-3.3-70b" are priced under the bare model name
+    for separator in (":", "/"):
+        if separator in model:
+            bare = model.split(separator, 1)[1]
+            if bare in MODEL_PRICES:
+                return MODEL_PRICES[bare]
+    return None
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> Optional[float]:
+    """
+    Estimate the USD cost of a call from MODEL_PRICES, or None for an unknown model.
+    `input_tokens` includes the `cached_tokens`, which are billed at the cached rate.
+    """
+    prices = _price(model)
+    if prices is None:
+        return None
+    input_price, output_price, cached_price = prices
+    uncached = max(0, input_tokens - cached_tokens)
+    return (uncached * input_price + cached_tokens * cached_price + output_tokens * output_price) / 1_000_000
+
+
+def extract_usage(result: Any) -> Tuple[int, int, int]:
+    """
+    Return (input tokens including cached ones, output tokens, cached input tokens) of a call
+    result: a pydantic-ai run result, an Anthropic message or a LiteLLM response.
+    Missing usage counts as zero.
+    """
+    usage = getattr(result, "usage", None)
+    if callable(usage):
+        usage = usage()
+    if usage is None:
+        return 0, 0, 0
+
+    def first(*names: str) -> int:
+        for name in names:
+            value = getattr(usage, name, None)
+            if value:
+                return int(value)
+        return 0
+
+    output_tokens = first("output_tokens", "completion_tokens")
+    if hasattr(usage, "cache_read_input_tokens"):
+        # Anthropic reports cached and newly cached tokens apart from input_tokens
+        cached = first("cache_read_input_tokens")
+        input_tokens = first("input_tokens") + cached + first("cache_creation_input_tokens")
+        return input_tokens, output_tokens, cached
+    input_tokens = first("input_tokens", "prompt_tokens")
+    cached = first("cache_read_tokens")
+    details = getattr(usage, "prompt_tokens_details", None)
+    if not cached and details is not None:
+        cached = int(getattr(details, "cached_tokens", 0) or 0)
+    return input_tokens, output_tokens, cached
+
+
+class Ledger:
+    """The calls made on behalf of one request, job or background task."""
+
+    def __init__(self, endpoint: str, session_id: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.endpoint = endpoint
+        self.session_id = session_id
+        self.created_at = time.time()
+        self.entries: List[Dict[str, Any]] = []
+        # Spent by earlier requests of the session, see bind_session
+        self.session_spent = 0.0
+        self.session_loaded = False
+        # Estimated cost of the calls in flight, see reserve
+        self.reserved = 0.0
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        kind: str,
+        model: str,
+        latency: float,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        cached_tokens: int = 0,
+        cost: Optional[float] = None,
+        ok: bool = True,
+        estimated: bool = False,
+    ) -> None:
+        entry = {
+            "kind": kind,
+            "model": model,
+            "ok": ok,
+            "latency_seconds": round(latency, 4),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cached_tokens": cached_tokens,
+            "cost_usd": cost,
+        }
+        if estimated:
+            # The usage was not reported (e.g. a cancelled hedge) and was copied from a similar call
+            entry["estimated"] = True
+        self.entries.append(entry)
+
+    @property
+    def cost(self) -> float:
+        return sum(entry["cost_usd"] or 0.0 for entry in self.entries)
+
+    def totals(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "calls": len(self.entries),
+            "input_tokens": sum(entry["input_tokens"] for entry in self.entries),
+            "output_tokens": sum(entry["output_tokens"] for entry in self.entries),
+            "cached_tokens": sum(entry["cached_tokens"] for entry in self.entries),
+            "latency_seconds": round(sum(entry["latency_seconds"] for entry in self.entries), 4),
+            "cost_usd": round(self.cost, 6),
+            "unpriced_calls": sum(1 for entry in self.entries if entry["ok"] and entry["cost_usd"] is None),
+        }
+
+    def check_budget(self, pending: float = 0.0) -> None:
+        """
+        Raises:
+            BudgetExceededError: if the request or its session has already spent its budget,
+                counting `pending` (the cost of calls in flight) as spent
+        """
+        cost = self.cost + pending
+        if REQUEST_BUDGET_USD and cost >= REQUEST_BUDGET_USD:
+            raise BudgetExceededError(f"Request budget of ${REQUEST_BUDGET_USD:g} spent (${cost:.4f})")
+        if SESSION_BUDGET_USD and self.session_id and self.session_spent + cost >= SESSION_BUDGET_USD:
+            raise BudgetExceededError(
+                f"Session budget of ${SESSION_BUDGET_USD:g} spent (${self.session_spent + cost:.4f})"
+            )
+
+    def reserve(self, amount: float) -> None:
+        """
+        Check the budgets, counting the calls in flight as spent, and reserve `amount` for a
+        new call. Concurrent calls thus cannot all pass the check before any of them is recorded.
+
+        Raises:
+            BudgetExceededError: if the budget is spent
+        """
+        with self._lock:
+            self.check_budget(self.reserved)
+            self.reserved += amount
+
+    def release(self, amount: float) -> None:
+        """Drop a reservation once the call it was made for is recorded (or did not happen)."""
+        with self._lock:
+            self.reserved = max(0.0, self.reserved - amount)
+
+
+class LedgerStore:
+    """
+    Finished ledgers, one row per request. All methods are blocking; call them through
+    asyncio.to_thread from async code.
+    """
+
+    def __init__(self, db_path: str):
+        self._connection = connect(db_path)
+        self._lock = threading.Lock()
+        self._connection.executescript(_SCHEMA)
+
+    def save(self, ledger: Ledger) -> None:
+        totals = ledger.totals()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO requests (id, endpoint, session_id, created_at, calls, input_tokens, "
+                "output_tokens, cached_tokens, latency_seconds, cost_usd, entries) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    ledger.id, ledger.endpoint, ledger.session_id, ledger.created_at, totals["calls"],
+                    totals["input_tokens"], totals["output_tokens"], totals["cached_tokens"],
+                    totals["latency_seconds"], totals["cost_usd"], json.dumps(ledger.entries),
+                ),
+            )
+
+    def session_cost(self, session_id: str) -> float:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COALESCE(SUM(cost_usd), 0) FROM requests WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+
+    def get(self, ledger_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute("SELECT * FROM requests WHERE id = ?", (ledger_id,)).fetchone()
+        if row is None:
+            return None
+        return {**dict(row), "entries": json.loads(row["entries"])}
+
+    def totals(self, group_by: str, since: Optional[float] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Sum the requests per endpoint or per session, most expensive first."""
+        column = _GROUP_COLUMNS[group_by]
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {column} AS key, COUNT(*) AS requests, SUM(calls) AS calls, "
+                "SUM(input_tokens) AS input_tokens, SUM(output_tokens) AS output_tokens, "
+                "SUM(cached_tokens) AS cached_tokens, SUM(cost_usd) AS cost_usd, "
+                "AVG(latency_seconds) AS call_seconds_per_request "
+                f"FROM requests WHERE created_at >= ? GROUP BY {column} ORDER BY cost_usd DESC LIMIT ?",
+                (since or 0.0, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+_store: Optional[LedgerStore] = None
+_current: contextvars.ContextVar[Optional[Ledger]] = contextvars.ContextVar("ledger", default=None)
+_ledger_metrics = {"ledgers": 0, "calls": 0, "cost_usd": 0.0, "budget_rejections": 0, "save_failures": 0}
+
+
+def get_ledger_store() -> LedgerStore:
+    global _store
+    if _store is None:
+        _store = LedgerStore(LEDGER_DB_PATH)
+    return _store
+
+
+def current_ledger() -> Optional[Ledger]:
+    return _current.get()
+
+
+def open_ledger(endpoint: str, session_id: Optional[str] = None) -> Tuple[Optional[Ledger], Optional[contextvars.Token]]:
+    """
+    Make a new ledger current for the calling context. Returns (None, None) when the ledger
+    is disabled; otherwise pass the token to close_ledger.
+    """
+    if not LEDGER_ENABLED:
+        return None, None
+    ledger = Ledger(endpoint, session_id)
+    return ledger, _current.set(ledger)
+
+
+def close_ledger(token: Optional[contextvars.Token]) -> None:
+    if token is not None:
+        _current.reset(token)
+
+
+async def bind_session(session_id: Optional[str]) -> None:
+    """Attribute the current ledger to a session and load what the session already spent."""
+    ledger = current_ledger()
+    if ledger is None or not session_id or (ledger.session_id == session_id and ledger.session_loaded):
+        return
+    ledger.session_id = session_id
+    ledger.session_loaded = True
+    if SESSION_BUDGET_USD:
+        store = await asyncio.to_thread(get_ledger_store)
+        ledger.session_spent = await asyncio.to_thread(store.session_cost, session_id)
+
+
+async def save_ledger(ledger: Optional[Ledger]) -> None:
+    """Store a finished ledger if it recorded any call."""
+    if ledger is None or not ledger.entries:
+        return
+    _ledger_metrics["ledgers"] += 1
+    _ledger_metrics["calls"] += len(ledger.entries)
+    _ledger_metrics["cost_usd"] += ledger.cost
+    try:
+        store = await asyncio.to_thread(get_ledger_store)
+        await asyncio.to_thread(store.save, ledger)
+    except Exception as e:
+        _ledger_metrics["save_failures"] += 1
+        print(f"Could not save cost ledger {ledger.id}: {e}")
+
+
+@asynccontextmanager
+async def track_costs(endpoint: str, session_id: Optional[str] = None) -> AsyncIterator[Optional[Ledger]]:
+    """
+    Record the calls made inside the block in their own ledger, saved on exit. For work that
+    outlives its request (jobs, speculation, deferred images); the session defaults to the
+    one of the enclosing ledger.
+    """
+    parent = current_ledger()
+    ledger, token = open_ledger(endpoint, session_id or (parent.session_id if parent else None))
+    try:
+        if ledger is not None and ledger.session_id:
+            await bind_session(ledger.session_id)
+        yield ledger
+    finally:
+        close_ledger(token)
+        await save_ledger(ledger)
+
+
+# (kind, model) -> cost of the last such call, to estimate the next one
+_last_costs: Dict[Tuple[str, str], float] = {}
+
+
+def estimate_call_cost(kind: str, model: str) -> float:
+    """Estimated USD cost of the next call of a kind and model, 0 for unpriced models."""
+    if (kind, model) in _last_costs:
+        return _last_costs[(kind, model)]
+    if kind == "image":
+        return IMAGE_COST_USD
+    return estimate_cost(model, BUDGET_RESERVE_TOKENS, BUDGET_RESERVE_TOKENS // 4) or 0.0
+
+
+def reserve_budget(kind: str, model: str) -> float:
+    """
+    Reserve the estimated cost of a call against the current request's budgets. Release the
+    returned amount with release_budget once the call is recorded.
+
+    Raises:
+        BudgetExceededError: if the current request or session has spent its budget, counting
+            the calls still in flight
+    """
+    ledger = current_ledger()
+    if ledger is None:
+        return 0.0
+    amount = estimate_call_cost(kind, model)
+    try:
+        ledger.reserve(amount)
+    except BudgetExceededError:
+        _ledger_metrics["budget_rejections"] += 1
+        raise
+    return amount
+
+
+def release_budget(amount: float) -> None:
+    ledger = current_ledger()
+    if ledger is not None and amount:
+        ledger.release(amount)
+
+
+def record_llm_call(kind: str, model: str, result: Any, latency: float, ok: bool = True) -> None:
+    """Add an LLM call to the current ledger; failed calls are recorded without tokens."""
+    ledger = current_ledger()
+    if ledger is None:
+        return
+    if not ok:
+        ledger.record(kind, model, latency, ok=False)
+        return
+    input_tokens, output_tokens, cached_tokens = extract_usage(result)
+    cost = estimate_cost(model, input_tokens, output_tokens, cached_tokens)
+    if cost is not None:
+        _last_costs[(kind, model)] = cost
+    ledger.record(kind, model, latency, input_tokens, output_tokens, cached_tokens, cost)
+
+
+def record_hedge_loser(kind: str, model: str, result: Any, latency: float, winner: Any) -> None:
+    """
+    Add the request that lost a hedged race to the current ledger. A cancelled request
+    reports no usage, so it is billed like the winning one: same prompt, similar output.
+    """
+    ledger = current_ledger()
+    if ledger is None:
+        return
+    if result is not None:
+        record_llm_call(f"{kind}:hedge", model, result, latency)
+        return
+    input_tokens, output_tokens, cached_tokens = extract_usage(winner)
+    cost = estimate_cost(model, input_tokens, output_tokens, cached_tokens)
+    ledger.record(f"{kind}:hedge", model, latency, input_tokens, output_tokens, cached_tokens, cost, estimated=True)
+
+
+def record_image_call(model: str, latency: float, ok: bool = True) -> None:
+    """Add an image generation to the current ledger, priced at IMAGE_COST_USD when it succeeded."""
+    ledger = current_ledger()
+    if ledger is not None:
+        ledger.record("image", model, latency, cost=IMAGE_COST_USD if ok else 0.0, ok=ok)
+
+
+def ledger_header(ledger: Ledger) -> str:
+    """Compact JSON totals of a ledger for the X-Request-Cost response header."""
+    return json.dumps(ledger.totals(), separators=(",", ":"))
+
+
+async def get_ledger(ledger_id: str) -> Optional[Dict[str, Any]]:
+    store = await asyncio.to_thread(get_ledger_store)
+    return await asyncio.to_thread(store.get, ledger_id)
+
+
+async def get_ledger_totals(group_by: str, since: Optional[float], limit: int) -> List[Dict[str, Any]]:
+    store = await asyncio.to_thread(get_ledger_store)
+    return await asyncio.to_thread(store.totals, group_by, since, limit)
+
+
+def get_ledger_metrics() -> Dict[str, Any]:
+    """Return ledger totals for this worker since it started."""
+    return {
+        **_ledger_metrics,
+        "request_budget_usd": REQUEST_BUDGET_USD or None,
+        "session_budget_usd": SESSION_BUDGET_USD or None,
+    }
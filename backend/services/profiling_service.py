@@ -0,0 +1,136 @@
+"""
+Service for profiling single requests on demand with cProfile.
+"""
+import asyncio
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import re
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from config.settings import PROFILING_ADMIN_TOKEN, PROFILE_OUTPUT_DIR, PROFILE_MAX_FILES
+
+PROFILE_HEADER = "x-profile"
+ADMIN_TOKEN_HEADER = "x-admin-token"
+
+_PROFILE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# cProfile hooks the whole event loop thread, so only one request is profiled at a time
+_profile_lock = asyncio.Lock()
+
+
+def is_profiling_authorized(token: Optional[str]) -> bool:
+    """Check an admin token against the configured one. Profiling is disabled without a configured token."""
+    if not PROFILING_ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), PROFILING_ADMIN_TOKEN.encode())
+
+
+def profiling_requested(headers: Dict[str, str], query_params: Dict[str, str]) -> bool:
+    """
+    Whether a request asks to be profiled, via the X-Profile header or the ?profile= query flag.
+    The admin token is only accepted as a header so it does not end up in access logs.
+    """
+    flag = headers.get(PROFILE_HEADER) or query_params.get("profile")
+    if flag not in ("1", "true", "yes"):
+        return False
+    return is_profiling_authorized(headers.get(ADMIN_TOKEN_HEADER))
+
+
+async def buffer_body(response: Any) -> Any:
+    """
+    Read a response's whole body (e.g. a streaming response from BaseHTTPMiddleware's call_next,
+    which returns once the headers are ready) and replay it from memory, so the work that
+    produces the body runs inside the profiled section.
+    """
+    chunks = [chunk if isinstance(chunk, bytes) else chunk.encode("utf-8") async for chunk in response.body_iterator]
+
+    async def replay():
+        yield b"".join(chunks)
+
+    response.body_iterator = replay()
+    return response
+
+
+def _profile_path(profile_id: str) -> str:
+    return os.path.join(PROFILE_OUTPUT_DIR, f"{profile_id}.pstats")
+
+
+def _prune_profiles() -> None:
+    """Keep only the PROFILE_MAX_FILES most recent profiles."""
+    profiles = list_profiles()
+    for profile in profiles[PROFILE_MAX_FILES:]:
+        try:
+            os.remove(_profile_path(profile["id"]))
+        except OSError:
+            pass
+
+
+async def run_profiled(call: Callable[[], Awaitable[Any]], label: str) -> Tuple[Any, Optional[str]]:
+    """
+    Await `call` under cProfile and store the stats on disk.
+
+    cProfile records everything executed on the event loop thread while the call is running,
+    which includes other requests being served concurrently. Work offloaded to the CPU
+    executor runs in other threads and is not recorded.
+
+    Returns:
+        (result of call, profile ID). The profile ID is None if another profile was already running.
+    """
+    if _profile_lock.locked():
+        return await call(), None
+
+    async with _profile_lock:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            result = await call()
+        finally:
+            profiler.disable()
+
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", label).strip("-") or "root"
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(PROFILE_OUTPUT_DIR, exist_ok=True)
+        profiler.dump_stats(_profile_path(profile_id))
+        _prune_profiles()
+        return result, profile_id
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """List stored profiles, most recent first."""
+    if not os.path.isdir(PROFILE_OUTPUT_DIR):
+        return []
+    profiles = []
+    for filename in os.listdir(PROFILE_OUTPUT_DIR):
+        if not filename.endswith(".pstats"):
+            continue
+        path = os.path.join(PROFILE_OUTPUT_DIR, filename)
+        stat = os.stat(path)
+        profiles.append({
+            "id": filename[:-len(".pstats")],
+            "created_at": stat.st_mtime,
+            "size_bytes": stat.st_size,
+        })
+    return sorted(profiles, key=lambda profile: profile["created_at"], reverse=True)
+
+
+def get_profile_path(profile_id: str) -> Optional[str]:
+    """Return the path of a stored profile, or None if the ID is invalid or unknown."""
+    if not _PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = _profile_path(profile_id)
+    return path if os.path.isfile(path) else None
+
+
+def render_profile(profile_id: str, sort: str = "cumulative", limit: int = 50) -> Optional[str]:
+    """Render a stored profile as a pstats text table."""
+    path = get_profile_path(profile_id)
+    if path is None:
+        return None
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
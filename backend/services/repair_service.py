@@ -0,0 +1,184 @@
+"""
+Service for validating generated cards and repairing the fields that fail fluid type checking.
+"""
+import json
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel, create_model
+from models.cards import Card, ReactCard
+from models.responses import FluidTypeCheckingResponse
+from services.validation_service import perform_fluid_type_checking, MIN_FIELD_SCORE
+from services.routing_service import routed_call
+from services.agent_pool import get_agent
+from services.ledger_service import BudgetExceededError
+from utils.conversion import cast_react_card_to_pydantic, pydantic_to_react_content
+from utils.type_checking import has_nested_card_fields
+from prompts import create_field_repair_prompt
+from config.settings import AGENT_CALL_TIMEOUT_SECONDS, REPAIR_MAX_ATTEMPTS
+
+_repair_metrics = {
+    "cards_checked": 0,
+    "cards_failed": 0,
+    "cards_repaired": 0,
+    "cards_dropped": 0,
+    "repair_calls": 0,
+    "blank_repairs": 0,
+}
+
+
+def get_failing_fields(validation_result: FluidTypeCheckingResponse) -> List[str]:
+    """Return the fields whose fluid type checking score is below MIN_FIELD_SCORE."""
+    return [name for name, result in validation_result.field_scores.items() if result.score < MIN_FIELD_SCORE]
+
+
+def build_repair_prompt(card: Card, validation_result: FluidTypeCheckingResponse, failing: List[str], intention: str) -> str:
+    """
+    Render the card and the feedback on its failing fields into the repair prompt.
+    """
+    model_fields = card.__class__.model_fields
+    feedback = []
+    for name in failing:
+        description = model_fields[name].description or ""
+        result = validation_result.field_scores[name]
+        feedback.append(f"- {name} (description: {description!r}) - {result.score}/10: {result.reasoning}")
+
+    card_json = json.dumps(card.model_dump(exclude={"w", "h", "x", "y", "img_source"}), default=str)
+    return create_field_repair_prompt(
+        intention=intention,
+        card_type=card.__class__.__name__,
+        card_json=card_json,
+        field_feedback="\n".join(feedback),
+    )
+
+
+@lru_cache(maxsize=256)
+def _repair_class(card_class: Type[Card], failing: Tuple[str, ...]) -> Type[BaseModel]:
+    # A model restricted to the failing fields, with their original types and descriptions.
+    # Cached so the repair agent for the same fields is reused (card classes are cached too)
+    return create_model(
+        f"{card_class.__name__}Repair",
+        **{name: (card_class.model_fields[name].annotation, card_class.model_fields[name]) for name in failing},
+    )
+
+
+def _is_blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip()) or value == [] or value == {}
+
+
+async def repair_card_fields(card: Card, validation_result: FluidTypeCheckingResponse, failing: List[str], intention: str) -> Card:
+    """
+    Regenerate only the failing fields of a card and merge them into a copy of it.
+
+    Raises:
+        ValueError: if the repair emptied a field that had content. Fluid type checking skips
+            empty values, so the field would pass with its content silently dropped.
+    """
+    card_class = card.__class__
+    repair_class = _repair_class(card_class, tuple(failing))
+    prompt = build_repair_prompt(card, validation_result, failing, intention)
+
+    _repair_metrics["repair_calls"] += 1
+    result = await routed_call(
+        "structured",
+        "repair_fields",
+        lambda model: get_agent(model, repair_class).run(prompt),
+        timeout=AGENT_CALL_TIMEOUT_SECONDS,
+    )
+    repaired = result.output.model_dump()
+    blanked = [name for name in failing if _is_blank(repaired.get(name)) and not _is_blank(getattr(card, name))]
+    if blanked:
+        _repair_metrics["blank_repairs"] += 1
+        raise ValueError(f"Repair emptied fields that had content: {', '.join(blanked)}")
+    return card_class.model_validate({**card.model_dump(), **repaired})
+
+
+async def validate_and_repair_cards(
+    generated_cards: List[ReactCard],
+    card_types: Dict[str, Type[Card]],
+    intention: str,
+    max_attempts: Optional[int] = None,
+) -> List[ReactCard]:
+    """
+    Run fluid type checking on generated cards and repair the ones that fail.
+
+    Only the failing fields of a card are regenerated, at most `max_attempts` times
+    (REPAIR_MAX_ATTEMPTS by default). Repaired cards list the regenerated fields in
+    `repaired_fields`; cards that still fail are dropped and the other cards are kept.
+
+    Raises:
+        ValueError: if fluid type checking could not run, or if every checked card failed
+    """
+    if max_attempts is None:
+        max_attempts = REPAIR_MAX_ATTEMPTS
+
+    valid_cards = []
+    errors = []
+    for card in generated_cards:
+        print(f"Validating card: {card.card_type}")
+
+        # Skip validation for cards with nested fields
+        card_type_class = card_types.get(card.card_type)
+        if card_type_class and has_nested_card_fields(card_type_class):
+            print(f"Skipping fluid type checking for card with nested fields: {card.card_type}")
+            valid_cards.append(card)
+            continue
+
+        try:
+            pydantic_card = cast_react_card_to_pydantic(card, card_types)
+            validation_result = await perform_fluid_type_checking(pydantic_card, card_types)
+        except ValueError as e:
+            # Handle unknown card type errors gracefully
+            if "Unknown card type:" in str(e):
+                print(f"Skipping fluid type checking for unknown card type: {card.card_type}")
+                valid_cards.append(card)
+                continue
+            print(f"Error performing fluid type checking on generated pydantic card: {e}")
+            raise ValueError(f"Failed to run fluid typechecking: {str(e)}")
+        except BudgetExceededError:
+            raise
+        except Exception as e:
+            print(f"Error performing fluid type checking on generated pydantic card: {e}")
+            raise ValueError(f"Failed to run fluid typechecking: {str(e)}")
+
+        _repair_metrics["cards_checked"] += 1
+        if not validation_result.errors:
+            valid_cards.append(card)
+            continue
+
+        _repair_metrics["cards_failed"] += 1
+        print(f"Fluid type checking failed for {card.card_type}: {validation_result.errors}")
+        repaired_fields = set()
+        for attempt in range(max_attempts):
+            failing = get_failing_fields(validation_result)
+            try:
+                pydantic_card = await repair_card_fields(pydantic_card, validation_result, failing, intention)
+                validation_result = await perform_fluid_type_checking(pydantic_card, card_types)
+            except BudgetExceededError:
+                raise
+            except Exception as e:
+                print(f"Repair attempt {attempt + 1} failed for {card.card_type}: {e}")
+                break
+            repaired_fields.update(failing)
+            if not validation_result.errors:
+                break
+
+        if validation_result.errors:
+            _repair_metrics["cards_dropped"] += 1
+            errors.extend(validation_result.errors)
+            print(f"Dropping card {card.card_type} after {max_attempts} repair attempts: {validation_result.errors}")
+            continue
+
+        _repair_metrics["cards_repaired"] += 1
+        repaired_card = pydantic_to_react_content(pydantic_card)[0]
+        repaired_card.x, repaired_card.y = card.x, card.y
+        repaired_card.repaired_fields = sorted(repaired_fields)
+        valid_cards.append(repaired_card)
+
+    if generated_cards and not valid_cards:
+        raise ValueError(f"Fluid Typechecking error: {errors}")
+    return valid_cards
+
+
+def get_repair_metrics() -> Dict[str, int]:
+    """Return counters of cards checked, failed, repaired and dropped."""
+    return dict(_repair_metrics)
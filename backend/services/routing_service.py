@@ -0,0 +1,173 @@
+"""
+Service for routing LLM calls across equivalent models with health tracking.
+"""
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Tuple, TypeVar
+from config.settings import (
+    STRUCTURED_MODELS,
+    FAST_MODELS,
+    RAW_NOTES_MODELS,
+    LLM_CALL_TIMEOUT_SECONDS,
+    ROUTER_WINDOW,
+    ROUTER_MIN_SAMPLES,
+    ROUTER_MAX_ERROR_RATE,
+    ROUTER_COOLDOWN_SECONDS,
+)
+from services.hedging_service import hedged_call
+from services.ledger_service import reserve_budget, release_budget, record_llm_call, record_hedge_loser
+
+T = TypeVar("T")
+
+# Candidate models per role, in order of preference
+ROLE_MODELS: Dict[str, List[str]] = {
+    "structured": STRUCTURED_MODELS,
+    "fast": FAST_MODELS,
+    "raw_notes": RAW_NOTES_MODELS,
+}
+
+
+class AllModelsFailedError(Exception):
+    """Raised when every candidate model for a role failed the call."""
+
+
+class _ModelHealth:
+    """Rolling outcomes of the calls routed to one model for one role."""
+
+    def __init__(self):
+        self.outcomes: Deque[Tuple[bool, float]] = deque(maxlen=ROUTER_WINDOW)
+        self.calls = 0
+        self.errors = 0
+        self.failovers = 0
+        self.unhealthy_until = 0.0
+
+    def record(self, ok: bool, latency: float) -> None:
+        self.calls += 1
+        self.outcomes.append((ok, latency))
+        if ok:
+            return
+        self.errors += 1
+        if len(self.outcomes) >= ROUTER_MIN_SAMPLES and self.error_rate() >= ROUTER_MAX_ERROR_RATE:
+            self.unhealthy_until = time.monotonic() + ROUTER_COOLDOWN_SECONDS
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for ok, _ in self.outcomes if not ok) / len(self.outcomes)
+
+    def median_latency(self):
+        latencies = sorted(latency for ok, latency in self.outcomes if ok)
+        if len(latencies) < ROUTER_MIN_SAMPLES:
+            return None
+        return latencies[len(latencies) // 2]
+
+    def is_healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+
+_health: Dict[Tuple[str, str], _ModelHealth] = {}
+
+
+def _get_health(role: str, model: str) -> _ModelHealth:
+    return _health.setdefault((role, model), _ModelHealth())
+
+
+def rank_models(role: str) -> List[str]:
+    """
+    Order the candidate models of a role for the next call.
+
+    Healthy models come first. Among them, measured models are ordered by median latency,
+    followed by the models with too few samples in their configured order. The primary model
+    thus keeps first place until a fallback that failover traffic measured is faster.
+    """
+    candidates = ROLE_MODELS[role]
+
+    def sort_key(indexed):
+        index, model = indexed
+        health = _get_health(role, model)
+        latency = health.median_latency()
+        if latency is None:
+            return (not health.is_healthy(), True, 0.0, index)
+        return (not health.is_healthy(), False, latency, index)
+
+    return [model for _, model in sorted(enumerate(candidates), key=sort_key)]
+
+
+async def routed_call(
+    role: str,
+    key: str,
+    factory: Callable[[str], Awaitable[T]],
+    timeout: float = LLM_CALL_TIMEOUT_SECONDS,
+) -> T:
+    """
+    Run an LLM call on the best candidate model for `role`, failing over on errors.
+
+    Each attempt is a hedged call with its own deadline, tracked as `{key}:{model}`, and is
+    recorded in the request's cost ledger, together with the request that lost the race
+    when the attempt was hedged.
+
+    Args:
+        role: One of ROLE_MODELS ("structured", "fast", "raw_notes")
+        key: Identifies the call type, e.g. "generate_card"
+        factory: Creates a new call for the given model name each time it is invoked
+        timeout: Deadline in seconds for each attempt
+
+    Raises:
+        AllModelsFailedError: if every candidate failed (the last error is chained)
+        BudgetExceededError: if the request or its session has spent its budget, counting
+            the estimated cost of its calls still in flight
+    """
+    last_error = None
+    for attempt, model in enumerate(rank_models(role)):
+        reserved = reserve_budget(key, model)
+        health = _get_health(role, model)
+        if attempt > 0:
+            health.failovers += 1
+        start = time.monotonic()
+        losers = []
+        try:
+            result = await hedged_call(
+                f"{key}:{model}",
+                lambda: factory(model),
+                timeout=timeout,
+                on_loser=lambda loser, loser_latency: losers.append((loser, loser_latency)),
+            )
+        except Exception as e:
+            latency = time.monotonic() - start
+            health.record(False, latency)
+            record_llm_call(key, model, None, latency, ok=False)
+            release_budget(reserved)
+            print(f"{key} failed on {model}: {e}")
+            last_error = e
+            continue
+        except BaseException:
+            release_budget(reserved)
+            raise
+        latency = time.monotonic() - start
+        health.record(True, latency)
+        record_llm_call(key, model, result, latency)
+        for loser, loser_latency in losers:
+            record_hedge_loser(key, model, loser, loser_latency, result)
+        release_budget(reserved)
+        return result
+
+    raise AllModelsFailedError(f"{key}: all {role} models failed") from last_error
+
+
+def get_routing_metrics() -> Dict[str, Any]:
+    """Return the current model ranking and per model health for each role."""
+    metrics = {}
+    for role, candidates in ROLE_MODELS.items():
+        models = {}
+        for model in candidates:
+            health = _get_health(role, model)
+            models[model] = {
+                "calls": health.calls,
+                "errors": health.errors,
+                "failovers": health.failovers,
+                "error_rate": health.error_rate(),
+                "median_latency_s": health.median_latency(),
+                "healthy": health.is_healthy(),
+            }
+        metrics[role] = {"ranking": rank_models(role), "models": models}
+    return metrics
@@ -0,0 +1,284 @@
+"""
+Service for the distilled fluid type check scorer.
+
+LLM verdicts are logged to SQLite and used to train a logistic regression over hashed
+n-gram features, which predicts whether a field value matches its description.
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from config.settings import (
+    VERDICT_LOG_ENABLED,
+    VERDICT_DB_PATH,
+    VERDICT_MAX_PER_FIELD,
+    SCORER_MODEL_PATH,
+    SCORER_CONFIDENCE,
+    SCORER_SHADOW_RATE,
+)
+from utils.sqlite import connect
+
+N_FEATURES = 2 ** 18
+_WORD = re.compile(r"\w+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    card_type TEXT NOT NULL,
+    field_name TEXT NOT NULL,
+    description TEXT NOT NULL,
+    value TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS verdicts_field ON verdicts (card_type, field_name, id);
+"""
+
+
+class VerdictStore:
+    """
+    Log of LLM fluid type check verdicts, keeping the latest `max_per_field` of each card
+    type field. All methods are blocking; call them through asyncio.to_thread from async code.
+    """
+
+    def __init__(self, db_path: str, max_per_field: int = VERDICT_MAX_PER_FIELD):
+        self.max_per_field = max_per_field
+        self._connection = connect(db_path)
+        self._lock = threading.Lock()
+        self._connection.executescript(_SCHEMA)
+
+    def record(self, card_type: str, field_name: str, description: str, value: str, score: int) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO verdicts (card_type, field_name, description, value, score, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (card_type, field_name, description, value, score, time.time()),
+            )
+            self._connection.execute(
+                """DELETE FROM verdicts WHERE card_type = ? AND field_name = ? AND id <= (
+                    SELECT id FROM verdicts WHERE card_type = ? AND field_name = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+                )""",
+                (card_type, field_name, card_type, field_name, self.max_per_field),
+            )
+
+    def examples(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT card_type, field_name, description, value, score FROM verdicts ORDER BY id"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def _hash(feature: str) -> int:
+    # crc32 rather than hash(), which is salted per process
+    return zlib.crc32(feature.encode("utf-8")) % N_FEATURES
+
+
+def featurize(card_type: str, field_name: str, description: str, value: str) -> Dict[int, float]:
+    """
+    Hash a field into sparse features: field identity, value words, bigrams and character
+    trigrams, description words, description/value word pairs and their overlap.
+    """
+    value = str(value)
+    value_words = [word.lower() for word in _WORD.findall(value)]
+    description_words = [word.lower() for word in _WORD.findall(description or field_name)]
+
+    features = {f"f:{field_name}", f"t:{card_type}:{field_name}", f"len:{min(10, int(math.log2(len(value) + 1)))}"}
+    features.update(f"v:{word}" for word in value_words)
+    features.update(f"vb:{a} {b}" for a, b in zip(value_words, value_words[1:]))
+    lowered = value.lower()[:200]
+    features.update(f"c:{lowered[i:i + 3]}" for i in range(len(lowered) - 2))
+    features.update(f"d:{word}" for word in description_words)
+    features.update(f"dv:{d}|{v}" for d in description_words[:10] for v in value_words[:20])
+    if value.rstrip().endswith("?"):
+        features.add("question_mark")
+
+    norm = 1 / math.sqrt(len(features))
+    vector: Dict[int, float] = defaultdict(float)
+    for feature in features:
+        vector[_hash(feature)] += norm
+    if description_words:
+        overlap = len(set(description_words) & set(value_words)) / len(set(description_words))
+        vector[_hash("overlap")] += overlap
+    return dict(vector)
+
+
+def _sigmoid(z: float) -> float:
+    if z < -30:
+        return 0.0
+    if z > 30:
+        return 1.0
+    return 1 / (1 + math.exp(-z))
+
+
+class DistilledScorer:
+    """Sparse logistic regression predicting whether a field passes fluid type checking."""
+
+    def __init__(self, weights: Dict[int, float], bias: float, report: Optional[Dict[str, Any]] = None):
+        self.weights = weights
+        self.bias = bias
+        self.report = report or {}
+
+    def predict_proba(self, card_type: str, field_name: str, description: str, value: str) -> float:
+        features = featurize(card_type, field_name, description, value)
+        z = self.bias + sum(self.weights.get(index, 0.0) * x for index, x in features.items())
+        return _sigmoid(z)
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        payload = {
+            "n_features": N_FEATURES,
+            "bias": self.bias,
+            "weights": {str(index): weight for index, weight in self.weights.items() if weight != 0.0},
+            "report": self.report,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "DistilledScorer":
+        with open(path) as f:
+            payload = json.load(f)
+        if payload["n_features"] != N_FEATURES:
+            raise ValueError(f"Scorer was trained with {payload['n_features']} features, expected {N_FEATURES}")
+        weights = {int(index): weight for index, weight in payload["weights"].items()}
+        return cls(weights, payload["bias"], payload.get("report"))
+
+
+def _vectorize(examples: List[Dict[str, Any]], min_score: int) -> List[Tuple[Dict[int, float], int]]:
+    return [
+        (
+            featurize(example["card_type"], example["field_name"], example["description"], example["value"]),
+            int(example["score"] >= min_score),
+        )
+        for example in examples
+    ]
+
+
+def train(
+    examples: List[Dict[str, Any]],
+    min_score: int,
+    epochs: int = 10,
+    learning_rate: float = 0.5,
+    l2: float = 1e-5,
+    seed: int = 0,
+) -> DistilledScorer:
+    """
+    Fit the scorer with SGD on logged verdicts; a verdict passes when its score >= min_score.
+    """
+    rows = _vectorize(examples, min_score)
+    weights: Dict[int, float] = defaultdict(float)
+    bias = 0.0
+    rng = random.Random(seed)
+    for epoch in range(epochs):
+        rng.shuffle(rows)
+        rate = learning_rate / (1 + epoch)
+        for features, label in rows:
+            z = bias + sum(weights[index] * x for index, x in features.items())
+            gradient = _sigmoid(z) - label
+            bias -= rate * gradient
+            for index, x in features.items():
+                weights[index] -= rate * (gradient * x + l2 * weights[index])
+    return DistilledScorer(dict(weights), bias)
+
+
+def evaluate(scorer: DistilledScorer, examples: List[Dict[str, Any]], min_score: int, confidence: float) -> Dict[str, Any]:
+    """
+    Compare the scorer with the LLM verdicts: overall agreement, the share of fields it would
+    decide locally at `confidence`, and its agreement and false passes on those fields.
+    """
+    total = confident = agree = confident_agree = false_pass = 0
+    for example in examples:
+        label = example["score"] >= min_score
+        p = scorer.predict_proba(example["card_type"], example["field_name"], example["description"], example["value"])
+        total += 1
+        agree += (p >= 0.5) == label
+        if max(p, 1 - p) >= confidence:
+            confident += 1
+            confident_agree += (p >= 0.5) == label
+            false_pass += p >= 0.5 and not label
+    return {
+        "examples": total,
+        "agreement": agree / total if total else None,
+        "coverage": confident / total if total else None,
+        "confident_agreement": confident_agree / confident if confident else None,
+        "confident_false_passes": false_pass,
+    }
+
+
+_store: Optional[VerdictStore] = None
+_scorer: Optional[DistilledScorer] = None
+_scorer_loaded = False
+_scorer_metrics = {"shadowed": 0, "shadow_agreements": 0, "verdicts_logged": 0}
+
+
+def get_verdict_store() -> VerdictStore:
+    global _store
+    if _store is None:
+        _store = VerdictStore(VERDICT_DB_PATH)
+    return _store
+
+
+def get_scorer() -> Optional[DistilledScorer]:
+    """Return the trained scorer, loaded once per process, or None if none was trained."""
+    global _scorer, _scorer_loaded
+    if not _scorer_loaded:
+        _scorer_loaded = True
+        if os.path.exists(SCORER_MODEL_PATH):
+            try:
+                _scorer = DistilledScorer.load(SCORER_MODEL_PATH)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Could not load fluid type check scorer from {SCORER_MODEL_PATH}: {e}")
+    return _scorer
+
+
+def predict_confident(card_type: str, field_name: str, description: str, value: Any) -> Optional[float]:
+    """
+    Return the pass probability when the scorer is confident enough to skip the LLM, else None.
+    """
+    scorer = get_scorer()
+    if scorer is None:
+        return None
+    p = scorer.predict_proba(card_type, field_name, description, str(value))
+    return p if max(p, 1 - p) >= SCORER_CONFIDENCE else None
+
+
+def should_shadow() -> bool:
+    """Whether a locally decided field should still be sent to the LLM to measure agreement."""
+    return random.random() < SCORER_SHADOW_RATE
+
+
+def record_shadow_agreement(agrees: bool) -> None:
+    _scorer_metrics["shadowed"] += 1
+    _scorer_metrics["shadow_agreements"] += agrees
+
+
+async def record_verdict(card_type: str, field_name: str, description: str, value: Any, score: int) -> None:
+    """Log an LLM verdict as training data for the scorer."""
+    if not VERDICT_LOG_ENABLED:
+        return
+    try:
+        await asyncio.to_thread(get_verdict_store().record, card_type, field_name, description, str(value), score)
+        _scorer_metrics["verdicts_logged"] += 1
+    except Exception as e:
+        print(f"Could not log fluid type check verdict: {e}")
+
+
+def get_scorer_metrics() -> Dict[str, Any]:
+    """Return whether a scorer is loaded, its training report and the live shadow agreement."""
+    scorer = get_scorer()
+    shadowed = _scorer_metrics["shadowed"]
+    return {
+        "loaded": scorer is not None,
+        "training_report": scorer.report if scorer is not None else None,
+        **_scorer_metrics,
+        "shadow_agreement": _scorer_metrics["shadow_agreements"] / shadowed if shadowed else None,
+    }
@@ -0,0 +1,450 @@
+"""
+Server-side session store: boards are saved as card-level deltas, with periodic snapshots
+so any past state can be rebuilt without replaying the whole history. The current cards
+of every session are indexed with FTS5 for full-text search.
+"""
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from utils.sqlite import connect
+from config.settings import SESSION_DB_PATH, SESSION_SNAPSHOT_EVERY
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    intention TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    seq INTEGER NOT NULL DEFAULT 0,
+    snapshot_seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS session_cards (
+    session_id TEXT NOT NULL,
+    card_id TEXT NOT NULL,
+    card TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (session_id, card_id)
+);
+CREATE TABLE IF NOT EXISTS session_deltas (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    intention TEXT,
+    upserts TEXT NOT NULL,
+    deletes TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE TABLE IF NOT EXISTS session_snapshots (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    intention TEXT,
+    cards TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+"""
+
+# Kept in sync with session_cards by triggers, so every save updates the index incrementally
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS session_cards_fts USING fts5(
+    title, body, extra, session_id UNINDEXED, card_id UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS session_cards_fts_insert AFTER INSERT ON session_cards BEGIN
+    INSERT INTO session_cards_fts (rowid, title, body, extra, session_id, card_id) VALUES (
+        new.rowid, json_extract(new.card, '$.title'), json_extract(new.card, '$.body'),
+        (SELECT group_concat(value, ' ') FROM json_each(new.card, '$.extra_fields')),
+        new.session_id, new.card_id
+    );
+END;
+CREATE TRIGGER IF NOT EXISTS session_cards_fts_delete AFTER DELETE ON session_cards BEGIN
+    DELETE FROM session_cards_fts WHERE rowid = old.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS session_cards_fts_update AFTER UPDATE ON session_cards BEGIN
+    DELETE FROM session_cards_fts WHERE rowid = old.rowid;
+    INSERT INTO session_cards_fts (rowid, title, body, extra, session_id, card_id) VALUES (
+        new.rowid, json_extract(new.card, '$.title'), json_extract(new.card, '$.body'),
+        (SELECT group_concat(value, ' ') FROM json_each(new.card, '$.extra_fields')),
+        new.session_id, new.card_id
+    );
+END;
+"""
+_REINDEX = """
+INSERT INTO session_cards_fts (rowid, title, body, extra, session_id, card_id)
+SELECT rowid, json_extract(card, '$.title'), json_extract(card, '$.body'),
+       (SELECT group_concat(value, ' ') FROM json_each(card, '$.extra_fields')), session_id, card_id
+FROM session_cards
+"""
+# bm25 weights of the title, body and extra field columns
+_RANK = "bm25(session_cards_fts, 5.0, 1.0, 2.0)"
+_TERM = re.compile(r"\w+")
+MAX_QUERY_TERMS = 32
+
+
+def build_match_query(text: str, any_term: bool = False) -> str:
+    """
+    Turn free text into an FTS5 query of quoted terms, so user input cannot be parsed as
+    query syntax. Terms are all required, or alternatives with `any_term`.
+    Returns an empty string if the text has no searchable terms.
+    """
+    terms = [f'"{term}"' for term in _TERM.findall(text)[:MAX_QUERY_TERMS]]
+    return (" OR " if any_term else " ").join(terms)
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+
+class SessionConflict(Exception):
+    """Raised when a delta was computed against a different version than the stored one."""
+
+    def __init__(self, session_id: str, expected: int, actual: int):
+        super().__init__(f"Session {session_id} is at seq {actual}, delta applies to seq {expected}")
+        self.actual = actual
+
+
+class SessionStore:
+    """
+    Session storage. `session_cards` holds the current board, `session_deltas` every save
+    and `session_snapshots` the full board every `snapshot_every` saves.
+    All methods are blocking; call them through asyncio.to_thread from async code.
+    """
+
+    def __init__(self, db_path: str, snapshot_every: int = SESSION_SNAPSHOT_EVERY):
+        self.snapshot_every = snapshot_every
+        self._connection = connect(db_path)
+        self._lock = threading.Lock()
+        self._connection.executescript(_SCHEMA)
+        try:
+            self._connection.executescript(_FTS_SCHEMA)
+        except sqlite3.OperationalError as e:
+            print(f"Session search disabled, SQLite was built without FTS5: {e}")
+            self.search_available = False
+        else:
+            self.search_available = True
+            self._backfill_index()
+
+    def _backfill_index(self) -> None:
+        # Databases written before the index existed
+        indexed = self._connection.execute("SELECT COUNT(*) FROM session_cards_fts").fetchone()[0]
+        stored = self._connection.execute("SELECT COUNT(*) FROM session_cards").fetchone()[0]
+        if indexed != stored:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.execute("DELETE FROM session_cards_fts")
+                self._connection.execute(_REINDEX)
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def _session_row(self, session_id: str):
+        return self._connection.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+
+    def _current_cards(self, session_id: str) -> Dict[str, Dict[str, Any]]:
+        rows = self._connection.execute(
+            "SELECT card_id, card FROM session_cards WHERE session_id = ? ORDER BY rowid", (session_id,)
+        ).fetchall()
+        return {row["card_id"]: json.loads(row["card"]) for row in rows}
+
+    def _write_snapshot(self, session_id: str, seq: int, now: float, intention: Optional[str]) -> None:
+        cards = self._current_cards(session_id)
+        self._connection.execute(
+            "INSERT OR REPLACE INTO session_snapshots (session_id, seq, created_at, intention, cards) VALUES (?, ?, ?, ?, ?)",
+            (session_id, seq, now, intention, _dumps(cards)),
+        )
+        self._connection.execute("UPDATE sessions SET snapshot_seq = ? WHERE session_id = ?", (seq, session_id))
+
+    def _begin_save(self, session_id: str, intention: Optional[str], now: float):
+        row = self._session_row(session_id)
+        if row is None:
+            self._connection.execute(
+                "INSERT INTO sessions (session_id, intention, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, intention, now, now),
+            )
+            row = self._session_row(session_id)
+        return row
+
+    def save_snapshot(self, session_id: str, cards: List[Dict[str, Any]], intention: Optional[str] = None) -> Dict[str, Any]:
+        """Replace the whole board of a session (first save, or resync after a conflict)."""
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._begin_save(session_id, intention, now)
+                seq = row["seq"] + 1
+                intention = intention if intention is not None else row["intention"]
+                self._connection.execute("DELETE FROM session_cards WHERE session_id = ?", (session_id,))
+                self._connection.executemany(
+                    "INSERT INTO session_cards (session_id, card_id, card, updated_at) VALUES (?, ?, ?, ?)",
+                    [(session_id, card["id"], _dumps(card), now) for card in cards],
+                )
+                self._connection.execute(
+                    "UPDATE sessions SET seq = ?, updated_at = ?, intention = ? WHERE session_id = ?",
+                    (seq, now, intention, session_id),
+                )
+                self._write_snapshot(session_id, seq, now, intention)
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return self.summary(session_id)
+
+    def append_delta(
+        self,
+        session_id: str,
+        upserts: List[Dict[str, Any]],
+        deletes: List[str],
+        intention: Optional[str] = None,
+        base_seq: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Apply card-level changes to a session and log them.
+
+        Raises:
+            SessionConflict: if `base_seq` is given and the session is at another seq
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._begin_save(session_id, intention, now)
+                if base_seq is not None and base_seq != row["seq"]:
+                    raise SessionConflict(session_id, base_seq, row["seq"])
+                seq = row["seq"] + 1
+                # An upsert rather than INSERT OR REPLACE, whose implicit delete skips the index triggers
+                self._connection.executemany(
+                    "INSERT INTO session_cards (session_id, card_id, card, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (session_id, card_id) DO UPDATE SET card = excluded.card, updated_at = excluded.updated_at",
+                    [(session_id, card["id"], _dumps(card), now) for card in upserts],
+                )
+                self._connection.executemany(
+                    "DELETE FROM session_cards WHERE session_id = ? AND card_id = ?",
+                    [(session_id, card_id) for card_id in deletes],
+                )
+                self._connection.execute(
+                    "INSERT INTO session_deltas (session_id, seq, created_at, intention, upserts, deletes) VALUES (?, ?, ?, ?, ?, ?)",
+                    (session_id, seq, now, intention, _dumps(upserts), _dumps(deletes)),
+                )
+                current_intention = intention if intention is not None else row["intention"]
+                self._connection.execute(
+                    "UPDATE sessions SET seq = ?, updated_at = ?, intention = ? WHERE session_id = ?",
+                    (seq, now, current_intention, session_id),
+                )
+                if seq - row["snapshot_seq"] >= self.snapshot_every:
+                    self._write_snapshot(session_id, seq, now, current_intention)
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return self.summary(session_id)
+
+    def summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT s.session_id, s.intention, s.created_at, s.updated_at, s.seq, "
+                "(SELECT COUNT(*) FROM session_cards c WHERE c.session_id = s.session_id) AS card_count "
+                "FROM sessions s WHERE s.session_id = ?",
+                (session_id,),
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def list_sessions(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Return sessions, most recently updated first."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT s.session_id, s.intention, s.created_at, s.updated_at, s.seq, "
+                "(SELECT COUNT(*) FROM session_cards c WHERE c.session_id = s.session_id) AS card_count "
+                "FROM sessions s ORDER BY s.updated_at DESC LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def latest(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return the current board of a session."""
+        with self._lock:
+            row = self._session_row(session_id)
+            if row is None:
+                return None
+            cards = self._current_cards(session_id)
+        return {
+            "session_id": session_id,
+            "seq": row["seq"],
+            "timestamp": row["updated_at"],
+            "intention": row["intention"],
+            "cards": list(cards.values()),
+        }
+
+    def at(self, session_id: str, timestamp: float) -> Optional[Dict[str, Any]]:
+        """
+        Rebuild the board of a session as it was at `timestamp`, from the closest earlier
+        snapshot and the deltas saved after it. Returns None if the session did not exist yet.
+        """
+        with self._lock:
+            snapshot = self._connection.execute(
+                "SELECT seq, created_at, intention, cards FROM session_snapshots "
+                "WHERE session_id = ? AND created_at <= ? ORDER BY seq DESC LIMIT 1",
+                (session_id, timestamp),
+            ).fetchone()
+            base_seq = snapshot["seq"] if snapshot is not None else 0
+            deltas = self._connection.execute(
+                "SELECT seq, created_at, intention, upserts, deletes FROM session_deltas "
+                "WHERE session_id = ? AND seq > ? AND created_at <= ? ORDER BY seq",
+                (session_id, base_seq, timestamp),
+            ).fetchall()
+        if snapshot is None and not deltas:
+            return None
+
+        cards = json.loads(snapshot["cards"]) if snapshot is not None else {}
+        seq = base_seq
+        saved_at = snapshot["created_at"] if snapshot is not None else None
+        intention = snapshot["intention"] if snapshot is not None else None
+        for delta in deltas:
+            for card in json.loads(delta["upserts"]):
+                cards[card["id"]] = card
+            for card_id in json.loads(delta["deletes"]):
+                cards.pop(card_id, None)
+            seq, saved_at = delta["seq"], delta["created_at"]
+            intention = delta["intention"] if delta["intention"] is not None else intention
+        return {
+            "session_id": session_id,
+            "seq": seq,
+            "timestamp": saved_at,
+            "intention": intention,
+            "cards": list(cards.values()),
+        }
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        session_id: Optional[str] = None,
+        exclude_session_id: Optional[str] = None,
+        any_term: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Rank the current cards of all sessions (or of `session_id`) by BM25 relevance to
+        `query`, titles weighing most. Returns the total number of matches and one page of hits.
+        """
+        if not self.search_available:
+            raise RuntimeError("Session search requires SQLite with FTS5")
+        match = build_match_query(query, any_term)
+        if not match:
+            return {"total": 0, "hits": []}
+
+        where, params = "session_cards_fts MATCH ?", [match]
+        if session_id is not None:
+            where += " AND f.session_id = ?"
+            params.append(session_id)
+        if exclude_session_id is not None:
+            where += " AND f.session_id != ?"
+            params.append(exclude_session_id)
+        with self._lock:
+            total = self._connection.execute(
+                f"SELECT COUNT(*) FROM session_cards_fts f WHERE {where}", params
+            ).fetchone()[0]
+            rows = self._connection.execute(
+                f"SELECT f.session_id, c.card, c.updated_at, s.intention, {_RANK} AS rank, "
+                "snippet(session_cards_fts, -1, '<mark>', '</mark>', '…', 12) AS snippet "
+                "FROM session_cards_fts f "
+                "JOIN session_cards c ON c.rowid = f.rowid "
+                "JOIN sessions s ON s.session_id = f.session_id "
+                f"WHERE {where} ORDER BY rank LIMIT ? OFFSET ?",
+                [*params, limit, offset],
+            ).fetchall()
+        hits = [
+            {
+                "session_id": row["session_id"],
+                "intention": row["intention"],
+                "updated_at": row["updated_at"],
+                # bm25() is lower for better matches
+                "score": -row["rank"],
+                "snippet": row["snippet"],
+                "card": json.loads(row["card"]),
+            }
+            for row in rows
+        ]
+        return {"total": total, "hits": hits}
+
+
+_store: Optional[SessionStore] = None
+_session_metrics = {"snapshots": 0, "deltas": 0, "conflicts": 0, "cards_upserted": 0, "cards_deleted": 0, "replays": 0, "searches": 0, "search_seconds": 0.0}
+
+
+def get_session_store() -> SessionStore:
+    global _store
+    if _store is None:
+        _store = SessionStore(SESSION_DB_PATH)
+    return _store
+
+
+async def save_session_snapshot(session_id: str, cards: List[Dict[str, Any]], intention: Optional[str]) -> Dict[str, Any]:
+    store = await asyncio.to_thread(get_session_store)
+    summary = await asyncio.to_thread(store.save_snapshot, session_id, cards, intention)
+    _session_metrics["snapshots"] += 1
+    return summary
+
+
+async def append_session_delta(
+    session_id: str,
+    upserts: List[Dict[str, Any]],
+    deletes: List[str],
+    intention: Optional[str],
+    base_seq: Optional[int],
+) -> Dict[str, Any]:
+    """Apply and log card-level changes. Raises SessionConflict if `base_seq` is stale."""
+    store = await asyncio.to_thread(get_session_store)
+    try:
+        summary = await asyncio.to_thread(store.append_delta, session_id, upserts, deletes, intention, base_seq)
+    except SessionConflict:
+        _session_metrics["conflicts"] += 1
+        raise
+    _session_metrics["deltas"] += 1
+    _session_metrics["cards_upserted"] += len(upserts)
+    _session_metrics["cards_deleted"] += len(deletes)
+    return summary
+
+
+async def get_session_state(session_id: str, at: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Return the latest board of a session, or the board at timestamp `at`."""
+    store = await asyncio.to_thread(get_session_store)
+    if at is None:
+        return await asyncio.to_thread(store.latest, session_id)
+    _session_metrics["replays"] += 1
+    return await asyncio.to_thread(store.at, session_id, at)
+
+
+async def list_sessions(limit: int, offset: int) -> List[Dict[str, Any]]:
+    store = await asyncio.to_thread(get_session_store)
+    return await asyncio.to_thread(store.list_sessions, limit, offset)
+
+
+async def search_session_cards(
+    query: str,
+    limit: int = 20,
+    offset: int = 0,
+    session_id: Optional[str] = None,
+    exclude_session_id: Optional[str] = None,
+    any_term: bool = False,
+) -> Dict[str, Any]:
+    """Full-text search over the saved cards of every session, see SessionStore.search."""
+    store = await asyncio.to_thread(get_session_store)
+    start = time.perf_counter()
+    result = await asyncio.to_thread(store.search, query, limit, offset, session_id, exclude_session_id, any_term)
+    _session_metrics["searches"] += 1
+    _session_metrics["search_seconds"] += time.perf_counter() - start
+    return result
+
+
+def get_session_metrics() -> Dict[str, Any]:
+    """Return session save and search counters."""
+    searches = _session_metrics["searches"]
+    return {
+        **_session_metrics,
+        "search_mean_ms": 1000 * _session_metrics["search_seconds"] / searches if searches else None,
+    }
@@ -0,0 +1,184 @@
+"""
+Service for speculative card generation ahead of the frontend's generation triggers.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from models.cards import ReactCard
+from models.requests import BoardState
+from services.ledger_service import track_costs
+from config.settings import (
+    SPECULATION_MAX_PER_SESSION,
+    SPECULATION_MAX_CONCURRENT,
+    SPECULATION_MIN_INTERVAL_SECONDS,
+    SPECULATION_TTL_SECONDS,
+)
+
+Generator = Callable[[BoardState], Awaitable[List[ReactCard]]]
+
+
+def board_digest(board: BoardState) -> str:
+    """
+    Hash the parts of a board that matter for generation. Card positions, sizes,
+    timestamps and image sources are ignored, so moving cards around does not
+    invalidate a speculative result.
+    """
+    cards = sorted(
+        (
+            card.card_type,
+            (card.title or "").strip(),
+            (card.body or "").strip(),
+            (card.img_prompt or "").strip(),
+            sorted((card.extra_fields or {}).items()),
+        )
+        for card in board.cards
+    )
+    canonical = json.dumps(
+        [board.intention.strip(), board.sidepanel_code, cards, board.defer_images, board.past_context], separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _SessionSpeculation:
+    # (strategy, digest) -> running generation, oldest first
+    tasks: "OrderedDict[Tuple[str, str], asyncio.Task]" = field(default_factory=OrderedDict)
+    # (strategy, digest) -> (cards, finished_at)
+    results: Dict[Tuple[str, str], Tuple[List[ReactCard], float]] = field(default_factory=dict)
+    last_used: float = field(default_factory=time.monotonic)
+    last_scheduled: Optional[float] = None
+
+
+_sessions: Dict[str, _SessionSpeculation] = {}
+_semaphore: Optional[asyncio.Semaphore] = None
+_metrics = {"scheduled": 0, "rate_limited": 0, "cancelled": 0, "failed": 0, "hits": 0, "joined": 0, "misses": 0}
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(SPECULATION_MAX_CONCURRENT)
+    return _semaphore
+
+
+def _prune(now: float) -> None:
+    """Drop expired results and sessions that have been idle for longer than the TTL."""
+    for session_id, session in list(_sessions.items()):
+        for key, (_, finished_at) in list(session.results.items()):
+            if now - finished_at > SPECULATION_TTL_SECONDS:
+                del session.results[key]
+        if not session.tasks and not session.results and now - session.last_used > SPECULATION_TTL_SECONDS:
+            del _sessions[session_id]
+
+
+async def _run_speculation(session: _SessionSpeculation, key: Tuple[str, str], board: BoardState, generate: Generator):
+    try:
+        async with _get_semaphore(), track_costs("speculate", board.session_id):
+            cards = await generate(board)
+        session.results[key] = (cards, time.monotonic())
+        return cards
+    except asyncio.CancelledError:
+        _metrics["cancelled"] += 1
+        raise
+    except Exception as e:
+        _metrics["failed"] += 1
+        print(f"Speculative generation failed: {e}")
+        return None
+    finally:
+        session.tasks.pop(key, None)
+
+
+def schedule_speculation(board: BoardState, strategy: str, generate: Generator) -> Tuple[bool, str]:
+    """
+    Start generating cards for `board` in the background.
+
+    At most SPECULATION_MAX_PER_SESSION generations run per session: when the board changes
+    again, the oldest in-flight generation is cancelled since its board is stale. A session
+    starts at most one generation per SPECULATION_MIN_INTERVAL_SECONDS.
+
+    Returns:
+        (whether a new generation was started, board digest)
+    """
+    if not board.session_id:
+        raise ValueError("Speculative generation requires a session_id")
+
+    now = time.monotonic()
+    _prune(now)
+    digest = board_digest(board)
+    key = (strategy, digest)
+    session = _sessions.setdefault(board.session_id, _SessionSpeculation())
+    session.last_used = now
+
+    if key in session.results or key in session.tasks:
+        return False, digest
+    if session.last_scheduled is not None and now - session.last_scheduled < SPECULATION_MIN_INTERVAL_SECONDS:
+        _metrics["rate_limited"] += 1
+        return False, digest
+
+    while len(session.tasks) >= SPECULATION_MAX_PER_SESSION:
+        _, stale_task = session.tasks.popitem(last=False)
+        stale_task.cancel()
+
+    board_copy = board.model_copy(deep=True)
+    session.tasks[key] = asyncio.create_task(_run_speculation(session, key, board_copy, generate))
+    session.last_scheduled = now
+    _metrics["scheduled"] += 1
+    return True, digest
+
+
+async def take_speculative_result(board: BoardState, strategy: str) -> Optional[List[ReactCard]]:
+    """
+    Return the speculative result for this board if one exists, waiting for it if it is
+    still running. The result is consumed, so the next trigger gets fresh suggestions.
+    """
+    session = _sessions.get(board.session_id) if board.session_id else None
+    if session is None:
+        return None
+
+    session.last_used = time.monotonic()
+    key = (strategy, board_digest(board))
+
+    cached = session.results.pop(key, None)
+    if cached is not None and time.monotonic() - cached[1] <= SPECULATION_TTL_SECONDS:
+        _metrics["hits"] += 1
+        return [card.model_copy(deep=True) for card in cached[0]]
+
+    task = session.tasks.get(key)
+    if task is not None:
+        try:
+            # Shield so a disconnecting client does not cancel the shared generation
+            cards = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+            cards = None
+        session.results.pop(key, None)
+        if cards is not None:
+            _metrics["joined"] += 1
+            return [card.model_copy(deep=True) for card in cards]
+
+    _metrics["misses"] += 1
+    return None
+
+
+def cancel_session_speculation(session_id: str) -> int:
+    """Cancel all speculative generations of a session. Returns how many were cancelled."""
+    session = _sessions.pop(session_id, None)
+    if session is None:
+        return 0
+    for task in session.tasks.values():
+        task.cancel()
+    return len(session.tasks)
+
+
+def get_speculation_metrics() -> Dict[str, int]:
+    """Return speculation counters and the number of in-flight generations."""
+    return {
+        **_metrics,
+        "sessions": len(_sessions),
+        "in_flight": sum(len(session.tasks) for session in _sessions.values()),
+    }
@@ -1,17 +1,86 @@
 """
 Service for fluid type checking and validation.
 """
+import enum
 import json
-from typing import Any, Dict, Type
-from litellm import acompletion
+from functools import lru_cache
+from typing import Annotated, Any, Dict, Literal, Optional, Type, Union, get_args, get_origin
+from pydantic import TypeAdapter, ValidationError
 from models.cards import Card
 from models.responses import FieldValidationResult, FluidTypeCheckLLMResponse, FluidTypeCheckingResponse
-from config.settings import FAST_MODEL_NAME
+from services.routing_service import routed_call
+from services.ledger_service import BudgetExceededError
+from services.scorer_service import (
+    predict_confident,
+    should_shadow,
+    record_shadow_agreement,
+    record_verdict,
+    get_scorer_metrics,
+)
 
+# Fields scoring below this are reported as errors
+MIN_FIELD_SCORE = 5
 
-async def validate_field_with_llm(field_name: str, field_value: Any, field_description: str, card_type_name: str) -> FieldValidationResult:
+_prevalidation_metrics = {"local": 0, "distilled": 0, "escalated": 0}
+
+
+@lru_cache(maxsize=256)
+def _field_adapter(card_class: type, field_name: str) -> TypeAdapter:
+    """
+    TypeAdapter enforcing a field's type and `Field` constraints, built once per field.
+    Bounded, since every change to the sidepanel code defines new card classes.
+    """
+    field_info = card_class.model_fields[field_name]
+    annotation = field_info.annotation
+    if field_info.metadata:
+        annotation = Annotated[(annotation, *field_info.metadata)]
+    return TypeAdapter(annotation)
+
+
+def _strip_optional(annotation: Any) -> Any:
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def prevalidate_field(card_class: type, field_name: str, field_value: Any) -> Optional[FieldValidationResult]:
+    """
+    Score a field with deterministic rules when no semantic judgement is needed.
+
+    Blank strings and values breaking the field's type or `Field` constraints (max_length,
+    pattern, ge/le, ...) fail; allowed enum/Literal values, numbers and booleans pass.
+    Returns None when the value needs an LLM to judge it against its description.
+    """
+    if isinstance(field_value, str) and not field_value.strip():
+        return FieldValidationResult(score=1, reasoning="The value is empty.")
+
+    try:
+        _field_adapter(card_class, field_name).validate_python(field_value)
+    except ValidationError as e:
+        message = "; ".join(error["msg"] for error in e.errors())
+        return FieldValidationResult(score=1, reasoning=f"The value breaks the field constraints: {message}")
+
+    annotation = _strip_optional(card_class.model_fields[field_name].annotation)
+    if get_origin(annotation) is Literal or (isinstance(annotation, type) and issubclass(annotation, enum.Enum)):
+        return FieldValidationResult(score=10, reasoning="The value is one of the allowed values.")
+    if annotation in (int, float, bool):
+        return FieldValidationResult(score=10, reasoning=f"The value is a valid {annotation.__name__}.")
+    return None
+
+
+async def validate_field_with_llm(
+    field_name: str,
+    field_value: Any,
+    field_description: str,
+    card_type_name: str,
+    local_score: Optional[int] = None,
+) -> FieldValidationResult:
     """
     Use Groq LLM to validate how well a field value matches its description.
+    The verdict is logged as training data for the distilled scorer; when `local_score`
+    is given (a shadowed field), its agreement with the verdict is recorded.
     """
     prompt = f"""On a score from 1 to 10, how much does this value match this description for the type called {card_type_name}?
 
@@ -23,9 +92,11 @@ Please provide a score from 1 to 10 and reasoning for your score. Be strict but
 If the description is empty, be less strict and rely on the field name to judge."""
 
     try:
+        from litellm import acompletion
+
         # Use async completion with structured output
-        response = await acompletion(
-            model=FAST_MODEL_NAME,
+        response = await routed_call("fast", "fluid_check", lambda model: acompletion(
+            model=model,
             messages=[{
                 "role": "user",
                 "content": prompt
@@ -33,19 +104,25 @@ If the description is empty, be less strict and rely on the field name to judge.
             max_tokens=200,
             temperature=0.0,
             response_format=FluidTypeCheckLLMResponse
-        )
+        ))
         
         content = response.choices[0].message.content.strip()
         
         # Parse the structured JSON response
         llm_result = json.loads(content)
         validated_result = FluidTypeCheckLLMResponse(**llm_result)
+        await record_verdict(card_type_name, field_name, field_description, field_value, validated_result.score)
+        if local_score is not None:
+            record_shadow_agreement((local_score >= MIN_FIELD_SCORE) == (validated_result.score >= MIN_FIELD_SCORE))
         
         return FieldValidationResult(
             score=validated_result.score,
             reasoning=validated_result.reasoning
         )
         
+    except BudgetExceededError:
+        # Not a verdict on the field: let the request fail instead of scoring it low
+        raise
     except Exception as e:
         print(f"LLM validation error for field {field_name}: {e}")
         # Return a low score if LLM call fails
@@ -92,18 +169,47 @@ async def perform_fluid_type_checking(card: Card, card_types: Dict[str, Type[Car
             # Convert field name to human readable description
             field_description = ''
         
-        # Validate field with LLM
-        validation_result = await validate_field_with_llm(
-            field_name, field_value, field_description, card_type_name
-        )
+        # Decide with rules, then the distilled scorer, and only then validate field with LLM
+        validation_result = prevalidate_field(card.__class__, field_name, field_value)
+        local_score = None
+        if validation_result is None:
+            p = predict_confident(card_type_name, field_name, field_description, field_value)
+            if p is not None:
+                local_score = max(1, min(10, round(1 + 9 * p)))
+                validation_result = FieldValidationResult(
+                    score=local_score, reasoning=f"Scored by the distilled model (pass probability {p:.2f})."
+                )
+                if should_shadow():
+                    validation_result = None
+            if validation_result is not None:
+                _prevalidation_metrics["distilled"] += 1
+        else:
+            _prevalidation_metrics["local"] += 1
+
+        if validation_result is None:
+            _prevalidation_metrics["escalated"] += 1
+            validation_result = await validate_field_with_llm(
+                field_name, field_value, field_description, card_type_name, local_score=local_score
+            )
         
         field_scores[field_name] = validation_result
         
         # Add to errors if score is too low
-        if validation_result.score < 5:
+        if validation_result.score < MIN_FIELD_SCORE:
             errors.append(f"**{field_name}** - {validation_result.score}/10: {validation_result.reasoning}")
     
     return FluidTypeCheckingResponse(
         errors=errors,
         field_scores=field_scores
-    )
\ No newline at end of file
+    )
+
+
+def get_validation_metrics() -> Dict[str, Any]:
+    """Return how many fields were scored by rules, by the distilled scorer and by the LLM."""
+    total = sum(_prevalidation_metrics.values())
+    local = _prevalidation_metrics["local"] + _prevalidation_metrics["distilled"]
+    return {
+        **_prevalidation_metrics,
+        "local_rate": local / total if total else 0.0,
+        "scorer": get_scorer_metrics(),
+    }
@@ -0,0 +1,153 @@
+"""
+Service for warming up a worker after startup.
+"""
+import asyncio
+import importlib
+import time
+from typing import Any, Dict, List, Optional
+from utils.offload import run_cpu_bound
+from utils.board_serializer import load_encoding
+from config.default_card_types import DEFAULT_SIDEPANEL_CODE
+from config.settings import (
+    STRUCTURED_MODELS,
+    WARMUP_ON_STARTUP,
+    WARMUP_CARD_TYPES_FILE,
+    WARMUP_CONNECT,
+    WARMUP_CONNECT_TIMEOUT,
+)
+
+# Provider SDKs that are imported lazily on first use
+LAZY_MODULES = ["litellm", "pydantic_ai", "anthropic", "runware", "logfire"]
+
+# The (generation, user_card) variants requests compile sidepanel code with
+_CARD_TYPE_VARIANTS = [(True, False), (False, False), (False, True)]
+
+_state: Dict[str, Any] = {"ready": False, "started_at": None, "finished_at": None, "timings": {}, "errors": []}
+
+
+def import_lazy_modules() -> Dict[str, float]:
+    """
+    Import the lazily loaded provider SDKs and return the import time of each, in seconds.
+    """
+    timings = {}
+    for module_name in LAZY_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module_name)
+        except ImportError as e:
+            print(f"Warmup: could not import {module_name}: {e}")
+            continue
+        timings[module_name] = time.perf_counter() - start
+    return timings
+
+
+def warmup_sidepanel_codes() -> List[str]:
+    """Return the sidepanel codes to precompile: the default one and the configured file, if any."""
+    codes = [DEFAULT_SIDEPANEL_CODE]
+    if WARMUP_CARD_TYPES_FILE:
+        try:
+            with open(WARMUP_CARD_TYPES_FILE, encoding="utf-8") as f:
+                codes.append(f.read())
+        except OSError as e:
+            _state["errors"].append(f"card types file: {e}")
+    return codes
+
+
+def warm_card_types(code: str) -> List[type]:
+    """
+    Compile sidepanel code for every way requests compile it (the results are cached), and
+    build the JSON schemas of its card types. Returns the card types used for generation.
+    """
+    from services.code_service import get_card_types_from_code
+
+    generation_types: List[type] = []
+    for generation, user_card in _CARD_TYPE_VARIANTS:
+        success, error, card_types = get_card_types_from_code(code, generation=generation, user_card=user_card)
+        if not success:
+            raise ValueError(error)
+        for card_class in card_types.values():
+            card_class.model_json_schema()
+        if generation:
+            generation_types = list(card_types.values())
+    return generation_types
+
+
+def warm_agents(card_type_classes: List[type]) -> None:
+    """Build the structured generation agents for a card type set, for every configured model."""
+    from services.agent_pool import get_agent
+
+    for model in STRUCTURED_MODELS:
+        try:
+            get_agent(model, card_type_classes)
+        except Exception as e:
+            # Typically a provider whose API key is not set here
+            _state["errors"].append(f"agent {model}: {e}")
+
+
+async def open_clients() -> None:
+    """Create the shared provider clients and, if WARMUP_CONNECT, establish their first connection."""
+    from services.clients import get_anthropic_client, get_http_client
+
+    client = get_anthropic_client()
+    get_http_client()
+    if WARMUP_CONNECT:
+        try:
+            await asyncio.wait_for(client.models.list(limit=1), timeout=WARMUP_CONNECT_TIMEOUT)
+        except Exception as e:
+            _state["errors"].append(f"anthropic connection: {e}")
+
+
+async def _timed(name: str, coroutine) -> Any:
+    start = time.perf_counter()
+    try:
+        return await coroutine
+    except Exception as e:
+        _state["errors"].append(f"{name}: {e}")
+        return None
+    finally:
+        _state["timings"][name] = time.perf_counter() - start
+
+
+async def warmup() -> Dict[str, float]:
+    """
+    Warm up the worker so the first requests do not pay for lazy initialization, then mark it
+    ready. Failed steps are reported in `get_readiness` but do not keep the worker from serving.
+    """
+    _state.update(ready=False, started_at=time.time(), finished_at=None, timings={}, errors=[])
+    imports = await _timed("imports", run_cpu_bound(import_lazy_modules, label="warmup"))
+    for module_name, seconds in (imports or {}).items():
+        _state["timings"][f"import:{module_name}"] = seconds
+
+    for index, code in enumerate(warmup_sidepanel_codes()):
+        card_type_classes = await _timed(f"card_types:{index}", run_cpu_bound(warm_card_types, code, label="warmup"))
+        if card_type_classes:
+            await _timed(f"agents:{index}", run_cpu_bound(warm_agents, card_type_classes, label="warmup"))
+
+    # Token counting of prompts uses it; it is otherwise loaded in the background on first use
+    await _timed("tokenizer", run_cpu_bound(load_encoding, label="warmup"))
+    await _timed("clients", open_clients())
+    mark_ready()
+
+    for error in _state["errors"]:
+        print(f"Warmup: {error}")
+    print(f"Warmup finished: {', '.join(f'{name}={t:.2f}s' for name, t in _state['timings'].items())}")
+    return _state["timings"]
+
+
+def start_warmup() -> Optional["asyncio.Task[Dict[str, float]]"]:
+    """Start the warmup in the background if WARMUP_ON_STARTUP, otherwise mark the worker ready."""
+    if not WARMUP_ON_STARTUP:
+        mark_ready()
+        return None
+    _state["ready"] = False
+    return asyncio.create_task(warmup())
+
+
+def mark_ready() -> None:
+    _state["ready"] = True
+    _state["finished_at"] = time.time()
+
+
+def get_readiness() -> Dict[str, Any]:
+    """Return whether the worker finished warming up, with the duration of each step and any errors."""
+    return {**_state, "timings": dict(_state["timings"]), "errors": list(_state["errors"])}
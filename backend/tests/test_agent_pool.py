@@ -0,0 +1,69 @@
+"""
+Tests for the agent pool and the compiled card type cache.
+"""
+from typing import List
+from pydantic import BaseModel
+import services.agent_pool as agent_pool
+from services.agent_pool import AgentPool
+from services.code_service import get_card_types_from_code
+
+SIDEPANEL_CODE = """
+class Idea(Card):
+    pass
+"""
+
+
+class Answer(BaseModel):
+    text: str
+
+
+class Other(BaseModel):
+    value: int
+
+
+def test_agents_are_shared_per_model_and_output_types():
+    pool = AgentPool(max_size=8, idle_seconds=3600)
+    agent = pool.get("test", [Answer, Other])
+    assert pool.get("test", [Answer, Other]) is agent
+    assert pool.get("test", [Other, Answer]) is not agent
+    assert pool.get("test", Answer) is not agent
+    assert pool.metrics == {"hits": 1, "misses": 3, "evictions": 0}
+
+
+def test_least_recently_used_agents_are_evicted():
+    pool = AgentPool(max_size=2, idle_seconds=3600)
+    first = pool.get("test", Answer)
+    pool.get("test", Other)
+    pool.get("test", Answer)
+    pool.get("test", [Answer, Other])
+    assert len(pool) == 2
+    assert pool.get("test", Answer) is first
+    assert pool.metrics["evictions"] == 1
+
+
+def test_idle_agents_are_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(agent_pool.time, "monotonic", lambda: now[0])
+    pool = AgentPool(max_size=8, idle_seconds=60)
+    first = pool.get("test", Answer)
+    now[0] += 61
+    assert pool.get("test", Answer) is not first
+    assert pool.metrics["evictions"] == 1
+
+
+def test_same_code_gives_the_same_card_types():
+    success, _, first = get_card_types_from_code(SIDEPANEL_CODE, generation=True)
+    assert success
+    _, _, second = get_card_types_from_code(SIDEPANEL_CODE, generation=True)
+    assert second["Idea"] is first["Idea"]
+    assert second is not first  # callers get their own dict
+
+    _, _, changed = get_card_types_from_code(SIDEPANEL_CODE + "\n", generation=True)
+    assert changed["Idea"] is not first["Idea"]
+
+
+def test_invalid_code_is_not_cached():
+    success, error, _ = get_card_types_from_code("class Broken(Card):\n    x: int = (")
+    assert not success and error
+    success, _, _ = get_card_types_from_code("class Broken(Card):\n    x: int = (")
+    assert not success
@@ -0,0 +1,73 @@
+"""
+Tests for the content-addressed image store and inline image replacement.
+"""
+import base64
+import hashlib
+import pytest
+import services.blob_store as blob_store
+from services.blob_store import BlobStore, externalize_inline_images, sniff_image_type
+from models.cards import ReactCard
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+@pytest.fixture
+def image_store(tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path))
+    monkeypatch.setattr(blob_store, "_image_store", store)
+    return store
+
+
+def make_card(img_source):
+    return ReactCard(w=250, h=200, x=0, y=0, title="Sunset", body="", card_type="Image", img_source=img_source)
+
+
+def test_put_is_content_addressed(image_store):
+    """Storing the same bytes twice yields one blob keyed by its SHA-256."""
+    digest = image_store.put(PNG_BYTES)
+    assert digest == hashlib.sha256(PNG_BYTES).hexdigest()
+    assert image_store.put(PNG_BYTES) == digest
+    assert image_store.read(digest) == PNG_BYTES
+    assert image_store.path("../../etc/passwd") is None
+
+
+def test_inline_images_are_replaced_by_references(image_store):
+    """Base64 data URLs are moved to the store, other sources are left alone."""
+    data_url = "data:image/png;base64," + base64.b64encode(PNG_BYTES).decode()
+    cards = [make_card(data_url), make_card("https://example.com/cat.png"), make_card(None)]
+
+    assert externalize_inline_images(cards) == 1
+
+    digest = hashlib.sha256(PNG_BYTES).hexdigest()
+    assert cards[0].img_source.endswith(f"/images/{digest}")
+    assert cards[1].img_source == "https://example.com/cat.png"
+    assert cards[2].img_source is None
+    assert image_store.read(digest) == PNG_BYTES
+
+
+def test_non_image_data_urls_are_kept():
+    """Data URLs that do not decode to a supported image format are not stored."""
+    svg = "data:image/svg+xml;base64," + base64.b64encode(b"<svg onload='alert(1)'/>").decode()
+    card = make_card(svg)
+    assert externalize_inline_images([card]) == 0
+    assert card.img_source == svg
+    assert sniff_image_type(b"<svg></svg>") is None
+
+
+@pytest.mark.asyncio
+async def test_session_saves_return_references_for_inline_images(image_store, tmp_path, monkeypatch):
+    import services.session_store as session_store
+    from api.sessions import save_snapshot_endpoint
+    from models.requests import SessionSnapshotRequest
+
+    monkeypatch.setattr(session_store, "_store", session_store.SessionStore(str(tmp_path / "sessions.sqlite3"), 10))
+    data_url = "data:image/png;base64," + base64.b64encode(PNG_BYTES).decode()
+    request = SessionSnapshotRequest(cards=[
+        {"id": "a", "w": 250, "h": 200, "x": 0, "y": 0, "title": "Sunset", "body": "", "card_type": "Image", "img_source": data_url},
+        {"id": "b", "w": 250, "h": 200, "x": 0, "y": 0, "title": "Plain", "body": "", "card_type": "Idea"},
+    ])
+    summary = await save_snapshot_endpoint("s1", request)
+
+    digest = hashlib.sha256(PNG_BYTES).hexdigest()
+    assert list(summary.image_refs) == ["a"]
+    assert summary.image_refs["a"].endswith(f"/images/{digest}")
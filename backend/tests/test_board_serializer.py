@@ -0,0 +1,98 @@
+"""
+Tests for the compact board serializer.
+"""
+import json
+import threading
+from typing import List, Optional
+from pydantic import Field
+import utils.board_serializer as board_serializer
+from utils.board_serializer import serialize_board, compact_card, group_cards, count_tokens
+from models.cards import Card, ReactCard
+
+
+def react_card(title, x, y, **kwargs):
+    return ReactCard(w=248.7, h=201.2, x=x, y=y, title=title, body=kwargs.pop("body", ""),
+                     card_type=kwargs.pop("card_type", "Idea"), **kwargs)
+
+
+class Question(Card):
+    answer: Optional[str] = Field(None)
+    priority: str = Field("normal")
+    followups: List["Question"] = Field(default_factory=list)
+
+
+def test_empty_fields_are_dropped_and_geometry_quantized():
+    card = react_card("Why?", 12.4, 476.0, img_source="data:image/png;base64,AAAA", img_prompt="",
+                      extra_fields={"source": "book", "page": ""}, createdAt=3.0)
+    assert compact_card(card) == {"type": "Idea", "w": 250, "h": 200, "x": 0, "y": 500,
+                                  "title": "Why?", "source": "book"}
+
+
+def test_pydantic_cards_keep_their_type_and_children():
+    card = Question(title="Root", w=200, h=200, x=0, y=0, priority="normal",
+                    followups=[Question(title="Child", w=200, h=200, x=0, y=250, answer="yes")])
+    compacted = compact_card(card)
+    assert compacted["type"] == "Question"
+    assert "priority" not in compacted and "body" not in compacted
+    assert compacted["followups"] == [{"type": "Question", "title": "Child", "answer": "yes",
+                                       "w": 200, "h": 200, "x": 0, "y": 250}]
+
+
+def test_board_is_smaller_than_repr():
+    cards = [react_card(f"Card {i}", 300 * i, 0, body="Some body text") for i in range(20)]
+    board = serialize_board(cards)
+    assert len(json.loads(board.text)) == 20
+    assert len(board.text) < len(str(cards)) / 2
+    assert board.tokens > 0
+    assert serialize_board([]).text == "[]"
+
+
+def test_groups_layout_clusters_nearby_cards():
+    cards = [react_card("a", 0, 0), react_card("b", 0, 250), react_card("far", 2000, 0)]
+    groups = group_cards([compact_card(card) for card in cards])
+    assert groups == [
+        {"area": [0, 0, 250, 450], "cards": [{"type": "Idea", "title": "a"}, {"type": "Idea", "title": "b"}]},
+        {"area": [2000, 0, 250, 200], "cards": [{"type": "Idea", "title": "far"}]},
+    ]
+    board = serialize_board(cards, layout="groups")
+    assert json.loads(board.text) == groups
+
+
+def test_token_count_falls_back_to_estimate(monkeypatch):
+    monkeypatch.setattr(board_serializer, "_encoding", False)
+    assert count_tokens("x" * 10) == (3, False)
+
+
+def test_repr_baseline_is_only_built_for_sampled_boards(monkeypatch):
+    monkeypatch.setattr(board_serializer, "_board_metrics", {"boards": 0, "cards": 0, "tokens": 0, "chars": 0})
+    monkeypatch.setattr(board_serializer, "_baseline_sample", {"boards": 0, "chars": 0, "baseline_chars": 0})
+    monkeypatch.setattr(board_serializer, "BASELINE_SAMPLE_EVERY", 3)
+    cards = [react_card(f"Card {i}", i * 300, 0) for i in range(4)]
+    for _ in range(7):
+        serialize_board(cards)
+
+    metrics = board_serializer.get_board_metrics()
+    assert metrics["boards"] == 7
+    assert metrics["baseline_sampled_boards"] == 3
+    assert 0 < metrics["size_ratio"] < 1
+
+
+def test_encoding_is_loaded_off_the_calling_thread(monkeypatch):
+    """Until the encoding is loaded, counts are estimated and loading starts in a background thread."""
+    monkeypatch.setattr(board_serializer, "_encoding", None)
+    monkeypatch.setattr(board_serializer, "_encoding_loading", False)
+    loaded = threading.Event()
+    threads = []
+
+    def fake_load():
+        threads.append(threading.get_ident())
+        loaded.set()
+        return False
+
+    monkeypatch.setattr(board_serializer, "load_encoding", fake_load)
+    assert count_tokens("x" * 10) == (3, False)
+    assert loaded.wait(2)
+    assert threads != [threading.get_ident()]
+    # Loading is only started once
+    count_tokens("x")
+    assert len(threads) == 1
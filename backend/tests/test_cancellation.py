@@ -0,0 +1,59 @@
+"""
+Tests for cancelling superseded or abandoned generation work.
+"""
+import asyncio
+import pytest
+from services.cancellation_service import run_cancellable, GenerationCancelled
+
+
+async def slow_work(started, cancelled):
+    started.set()
+    try:
+        await asyncio.sleep(10)
+        return "done"
+    except asyncio.CancelledError:
+        cancelled.set()
+        raise
+
+
+@pytest.mark.asyncio
+async def test_newer_request_supersedes_older_one():
+    """Starting a second generation for a session cancels the first one."""
+    started, cancelled = asyncio.Event(), asyncio.Event()
+    first = asyncio.create_task(run_cancellable(slow_work(started, cancelled), session_id="s1"))
+    await started.wait()
+
+    async def quick():
+        return "fresh"
+
+    assert await run_cancellable(quick(), session_id="s1") == "fresh"
+    with pytest.raises(GenerationCancelled, match="superseded"):
+        await first
+    assert cancelled.is_set()
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_work(monkeypatch):
+    """The work is cancelled once the client is reported as disconnected."""
+    monkeypatch.setattr("services.cancellation_service.DISCONNECT_POLL_INTERVAL_SECONDS", 0.01)
+    started, cancelled = asyncio.Event(), asyncio.Event()
+
+    async def is_disconnected():
+        return started.is_set()
+
+    with pytest.raises(GenerationCancelled, match="disconnected"):
+        await run_cancellable(slow_work(started, cancelled), is_disconnected=is_disconnected)
+    assert cancelled.is_set()
+
+
+@pytest.mark.asyncio
+async def test_other_sessions_are_not_affected():
+    async def work(value):
+        await asyncio.sleep(0.01)
+        return value
+
+    results = await asyncio.gather(
+        run_cancellable(work("a"), session_id="a"),
+        run_cancellable(work("b"), session_id="b"),
+    )
+    assert results == ["a", "b"]
@@ -0,0 +1,86 @@
+"""
+Tests for deferred image delivery.
+"""
+import asyncio
+import threading
+import pytest
+import services.deferred_images as deferred_images
+from services.deferred_images import (
+    DeferredImageStore,
+    defer_card_images,
+    wait_for_deferred_image,
+    iter_deferred_images,
+    cancel_deferred_images,
+)
+from models.cards import ReactCard
+
+
+def make_card(img_prompt="", img_source=None):
+    return ReactCard(w=250, h=200, x=0, y=0, title="T", body="", card_type="Idea",
+                     img_prompt=img_prompt, img_source=img_source)
+
+
+@pytest.fixture
+def generated(tmp_path, monkeypatch):
+    monkeypatch.setattr(deferred_images, "_store", DeferredImageStore(str(tmp_path / "deferred.sqlite3")))
+    monkeypatch.setattr(deferred_images, "DEFERRED_IMAGE_POLL_INTERVAL_SECONDS", 0.01)
+    prompts = []
+
+    async def fake_generate(prompt):
+        prompts.append(prompt)
+        await asyncio.sleep(0.05)
+        return "" if prompt == "broken" else f"http://localhost:8000/images/{len(prompts)}"
+
+    monkeypatch.setattr(deferred_images, "generate_cached_image", fake_generate)
+    return prompts
+
+
+@pytest.mark.asyncio
+async def test_cards_get_tokens_and_images_arrive_later(generated):
+    cards = [make_card("a fox"), make_card(), make_card("a cat", img_source="http://x/cat.png")]
+    assert await defer_card_images(cards) == 1
+    token = cards[0].img_token
+    assert token and cards[1].img_token is None and cards[2].img_token is None
+    assert cards[0].img_source is None
+
+    assert (await wait_for_deferred_image(token, timeout=0))["status"] == "pending"
+    image = await wait_for_deferred_image(token, timeout=2)
+    assert image == {"token": token, "status": "ready", "url": "http://localhost:8000/images/1"}
+
+
+@pytest.mark.asyncio
+async def test_event_stream_reports_each_image_once(generated):
+    cards = [make_card("a fox"), make_card("broken")]
+    await defer_card_images(cards)
+    tokens = [card.img_token for card in cards]
+
+    events = [image async for image in iter_deferred_images(tokens + ["unknown"], timeout=2)]
+    statuses = {image["token"]: image["status"] for image in events}
+    assert statuses == {tokens[0]: "ready", tokens[1]: "failed", "unknown": "failed"}
+
+
+@pytest.mark.asyncio
+async def test_shutdown_marks_pending_images_failed(generated):
+    cards = [make_card("a fox")]
+    await defer_card_images(cards)
+    await cancel_deferred_images()
+    assert (await wait_for_deferred_image(cards[0].img_token, timeout=0))["status"] == "failed"
+
+
+@pytest.mark.asyncio
+async def test_delivery_status_is_written_off_the_event_loop(generated, monkeypatch):
+    store = deferred_images.get_deferred_image_store()
+    finish = store.finish
+    threads = []
+
+    def recording_finish(token, url):
+        threads.append(threading.get_ident())
+        finish(token, url)
+
+    monkeypatch.setattr(store, "finish", recording_finish)
+    cards = [make_card("a fox"), make_card("a cat")]
+    await defer_card_images(cards)
+    await wait_for_deferred_image(cards[0].img_token, timeout=2)
+    await cancel_deferred_images()
+    assert len(threads) == 2
+    assert threading.get_ident() not in threads
@@ -0,0 +1,79 @@
+"""
+Tests for the JSON fast path and response compression.
+"""
+import gzip
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+import utils.compression as compression
+from models.requests import CardDescriptionRequest
+from utils.compression import CompressionMiddleware, select_encoding
+from utils.fast_json import FastJSONResponse, json_body
+
+
+def make_app(offload_size=256 * 1024):
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.add_middleware(CompressionMiddleware, minimum_size=100, offload_size=offload_size)
+
+    @app.post("/echo")
+    async def echo(request: CardDescriptionRequest = Depends(json_body(CardDescriptionRequest))):
+        return {"description": request.description}
+
+    return app
+
+
+def test_raw_body_validation():
+    """Bodies are validated from raw bytes, with FastAPI-style 422 errors."""
+    client = TestClient(make_app())
+    assert client.post("/echo", json={"description": "short"}).json() == {"description": "short"}
+
+    response = client.post("/echo", content=b'{"nope": 1}')
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "description"]
+
+    assert client.post("/echo", content=b"{not json").status_code == 422
+
+
+def test_large_responses_are_compressed():
+    """Responses above the threshold are gzipped when the client accepts it, small ones are not."""
+    client = TestClient(make_app())
+    description = "a long card body " * 50
+
+    response = client.post("/echo", json={"description": description}, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json()["description"] == description
+
+    small = client.post("/echo", json={"description": "hi"}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+    raw = client.post("/echo", json={"description": description}, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers
+
+
+def test_large_bodies_are_compressed_in_the_executor(monkeypatch):
+    """Bodies above the offload threshold are compressed through run_cpu_bound, smaller ones inline."""
+    labels = []
+    run_cpu_bound = compression.run_cpu_bound
+
+    async def recording_run_cpu_bound(func, *args, label):
+        labels.append(label)
+        return await run_cpu_bound(func, *args, label=label)
+
+    monkeypatch.setattr(compression, "run_cpu_bound", recording_run_cpu_bound)
+    client = TestClient(make_app(offload_size=1000))
+
+    small = client.post("/echo", json={"description": "a card " * 20}, headers={"Accept-Encoding": "gzip"})
+    assert small.headers["content-encoding"] == "gzip"
+    assert labels == []
+
+    description = "a long card body " * 100
+    large = client.post("/echo", json={"description": description}, headers={"Accept-Encoding": "gzip"})
+    assert large.headers["content-encoding"] == "gzip"
+    assert large.json()["description"] == description
+    assert labels == ["compress"]
+
+
+def test_select_encoding():
+    assert select_encoding("gzip, deflate") == "gzip"
+    assert select_encoding("gzip;q=0, deflate") is None
+    assert select_encoding("") is None
@@ -0,0 +1,73 @@
+"""
+Tests for batch fluid type checking.
+"""
+import json
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+import api.cards as cards_api
+import services.validation_service as validation
+from models.requests import FluidTypeCheckingBatchRequest
+from models.responses import FieldValidationResult
+
+SIDEPANEL_CODE = '''
+class Question(Card):
+    question: str = Field(..., description="A question ending with a question mark")
+'''
+
+
+def card(question: str) -> dict:
+    return {"w": 250, "h": 200, "x": 0, "y": 0, "title": "Q", "body": "", "card_type": "Question",
+            "extra_fields": {"question": question}}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    compiled = []
+    real_get_card_types = cards_api.get_card_types_from_code
+
+    def counting_get_card_types(code, *args, **kwargs):
+        compiled.append(code)
+        return real_get_card_types(code, *args, **kwargs)
+
+    async def fake_llm(field_name, field_value, field_description, card_type_name, local_score=None):
+        score = 2 if field_name == "question" and not str(field_value).endswith("?") else 9
+        return FieldValidationResult(score=score, reasoning="checked")
+
+    monkeypatch.setattr(cards_api, "get_card_types_from_code", counting_get_card_types)
+    monkeypatch.setattr(validation, "validate_field_with_llm", fake_llm)
+    monkeypatch.setattr(validation, "predict_confident", lambda *args: None)
+
+    app = FastAPI()
+
+    @app.post("/batch")
+    async def batch(request: FluidTypeCheckingBatchRequest, stream: bool = False):
+        if stream:
+            return await cards_api.stream_fluid_type_checking_batch(request)
+        return await cards_api.fluid_type_checking_batch(request)
+
+    test_client = TestClient(app)
+    test_client.compiled = compiled
+    return test_client
+
+
+def test_batch_compiles_types_once_and_keeps_order(client):
+    body = {"cards": [card("Why?"), card("not a question"), card("How?")], "sidepanel_code": SIDEPANEL_CODE}
+    results = client.post("/batch", json=body).json()["results"]
+
+    assert [bool(result["errors"]) for result in results] == [False, True, False]
+    assert len(client.compiled) == 1
+
+
+def test_batch_streams_ndjson(client):
+    body = {"cards": [card("Why?"), card("nope")], "sidepanel_code": SIDEPANEL_CODE}
+    response = client.post("/batch?stream=true", json=body)
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1]
+
+
+def test_bad_sidepanel_code_is_rejected_before_streaming(client):
+    response = client.post("/batch?stream=true", json={"cards": [card("Why?")], "sidepanel_code": "class ("})
+    assert response.status_code == 400
@@ -0,0 +1,80 @@
+"""
+Tests for hedged LLM calls.
+"""
+import asyncio
+import pytest
+import services.hedging_service as hedging
+from services.hedging_service import hedged_call, get_hedging_metrics, LLMTimeoutError
+
+
+def warm_up(key, latency=0.01, samples=20):
+    stats = hedging._stats.setdefault(key, hedging._CallStats())
+    stats.latencies.extend([latency] * samples)
+    return stats
+
+
+@pytest.mark.asyncio
+async def test_slow_call_is_hedged_and_loser_cancelled():
+    """A call slower than the tracked percentile gets a duplicate; the fast one wins."""
+    warm_up("test:hedge", latency=0.1)
+    calls = []
+    cancelled = []
+
+    async def call():
+        attempt = len(calls)
+        calls.append(attempt)
+        try:
+            await asyncio.sleep(5 if attempt == 0 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(attempt)
+            raise
+        return attempt
+
+    assert await hedged_call("test:hedge", call, timeout=2) == 1
+    await asyncio.sleep(0)
+    assert cancelled == [0]
+
+    metrics = get_hedging_metrics()["test:hedge"]
+    assert metrics["hedged"] == 1
+    assert metrics["hedge_wins"] == 1
+    latencies = hedging._stats["test:hedge"].latencies
+    # The hedge's own latency is recorded, not the time since the primary was sent
+    assert latencies[-1] < 0.1
+    # and so is the slow primary, censored at its cancellation
+    assert latencies[-2] >= 0.1
+
+
+@pytest.mark.asyncio
+async def test_hedge_ratio_is_capped():
+    """No hedge is sent once the recent hedge ratio reaches the cap."""
+    stats = warm_up("test:capped")
+    stats.recent_hedges.extend([True] * 10)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    assert await hedged_call("test:capped", call, timeout=2) == "ok"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_deadline_raises_timeout():
+    async def call():
+        await asyncio.sleep(5)
+
+    with pytest.raises(LLMTimeoutError):
+        await hedged_call("test:timeout", call, timeout=0.05)
+    # Timed out calls are sampled at the deadline
+    assert hedging._stats["test:timeout"].latencies[-1] >= 0.05
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate():
+    async def call():
+        raise RuntimeError("provider down")
+
+    with pytest.raises(RuntimeError, match="provider down"):
+        await hedged_call("test:error", call, timeout=1)
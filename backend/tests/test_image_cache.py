@@ -0,0 +1,88 @@
+"""
+Tests for the prompt-keyed generated image cache.
+"""
+import asyncio
+import pytest
+import services.image_cache as image_cache
+from services.image_cache import ImageCache, generate_cached_image, prompt_cache_key
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ImageCache(str(tmp_path / "index.sqlite3"), str(tmp_path / "blobs"), max_bytes=10_000)
+    monkeypatch.setattr(image_cache, "_cache", cache)
+    monkeypatch.setattr(image_cache, "_in_flight", {})
+    generated = []
+
+    async def fake_generate(prompt):
+        generated.append(prompt)
+        await asyncio.sleep(0.01)
+        return f"https://provider.example/{len(generated)}.png"
+
+    async def fake_download(url):
+        return PNG_BYTES + url.encode()
+
+    monkeypatch.setattr(image_cache, "generate_image_with_runware", fake_generate)
+    monkeypatch.setattr(image_cache, "download_image", fake_download)
+    cache.generated = generated
+    return cache
+
+
+def test_key_normalizes_prompt():
+    assert prompt_cache_key("A  red\nFox ") == prompt_cache_key("a red fox")
+    assert prompt_cache_key("a red fox") != prompt_cache_key("a red fox", width=256)
+
+
+@pytest.mark.asyncio
+async def test_repeated_prompt_is_served_from_cache(cache):
+    first = await generate_cached_image("A red fox")
+    second = await generate_cached_image("a red  fox")
+
+    assert first == second
+    assert "/images/" in first
+    assert cache.generated == ["A red fox"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_generation(cache):
+    urls = await asyncio.gather(*(generate_cached_image("a blue whale") for _ in range(5)))
+    assert len(set(urls)) == 1
+    assert len(cache.generated) == 1
+
+
+def test_least_recently_used_images_are_evicted(tmp_path):
+    cache = ImageCache(str(tmp_path / "index.sqlite3"), str(tmp_path / "blobs"), max_bytes=2 * len(PNG_BYTES) + 2)
+    old = cache.put("old", PNG_BYTES + b"1")
+    cache.put("recent", PNG_BYTES + b"2")
+    assert cache.get("old") == old  # "old" becomes the most recently used
+    cache.put("new", PNG_BYTES + b"3")
+
+    assert cache.get("recent") is None
+    assert cache.get("old") == old
+    assert cache.total_bytes() <= cache.max_bytes
+
+
+@pytest.mark.asyncio
+async def test_evicted_images_redirect_to_a_regenerated_image(cache, tmp_path, monkeypatch):
+    import services.blob_store as blob_store
+    from api.images import serve_image_endpoint
+    from fastapi import HTTPException
+
+    monkeypatch.setattr(blob_store, "_image_store", blob_store.BlobStore(str(tmp_path / "images")))
+    url = await generate_cached_image("a red fox")
+    digest = url.rsplit("/", 1)[1]
+    cache.max_bytes = 0
+    await generate_cached_image("a blue whale")  # evicts the fox
+    assert cache.store.path(digest) is None
+
+    response = await serve_image_endpoint(digest, None, width=256, image_format="auto")
+    assert response.status_code == 307
+    new_url = response.headers["location"]
+    assert new_url.endswith("?w=256&format=auto") and digest not in new_url
+    assert cache.generated == ["a red fox", "a blue whale", "a red fox"]
+
+    with pytest.raises(HTTPException) as error:
+        await serve_image_endpoint("0" * 64, None)
+    assert error.value.status_code == 404
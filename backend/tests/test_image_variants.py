@@ -0,0 +1,83 @@
+"""
+Tests for resized and re-encoded image variants.
+"""
+import io
+from typing import Optional
+import pytest
+from fastapi import FastAPI, Header
+from fastapi.testclient import TestClient
+import services.blob_store as blob_store
+import services.image_variants as image_variants
+from api.images import serve_image_endpoint
+from services.blob_store import BlobStore
+from services.image_variants import VariantStore, snap_width
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def png_bytes(width=1024, height=512) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(output, format="PNG")
+    return output.getvalue()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path / "images"))
+    monkeypatch.setattr(blob_store, "_image_store", store)
+    monkeypatch.setattr(image_variants, "_store", VariantStore(str(tmp_path / "variants")))
+
+    app = FastAPI()
+
+    @app.get("/images/{digest}")
+    async def serve(digest: str, w: Optional[int] = None, format: Optional[str] = None,
+                    if_none_match: Optional[str] = Header(None), accept: Optional[str] = Header(None)):
+        return await serve_image_endpoint(digest, if_none_match, w, format, accept)
+
+    test_client = TestClient(app)
+    test_client.digest = store.put(png_bytes())
+    return test_client
+
+
+def test_width_is_snapped_to_variant_widths():
+    assert snap_width(100) == 128
+    assert snap_width(300) == 512
+    assert snap_width(5000) == 512
+
+
+def test_webp_thumbnail_is_rendered_once_and_cached(client):
+    response = client.get(f"/images/{client.digest}?w=200&format=webp")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert Image.open(io.BytesIO(response.content)).size == (256, 128)
+
+    rendered = image_variants._variant_metrics["rendered"]
+    again = client.get(f"/images/{client.digest}?w=200&format=webp", headers={"If-None-Match": response.headers["etag"]})
+    assert again.status_code == 304
+    client.get(f"/images/{client.digest}?w=256&format=webp")
+    assert image_variants._variant_metrics["rendered"] == rendered
+
+
+def test_auto_format_follows_accept_header(client):
+    response = client.get(f"/images/{client.digest}?w=128&format=auto", headers={"Accept": "image/webp,*/*"})
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["vary"] == "Accept"
+
+    response = client.get(f"/images/{client.digest}?w=128&format=auto", headers={"Accept": "*/*"})
+    assert response.headers["content-type"] == "image/png"
+
+
+def test_original_is_served_without_variant_parameters(client):
+    response = client.get(f"/images/{client.digest}")
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["etag"] == f'"{client.digest}"'
+
+
+def test_unsupported_explicit_format_varies_on_accept(client, monkeypatch):
+    monkeypatch.setattr(image_variants, "_supports", lambda fmt: fmt != "avif")
+    response = client.get(f"/images/{client.digest}?w=128&format=avif", headers={"Accept": "image/webp,*/*"})
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["vary"] == "Accept"
+
+    explicit = client.get(f"/images/{client.digest}?w=128&format=webp")
+    assert "vary" not in explicit.headers
@@ -0,0 +1,85 @@
+"""
+Tests for the SQLite-backed job queue and its worker pool.
+"""
+import asyncio
+import time
+import pytest
+from services.job_queue import JobQueue, JobWorkerPool
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_idempotency_key_returns_existing_job(queue):
+    first = queue.submit("generate", {"n": 1}, idempotency_key="retry-1")
+    second = queue.submit("generate", {"n": 2}, idempotency_key="retry-1")
+    assert second["id"] == first["id"]
+    assert second["payload"] == {"n": 1}
+    assert queue.submit("generate", {"n": 3})["id"] != first["id"]
+
+
+def test_claim_hands_out_each_job_once(queue):
+    job = queue.submit("generate", {})
+    claimed = queue.claim(["generate"], "worker-a")
+    assert claimed["id"] == job["id"]
+    assert claimed["status"] == "running"
+    assert queue.claim(["generate"], "worker-b") is None
+
+
+def test_stale_running_jobs_are_requeued(queue):
+    job = queue.submit("generate", {})
+    queue.claim(["generate"], "crashed-worker")
+    queue._connection.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time() - 3600, job["id"]))
+    assert queue.recover_stale() == 1
+    assert queue.get(job["id"])["status"] == "queued"
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_runs_jobs(queue):
+    async def handler(payload):
+        if payload.get("fail"):
+            raise ValueError("bad board")
+        return {"doubled": payload["n"] * 2}
+
+    pool = JobWorkerPool(queue, {"generate": handler}, concurrency=2)
+    pool.start()
+    try:
+        ok = queue.submit("generate", {"n": 21})
+        failing = queue.submit("generate", {"fail": True})
+        pool.notify()
+        for _ in range(50):
+            if all(queue.get(job["id"])["status"] in ("succeeded", "failed") for job in (ok, failing)):
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        await pool.stop()
+
+    assert queue.get(ok["id"])["result"] == {"doubled": 42}
+    assert queue.get(failing["id"])["status"] == "failed"
+    assert queue.get(failing["id"])["error"] == "bad board"
+
+
+@pytest.mark.asyncio
+async def test_cancelling_a_running_job_stops_its_handler(queue):
+    started = asyncio.Event()
+
+    async def handler(payload):
+        started.set()
+        await asyncio.sleep(10)
+
+    pool = JobWorkerPool(queue, {"generate": handler}, concurrency=1)
+    pool.start()
+    try:
+        job = queue.submit("generate", {})
+        pool.notify()
+        await asyncio.wait_for(started.wait(), 5)
+        assert queue.cancel(job["id"])
+        assert pool.cancel_running(job["id"])
+        await asyncio.sleep(0.05)
+    finally:
+        await pool.stop()
+
+    assert queue.get(job["id"])["status"] == "cancelled"
+    assert not queue.cancel(job["id"])
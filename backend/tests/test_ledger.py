@@ -0,0 +1,146 @@
+"""
+Tests for the per-request cost ledger and budgets.
+"""
+import asyncio
+from types import SimpleNamespace
+import pytest
+import services.ledger_service as ledger_service
+import services.routing_service as routing
+import services.hedging_service as hedging
+from services.ledger_service import (
+    LedgerStore,
+    BudgetExceededError,
+    track_costs,
+    extract_usage,
+    estimate_cost,
+)
+from services.routing_service import routed_call
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = LedgerStore(str(tmp_path / "ledger.sqlite3"))
+    monkeypatch.setattr(ledger_service, "_store", store)
+    monkeypatch.setitem(ledger_service.MODEL_PRICES, "cheap", (1.0, 2.0, 0.1))
+    monkeypatch.setitem(routing.ROLE_MODELS, "test", ["provider:cheap"])
+    monkeypatch.setattr(routing, "_health", {})
+    return store
+
+
+def litellm_response(prompt_tokens, completion_tokens, cached=0):
+    usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                            prompt_tokens_details=SimpleNamespace(cached_tokens=cached))
+    return SimpleNamespace(usage=usage)
+
+
+def test_usage_of_each_provider_format():
+    anthropic = SimpleNamespace(usage=SimpleNamespace(input_tokens=10, output_tokens=5,
+                                                      cache_read_input_tokens=90, cache_creation_input_tokens=None))
+    pydantic_ai = SimpleNamespace(usage=lambda: SimpleNamespace(input_tokens=100, output_tokens=7, cache_read_tokens=40))
+    assert extract_usage(anthropic) == (100, 5, 90)
+    assert extract_usage(pydantic_ai) == (100, 7, 40)
+    assert extract_usage(litellm_response(50, 3, cached=20)) == (50, 3, 20)
+    assert extract_usage("no usage") == (0, 0, 0)
+
+
+def test_cost_uses_bare_model_name_and_cached_rate(store):
+    assert estimate_cost("provider:cheap", 1_000_000, 1_000_000, cached_tokens=500_000) == pytest.approx(0.5 + 0.05 + 2.0)
+    assert estimate_cost("unknown-model", 10, 10) is None
+
+
+@pytest.mark.asyncio
+async def test_routed_calls_are_recorded_and_saved(store):
+    async def call(model):
+        return litellm_response(1000, 500)
+
+    async with track_costs("/generate-title", "s1") as ledger:
+        await routed_call("test", "title", call)
+        await routed_call("test", "title", call)
+
+    saved = store.get(ledger.id)
+    assert saved["endpoint"] == "/generate-title"
+    assert saved["calls"] == 2
+    assert saved["input_tokens"] == 2000
+    assert saved["cost_usd"] == pytest.approx(2 * (1000 * 1.0 + 500 * 2.0) / 1_000_000)
+    assert [entry["model"] for entry in saved["entries"]] == ["provider:cheap"] * 2
+
+    totals = store.totals("session")
+    assert totals[0]["key"] == "s1" and totals[0]["requests"] == 1
+
+
+@pytest.mark.asyncio
+async def test_request_budget_stops_further_calls(store, monkeypatch):
+    monkeypatch.setattr(ledger_service, "REQUEST_BUDGET_USD", 0.002)
+    calls = []
+
+    async def call(model):
+        calls.append(model)
+        return litellm_response(1000, 500)  # $0.002 per call
+
+    async with track_costs("/generate-card") as ledger:
+        await routed_call("test", "generate", call)
+        with pytest.raises(BudgetExceededError):
+            await routed_call("test", "generate", call)
+    assert len(calls) == 1
+    # A budget rejection is not a model failure
+    assert routing.get_routing_metrics()["test"]["models"]["provider:cheap"]["errors"] == 0
+    assert ledger_service.get_ledger_metrics()["budget_rejections"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_reserve_their_estimated_cost(store, monkeypatch):
+    monkeypatch.setattr(ledger_service, "REQUEST_BUDGET_USD", 0.005)
+    monkeypatch.setitem(ledger_service._last_costs, ("batch", "provider:cheap"), 0.002)
+    calls = []
+
+    async def call(model):
+        calls.append(model)
+        await asyncio.sleep(0.01)
+        return litellm_response(1000, 500)  # $0.002 per call
+
+    async with track_costs("/fluid-type-checking/batch") as ledger:
+        results = await asyncio.gather(*(routed_call("test", "batch", call) for _ in range(5)), return_exceptions=True)
+    # Without reservations all five would pass the check before any cost is recorded
+    assert len(calls) == 3
+    assert sum(isinstance(result, BudgetExceededError) for result in results) == 2
+    assert ledger.reserved == 0.0
+
+
+@pytest.mark.asyncio
+async def test_session_budget_counts_earlier_requests(store, monkeypatch):
+    monkeypatch.setattr(ledger_service, "SESSION_BUDGET_USD", 0.003)
+
+    async def call(model):
+        return litellm_response(1000, 500)
+
+    async with track_costs("/generate-card", "s1"):
+        await routed_call("test", "generate", call)
+    async with track_costs("/generate-card", "s1"):
+        await routed_call("test", "generate", call)
+        with pytest.raises(BudgetExceededError):
+            await routed_call("test", "generate", call)
+    # Other sessions are unaffected
+    async with track_costs("/generate-card", "s2"):
+        await routed_call("test", "generate", call)
+
+
+@pytest.mark.asyncio
+async def test_both_racers_of_a_hedged_call_are_recorded(store):
+    stats = hedging._stats.setdefault("hedged:provider:cheap", hedging._CallStats())
+    stats.latencies.extend([0.02] * 20)
+    attempts = []
+
+    async def call(model):
+        attempts.append(model)
+        if len(attempts) == 1:
+            await asyncio.sleep(5)
+        return litellm_response(1000, 500)
+
+    async with track_costs("/generate-card") as ledger:
+        await routed_call("test", "hedged", call, timeout=2)
+
+    assert len(attempts) == 2
+    winner, loser = ledger.entries
+    assert loser["kind"] == "hedged:hedge" and loser["estimated"]
+    assert loser["cost_usd"] == winner["cost_usd"]
+    assert ledger.cost == pytest.approx(2 * 0.002)
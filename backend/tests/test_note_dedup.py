@@ -0,0 +1,38 @@
+"""
+Tests for near-duplicate filtering of raw notes.
+"""
+import pytest
+import services.base_model_service as base_model_service
+from utils.dedup import find_novel, jaccard, shingles
+
+
+def test_near_duplicates_are_dropped():
+    notes = [
+        "What does empathy look like when nobody is watching?",
+        "what does empathy look like when nobody is watching ?!",
+        "How would integrity be measured in a large organisation?",
+        "",
+    ]
+    kept, _ = find_novel(notes, threshold=0.6)
+    assert kept == [0, 2]
+
+
+def test_threshold_one_keeps_distinct_notes():
+    notes = ["a b c d", "a b c e"]
+    assert jaccard(shingles(notes[0]), shingles(notes[1])) < 1.0
+    assert find_novel(notes, threshold=1.0)[0] == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_completions_stop_once_novelty_saturates(monkeypatch):
+    """When a whole wave repeats earlier notes, the remaining waves are not requested."""
+    requested = []
+
+    async def fake_complete(prompts):
+        requested.extend(prompts)
+        return ["the same remark about empathy and integrity"] * len(prompts)
+
+    monkeypatch.setattr(base_model_service, "complete_prompts", fake_complete)
+    responses = await base_model_service.complete_prompts_until_saturated([f"p{i}" for i in range(9)], wave_size=3)
+    assert len(requested) == 6
+    assert len(responses) == 6
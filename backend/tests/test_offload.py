@@ -0,0 +1,40 @@
+"""
+Tests for running CPU-bound work outside of the event loop.
+"""
+import threading
+import pytest
+from utils.offload import run_cpu_bound, get_offload_metrics
+from config.settings import CPU_OFFLOAD_MIN_CARDS
+
+
+@pytest.mark.asyncio
+async def test_small_work_runs_inline():
+    """Work below the size threshold stays on the event loop thread."""
+    thread_name = await run_cpu_bound(
+        lambda: threading.current_thread().name, size=CPU_OFFLOAD_MIN_CARDS - 1, label="test_inline"
+    )
+    assert thread_name == threading.current_thread().name
+    assert get_offload_metrics()["labels"]["test_inline"]["inline_calls"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_large_work_is_offloaded():
+    """Work above the threshold runs in the executor and reports queueing delay."""
+    thread_name = await run_cpu_bound(
+        lambda: threading.current_thread().name, size=CPU_OFFLOAD_MIN_CARDS, label="test_offloaded"
+    )
+    assert thread_name.startswith("butterfly-cpu")
+
+    stats = get_offload_metrics()["labels"]["test_offloaded"]
+    assert stats["offloaded_calls"] == 1
+    assert stats["queue_delay_avg_ms"] >= 0.0
+
+
+@pytest.mark.asyncio
+async def test_exceptions_propagate():
+    """Errors raised by offloaded work reach the caller."""
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        await run_cpu_bound(fail, label="test_error")
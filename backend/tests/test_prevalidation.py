@@ -0,0 +1,74 @@
+"""
+Tests for the deterministic tier of fluid type checking.
+"""
+from enum import Enum
+from typing import Literal, Optional
+import pytest
+from pydantic import Field
+import services.validation_service as validation
+from services.validation_service import prevalidate_field, perform_fluid_type_checking
+from models.cards import Card
+from models.responses import FieldValidationResult
+
+
+class Mood(Enum):
+    HAPPY = "happy"
+    SAD = "sad"
+
+
+class Review(Card):
+    summary: Optional[str] = Field(None, description="One sentence summary", max_length=20)
+    code: Optional[str] = Field(None, description="Ticket code", pattern=r"^[A-Z]+-\d+$")
+    rating: Optional[int] = Field(None, description="Rating", ge=1, le=5)
+    status: Optional[Literal["open", "closed"]] = None
+    mood: Optional[Mood] = None
+
+
+def review(**fields) -> Review:
+    # model_construct skips validation so constraint-breaking values can be checked
+    return Review.model_construct(w=1, h=1, x=0, y=0, **fields)
+
+
+@pytest.mark.parametrize("field_name, value, score", [
+    ("summary", "   ", 1),
+    ("summary", "x" * 21, 1),
+    ("code", "abc", 1),
+    ("rating", 9, 1),
+    ("rating", 4, 10),
+    ("status", "open", 10),
+    ("status", "pending", 1),
+    ("mood", Mood.SAD, 10),
+])
+def test_rules_decide_locally(field_name, value, score):
+    assert prevalidate_field(Review, field_name, value).score == score
+
+
+def test_semantic_checks_escalate():
+    assert prevalidate_field(Review, "summary", "A short summary") is None
+    assert prevalidate_field(Review, "title", "Any title") is None
+
+
+@pytest.mark.asyncio
+async def test_only_ambiguous_fields_reach_the_llm(monkeypatch):
+    asked = []
+
+    async def fake_llm(field_name, field_value, field_description, card_type_name, local_score=None):
+        asked.append(field_name)
+        return FieldValidationResult(score=8, reasoning="fine")
+
+    monkeypatch.setattr(validation, "validate_field_with_llm", fake_llm)
+    card = review(title="Bug", summary="Crash on save", code="abc", rating=3, status="open")
+    result = await perform_fluid_type_checking(card, {"Review": Review})
+
+    assert sorted(asked) == ["summary", "title"]
+    assert result.field_scores["rating"].score == 10
+    assert [error.split(" - ")[0] for error in result.errors] == ["**code**"]
+
+
+def test_field_adapters_are_bounded_across_redefined_card_classes():
+    """Re-executed sidepanel code defines new classes; their adapters must not pile up."""
+    validation._field_adapter.cache_clear()
+    for _ in range(validation._field_adapter.cache_info().maxsize + 10):
+        redefined = type("Review", (Review,), {})
+        assert prevalidate_field(redefined, "rating", 9).score == 1
+    assert validation._field_adapter.cache_info().currsize == validation._field_adapter.cache_info().maxsize
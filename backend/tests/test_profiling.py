@@ -0,0 +1,152 @@
+"""
+Tests for on-demand request profiling.
+"""
+import asyncio
+import os
+import pytest
+from fastapi import HTTPException
+from starlette.responses import StreamingResponse
+import services.profiling_service as profiling_service
+from api.profiles import list_profiles_endpoint, get_profile_endpoint
+from services.profiling_service import (
+    buffer_body,
+    get_profile_path,
+    is_profiling_authorized,
+    profiling_requested,
+    run_profiled,
+)
+
+TOKEN = "s3cret"
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling_service, "PROFILING_ADMIN_TOKEN", TOKEN)
+    monkeypatch.setattr(profiling_service, "PROFILE_OUTPUT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def write_profile(directory, profile_id, mtime):
+    path = os.path.join(directory, f"{profile_id}.pstats")
+    with open(path, "wb") as f:
+        f.write(b"stats")
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_profiling_is_disabled_without_a_configured_token(monkeypatch):
+    monkeypatch.setattr(profiling_service, "PROFILING_ADMIN_TOKEN", "")
+    assert not is_profiling_authorized("")
+    assert not is_profiling_authorized("anything")
+    assert not profiling_requested({"x-profile": "1", "x-admin-token": ""}, {})
+
+
+def test_profiling_requires_the_admin_token_header(profile_dir):
+    assert profiling_requested({"x-profile": "1", "x-admin-token": TOKEN}, {})
+    assert profiling_requested({"x-admin-token": TOKEN}, {"profile": "true"})
+    assert not profiling_requested({"x-profile": "1", "x-admin-token": "wrong"}, {})
+    assert not profiling_requested({"x-profile": "1"}, {})
+    # The token is not accepted from the query string
+    assert not profiling_requested({}, {"profile": "1", "admin_token": TOKEN})
+    # Without the flag, a valid token alone does not profile
+    assert not profiling_requested({"x-admin-token": TOKEN}, {})
+
+
+@pytest.mark.parametrize("profile_id", ["../secret", "..", "a/b", "a\\b", "", "x.pstats"])
+def test_get_profile_path_rejects_invalid_ids(profile_dir, profile_id):
+    secret = profile_dir.parent / "secret.pstats"
+    secret.write_bytes(b"stats")
+    assert get_profile_path(profile_id) is None
+
+
+def test_get_profile_path_finds_stored_profiles(profile_dir):
+    path = write_profile(profile_dir, "20260101-000000-root-abcd1234", 1_000)
+    assert get_profile_path("20260101-000000-root-abcd1234") == path
+    assert get_profile_path("unknown") is None
+
+
+def test_prune_keeps_the_most_recent_profiles(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling_service, "PROFILE_MAX_FILES", 2)
+    for index in range(4):
+        write_profile(profile_dir, f"profile-{index}", 1_000 + index)
+    (profile_dir / "notes.txt").write_text("not a profile")
+
+    profiling_service._prune_profiles()
+
+    assert sorted(os.listdir(profile_dir)) == ["notes.txt", "profile-2.pstats", "profile-3.pstats"]
+
+
+@pytest.mark.asyncio
+async def test_streamed_body_is_produced_inside_the_profile(profile_dir):
+    """The body of a streaming response is generated while the profiler is running."""
+    events = []
+
+    async def chunks():
+        events.append(("chunk", profiling_service._profile_lock.locked()))
+        yield "first,"
+        yield b"second"
+
+    async def call():
+        return await buffer_body(StreamingResponse(chunks()))
+
+    response, profile_id = await run_profiled(call, label="/batch")
+    body = b"".join([chunk async for chunk in response.body_iterator])
+
+    assert body == b"first,second"
+    assert events == [("chunk", True)]
+    assert get_profile_path(profile_id) is not None
+
+
+async def busy_work():
+    return sum(range(1000))
+
+
+@pytest.mark.asyncio
+async def test_profiles_are_stored_and_served_to_admins(profile_dir):
+    result, profile_id = await run_profiled(busy_work, label="/generate-card")
+    assert result == sum(range(1000))
+    assert "generate-card" in profile_id
+
+    listed = await list_profiles_endpoint(TOKEN)
+    assert [profile["id"] for profile in listed["profiles"]] == [profile_id]
+
+    text = await get_profile_endpoint(profile_id, TOKEN, format="text", sort="tottime", limit=10)
+    assert b"function calls" in text.body
+    raw = await get_profile_endpoint(profile_id, TOKEN, format="pstats", sort="cumulative", limit=10)
+    assert raw.path == get_profile_path(profile_id)
+
+    with pytest.raises(HTTPException) as error:
+        await get_profile_endpoint(profile_id, TOKEN, format="text", sort="nope", limit=10)
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        await get_profile_endpoint("unknown", TOKEN, format="text", sort="cumulative", limit=10)
+    assert error.value.status_code == 404
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("token", [None, "", "wrong"])
+async def test_profile_endpoints_require_the_admin_token(profile_dir, token):
+    write_profile(profile_dir, "profile-1", 1_000)
+    with pytest.raises(HTTPException) as error:
+        await list_profiles_endpoint(token)
+    assert error.value.status_code == 403
+    with pytest.raises(HTTPException) as error:
+        await get_profile_endpoint("profile-1", token, format="pstats", sort="cumulative", limit=10)
+    assert error.value.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_run_unprofiled(profile_dir):
+    """Only one request is profiled at a time; the others run without a profile ID."""
+    release = asyncio.Event()
+
+    async def slow_work():
+        await release.wait()
+        return "first"
+
+    first = asyncio.create_task(run_profiled(slow_work, label="/first"))
+    await asyncio.sleep(0)
+    assert await run_profiled(busy_work, label="/second") == (sum(range(1000)), None)
+    release.set()
+    result, profile_id = await first
+    assert result == "first" and profile_id is not None
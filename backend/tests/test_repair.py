@@ -0,0 +1,108 @@
+"""
+Tests for repairing generated cards that fail fluid type checking.
+"""
+from types import SimpleNamespace
+from typing import Optional
+import pytest
+from pydantic import Field
+import services.repair_service as repair
+from models.cards import Card, ReactCard
+from models.responses import FieldValidationResult, FluidTypeCheckingResponse
+
+
+class Question(Card):
+    question: str = Field(..., description="A question ending with a question mark")
+
+
+CARD_TYPES = {"Question": Question}
+
+
+def react_card(question: str, title: str = "A title") -> ReactCard:
+    return ReactCard(w=250, h=200, x=10, y=20, title=title, body="", card_type="Question",
+                     extra_fields={"question": question})
+
+
+async def fake_fluid_check(card, card_types):
+    """Questions without a question mark fail."""
+    ok = card.question.endswith("?")
+    score = 9 if ok else 2
+    return FluidTypeCheckingResponse(
+        errors=[] if ok else [f"**question** - {score}/10: not a question"],
+        field_scores={"question": FieldValidationResult(score=score, reasoning="checked")},
+    )
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    repair._repair_metrics.update(dict.fromkeys(repair._repair_metrics, 0))
+    monkeypatch.setattr(repair, "perform_fluid_type_checking", fake_fluid_check)
+    prompts = []
+
+    async def fake_routed_call(role, key, factory, timeout=None):
+        # Stands in for the agent: answers with a fixed rewrite of the requested fields
+        prompts.append(key)
+        return SimpleNamespace(output=SimpleNamespace(model_dump=lambda: {"question": "Why now?"}))
+
+    monkeypatch.setattr(repair, "routed_call", fake_routed_call)
+    return prompts
+
+
+@pytest.mark.asyncio
+async def test_failing_field_is_repaired_and_others_kept(fake_llm):
+    cards = [react_card("Is this fine?"), react_card("not a question", title="Keep me")]
+    result = await repair.validate_and_repair_cards(cards, CARD_TYPES, "intention")
+
+    assert len(result) == 2
+    assert result[0].repaired_fields is None
+    assert result[1].repaired_fields == ["question"]
+    assert result[1].extra_fields["question"] == "Why now?"
+    assert result[1].title == "Keep me"
+    assert (result[1].x, result[1].y) == (10, 20)
+    assert fake_llm == ["repair_fields"]
+
+
+@pytest.mark.asyncio
+async def test_card_still_failing_is_dropped(fake_llm):
+    cards = [react_card("Is this fine?"), react_card("not a question")]
+    result = await repair.validate_and_repair_cards(cards, CARD_TYPES, "intention", max_attempts=0)
+
+    assert [card.extra_fields["question"] for card in result] == ["Is this fine?"]
+    assert repair.get_repair_metrics()["cards_dropped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_all_cards_failing_raises(fake_llm):
+    with pytest.raises(ValueError, match="Fluid Typechecking error"):
+        await repair.validate_and_repair_cards([react_card("nope")], CARD_TYPES, "intention", max_attempts=0)
+
+
+class Note(Card):
+    summary: Optional[str] = Field(None, description="A one sentence summary ending with a period")
+
+
+@pytest.mark.asyncio
+async def test_repair_emptying_an_optional_field_is_rejected(monkeypatch):
+    async def fluid_check(card, card_types):
+        # Like the real check, empty values are not scored
+        if card.summary is None:
+            return FluidTypeCheckingResponse(errors=[], field_scores={})
+        ok = card.summary.endswith(".")
+        return FluidTypeCheckingResponse(
+            errors=[] if ok else ["**summary** - 2/10: not a sentence"],
+            field_scores={"summary": FieldValidationResult(score=9 if ok else 2, reasoning="checked")},
+        )
+
+    async def blanking_routed_call(role, key, factory, timeout=None):
+        return SimpleNamespace(output=SimpleNamespace(model_dump=lambda: {"summary": None}))
+
+    monkeypatch.setattr(repair, "perform_fluid_type_checking", fluid_check)
+    monkeypatch.setattr(repair, "routed_call", blanking_routed_call)
+    cards = [
+        ReactCard(w=250, h=200, x=0, y=0, title="Kept", body="", card_type="Note", extra_fields={"summary": "Fine."}),
+        ReactCard(w=250, h=200, x=0, y=0, title="Blanked", body="", card_type="Note", extra_fields={"summary": "draft"}),
+    ]
+    result = await repair.validate_and_repair_cards(cards, {"Note": Note}, "intention")
+
+    # The card is dropped rather than kept with its summary silently removed
+    assert [card.title for card in result] == ["Kept"]
+    assert repair.get_repair_metrics()["blank_repairs"] >= 1
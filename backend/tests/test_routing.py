@@ -0,0 +1,74 @@
+"""
+Tests for routing LLM calls across equivalent models.
+"""
+import pytest
+import services.routing_service as routing
+from services.routing_service import routed_call, rank_models, get_routing_metrics, AllModelsFailedError
+
+
+@pytest.fixture
+def models(monkeypatch):
+    monkeypatch.setitem(routing.ROLE_MODELS, "test", ["primary", "secondary"])
+    monkeypatch.setattr(routing, "_health", {})
+    monkeypatch.setattr(routing, "ROUTER_COOLDOWN_SECONDS", 60)
+
+
+@pytest.mark.asyncio
+async def test_fails_over_to_next_model(models):
+    tried = []
+
+    async def call(model):
+        tried.append(model)
+        if model == "primary":
+            raise RuntimeError("provider down")
+        return model
+
+    assert await routed_call("test", "test_failover", call) == "secondary"
+    assert tried == ["primary", "secondary"]
+    assert get_routing_metrics()["test"]["models"]["secondary"]["failovers"] == 1
+
+
+@pytest.mark.asyncio
+async def test_unhealthy_model_is_skipped(models):
+    async def call(model):
+        if model == "primary":
+            raise RuntimeError("provider down")
+        return model
+
+    for _ in range(routing.ROUTER_MIN_SAMPLES):
+        await routed_call("test", "test_unhealthy", call)
+    assert rank_models("test") == ["secondary", "primary"]
+    assert get_routing_metrics()["test"]["models"]["primary"]["healthy"] is False
+
+
+def test_faster_model_is_preferred(models):
+    for model, latency in (("primary", 2.0), ("secondary", 0.5)):
+        health = routing._get_health("test", model)
+        for _ in range(routing.ROUTER_MIN_SAMPLES):
+            health.record(True, latency)
+    assert rank_models("test") == ["secondary", "primary"]
+
+
+def test_unmeasured_models_keep_configured_order_after_measured_ones(models, monkeypatch):
+    monkeypatch.setitem(routing.ROLE_MODELS, "test", ["primary", "secondary", "tertiary"])
+    assert rank_models("test") == ["primary", "secondary", "tertiary"]
+
+    # The primary's first samples must not hand live traffic to unmeasured fallbacks
+    health = routing._get_health("test", "primary")
+    for _ in range(routing.ROUTER_MIN_SAMPLES):
+        health.record(True, 1.0)
+    assert rank_models("test") == ["primary", "secondary", "tertiary"]
+
+    health = routing._get_health("test", "tertiary")
+    for _ in range(routing.ROUTER_MIN_SAMPLES):
+        health.record(True, 3.0)
+    assert rank_models("test") == ["primary", "tertiary", "secondary"]
+
+
+@pytest.mark.asyncio
+async def test_all_models_failing_raises(models):
+    async def call(model):
+        raise RuntimeError(model)
+
+    with pytest.raises(AllModelsFailedError):
+        await routed_call("test", "test_all_fail", call)
@@ -0,0 +1,69 @@
+"""
+Tests for the distilled fluid type check scorer.
+"""
+import random
+import pytest
+import services.scorer_service as scorer_service
+from services.scorer_service import VerdictStore, DistilledScorer, train, evaluate
+
+DESCRIPTION = "An open question about the topic"
+
+
+def make_examples(count=200, seed=1):
+    rng = random.Random(seed)
+    topics = ["empathy", "integrity", "design", "testing", "latency", "memory", "habits", "teams"]
+    examples = []
+    for _ in range(count):
+        topic = rng.choice(topics)
+        if rng.random() < 0.5:
+            value, score = f"How could we improve {topic} next week?", 9
+        else:
+            value, score = f"{topic} {rng.randint(0, 999)} done", 2
+        examples.append({"card_type": "Question", "field_name": "question", "description": DESCRIPTION,
+                         "value": value, "score": score})
+    return examples
+
+
+def test_scorer_learns_llm_verdicts():
+    scorer = train(make_examples(), min_score=5)
+    report = evaluate(scorer, make_examples(50, seed=2), min_score=5, confidence=0.9)
+    assert report["agreement"] == 1.0
+    assert report["coverage"] > 0.5
+    assert report["confident_false_passes"] == 0
+
+
+def test_model_round_trip(tmp_path):
+    scorer = train(make_examples(50), min_score=5)
+    scorer.report = {"holdout": {"agreement": 1.0}}
+    path = str(tmp_path / "scorer.json")
+    scorer.save(path)
+    loaded = DistilledScorer.load(path)
+    args = ("Question", "question", DESCRIPTION, "Why now?")
+    assert loaded.predict_proba(*args) == pytest.approx(scorer.predict_proba(*args))
+    assert loaded.report == scorer.report
+
+
+def test_verdicts_are_stored(tmp_path):
+    store = VerdictStore(str(tmp_path / "verdicts.sqlite3"))
+    store.record("Question", "question", DESCRIPTION, "Why?", 8)
+    assert store.examples() == [
+        {"card_type": "Question", "field_name": "question", "description": DESCRIPTION, "value": "Why?", "score": 8}
+    ]
+
+
+def test_only_the_latest_verdicts_of_each_field_are_kept(tmp_path):
+    store = VerdictStore(str(tmp_path / "verdicts.sqlite3"), max_per_field=2)
+    for index in range(4):
+        store.record("Question", "question", DESCRIPTION, f"Why {index}?", 8)
+    store.record("Question", "answer", DESCRIPTION, "Because.", 7)
+
+    assert [example["value"] for example in store.examples()] == ["Why 2?", "Why 3?", "Because."]
+
+
+def test_low_confidence_escalates(monkeypatch):
+    monkeypatch.setattr(scorer_service, "_scorer", DistilledScorer({}, 0.0))
+    monkeypatch.setattr(scorer_service, "_scorer_loaded", True)
+    # An untrained scorer predicts 0.5 for everything
+    assert scorer_service.predict_confident("Question", "question", DESCRIPTION, "Why?") is None
+    monkeypatch.setattr(scorer_service, "_scorer", train(make_examples(), min_score=5))
+    assert scorer_service.predict_confident("Question", "question", DESCRIPTION, "How could we improve teams next week?") > 0.9
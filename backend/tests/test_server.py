@@ -0,0 +1,42 @@
+"""
+Tests for the app lifespan and the server launch options.
+"""
+import inspect
+import uvicorn
+from fastapi.testclient import TestClient
+import main
+
+
+def test_lifespan_starts_and_stops_worker_resources(monkeypatch):
+    calls = []
+
+    async def record(name):
+        calls.append(name)
+
+    monkeypatch.setattr(main, "start_job_workers", lambda: record("start_jobs"))
+    monkeypatch.setattr(main, "stop_job_workers", lambda: record("stop_jobs"))
+    monkeypatch.setattr(main, "cancel_deferred_images", lambda: record("cancel_images"))
+    monkeypatch.setattr(main, "close_clients", lambda: record("close_clients"))
+    monkeypatch.setattr(main, "shutdown_cpu_executor", lambda wait: calls.append("shutdown_executor"))
+
+    with TestClient(main.app) as client:
+        assert calls == ["start_jobs"]
+        assert client.get("/ready").status_code == 200
+    assert calls == ["start_jobs", "stop_jobs", "cancel_images", "close_clients", "shutdown_executor"]
+
+
+def test_prod_mode_runs_several_workers_with_a_graceful_shutdown():
+    options = main.server_options("prod", "127.0.0.1", 8000, 4)
+    assert options["workers"] == 4
+    assert options["timeout_graceful_shutdown"] == main.SERVER_GRACEFUL_TIMEOUT
+    assert "reload" not in options
+    # Only options uvicorn.run accepts (a wrong keyword crashes the launch)
+    inspect.signature(uvicorn.run).bind("main:app", **options)
+    uvicorn.Config("main:app", **options)
+
+
+def test_dev_mode_reloads_a_single_process():
+    options = main.server_options("dev", "127.0.0.1", 8000, 4)
+    assert options["reload"] is True
+    assert "workers" not in options
+    inspect.signature(uvicorn.run).bind("main:app", **options)
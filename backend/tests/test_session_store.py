@@ -0,0 +1,119 @@
+"""
+Tests for the server-side session store.
+"""
+import pytest
+import services.session_store as session_store
+from services.session_store import SessionStore, SessionConflict
+
+
+def card(card_id, title="T"):
+    return {"id": card_id, "w": 250, "h": 200, "x": 0, "y": 0, "title": title, "body": "", "card_type": "Idea"}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(session_store.time, "time", lambda: clock["now"])
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"), snapshot_every=3)
+    store.clock = clock
+    return store
+
+
+def titles(state):
+    return {c["id"]: c["title"] for c in state["cards"]}
+
+
+def test_snapshot_then_deltas_give_latest_board(store):
+    store.save_snapshot("s", [card("a"), card("b")], "explore")
+    summary = store.append_delta("s", [card("a", "A2"), card("c")], ["b"], base_seq=1)
+    assert summary["seq"] == 2
+    assert summary["card_count"] == 2
+
+    state = store.latest("s")
+    assert titles(state) == {"a": "A2", "c": "T"}
+    assert state["intention"] == "explore"
+    assert store.latest("missing") is None
+
+
+def test_stale_base_seq_is_rejected(store):
+    store.save_snapshot("s", [card("a")])
+    with pytest.raises(SessionConflict) as excinfo:
+        store.append_delta("s", [card("b")], [], base_seq=0)
+    assert excinfo.value.actual == 1
+    # The rejected delta left no trace
+    assert titles(store.latest("s")) == {"a": "T"}
+    assert store.summary("s")["seq"] == 1
+
+
+def test_board_at_timestamp_replays_deltas_after_snapshot(store):
+    store.save_snapshot("s", [card("a")])
+    for i in range(5):
+        store.clock["now"] += 10
+        store.append_delta("s", [card("a", f"v{i}")], [])
+    store.clock["now"] += 10
+    store.append_delta("s", [], ["a"])
+
+    # Deltas are compacted into a snapshot every 3 saves
+    snapshots = store._connection.execute("SELECT seq FROM session_snapshots ORDER BY seq").fetchall()
+    assert [row["seq"] for row in snapshots] == [1, 4, 7]
+
+    assert titles(store.at("s", 1000.0)) == {"a": "T"}
+    assert titles(store.at("s", 1025.0)) == {"a": "v1"}
+    past = store.at("s", 1045.0)
+    assert titles(past) == {"a": "v3"}
+    assert past["seq"] == 5
+    assert past["timestamp"] == 1040.0
+    assert store.at("s", 2000.0)["cards"] == []
+    assert store.at("s", 999.0) is None
+
+
+def test_list_sessions_most_recent_first(store):
+    store.save_snapshot("old", [card("a")])
+    store.clock["now"] += 1
+    store.append_delta("new", [card("a"), card("b")], [])
+    sessions = store.list_sessions()
+    assert [s["session_id"] for s in sessions] == ["new", "old"]
+    assert sessions[0]["card_count"] == 2
+    assert store.list_sessions(limit=1, offset=1)[0]["session_id"] == "old"
+
+
+def test_search_ranks_titles_and_follows_saves(store):
+    store.save_snapshot("s1", [
+        {**card("a", "Butterfly migration"), "body": "Monarchs fly south"},
+        {**card("b", "Weather"), "body": "Storms can stop butterfly migration"},
+    ], "insects")
+    store.save_snapshot("s2", [{**card("c", "Other"), "extra_fields": {"notes": "caterpillars become butterflies"}}])
+
+    result = store.search("butterfly migration")
+    assert result["total"] == 2
+    assert [hit["card"]["id"] for hit in result["hits"]] == ["a", "b"]
+    assert result["hits"][0]["intention"] == "insects"
+    assert "<mark>" in result["hits"][0]["snippet"]
+    # Porter stemming matches extra fields too
+    assert {hit["card"]["id"] for hit in store.search("butterfly")["hits"]} == {"a", "b", "c"}
+
+    store.append_delta("s1", [{**card("a", "Bird migration"), "body": ""}], ["b"])
+    assert store.search("butterfly migration")["total"] == 0
+    assert [hit["card"]["id"] for hit in store.search("bird")["hits"]] == ["a"]
+
+
+def test_search_pagination_filters_and_query_syntax(store):
+    store.save_snapshot("s1", [card(f"a{i}", f"idea {i}") for i in range(5)])
+    store.save_snapshot("s2", [card("b", "idea b")])
+
+    page = store.search("idea", limit=2, offset=2)
+    assert page["total"] == 6
+    assert len(page["hits"]) == 2
+    assert store.search("idea", session_id="s2")["total"] == 1
+    assert store.search("idea", exclude_session_id="s1")["total"] == 1
+    assert store.search("idea OR zebra")["total"] == 0
+    assert store.search("idea OR zebra", any_term=True)["total"] == 6
+    assert store.search('"(*')["hits"] == []
+
+
+def test_existing_cards_are_indexed_on_open(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    SessionStore(path).save_snapshot("s", [card("a", "lantern")])
+    reopened = SessionStore(path)
+    reopened._connection.execute("DELETE FROM session_cards_fts")
+    assert SessionStore(path).search("lantern")["total"] == 1
@@ -0,0 +1,121 @@
+"""
+Tests for speculative background generation.
+"""
+import asyncio
+import pytest
+from models.cards import ReactCard
+from models.requests import BoardState
+import api.cards as cards_api
+import services.speculation_service as speculation_service
+from services.cancellation_service import GenerationCancelled
+from services.speculation_service import board_digest, schedule_speculation, take_speculative_result, get_speculation_metrics
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(speculation_service, "SPECULATION_MIN_INTERVAL_SECONDS", 0)
+
+
+def make_board(session_id, title="Empathy", x=0.0):
+    card = ReactCard(w=250, h=200, x=x, y=0, title=title, body="", card_type="Property")
+    return BoardState(cards=[card], sidepanel_code="class Property(Card): pass", intention="ethics", session_id=session_id)
+
+
+def make_generator(calls, delay=0.0):
+    async def generate(board):
+        calls.append(board.cards[0].title)
+        await asyncio.sleep(delay)
+        return [ReactCard(w=250, h=200, x=0, y=0, title=f"About {board.cards[0].title}", body="", card_type="Question")]
+    return generate
+
+
+def test_digest_ignores_layout_only_changes():
+    assert board_digest(make_board("s", x=0.0)) == board_digest(make_board("s", x=400.0))
+    assert board_digest(make_board("s", title="Empathy")) != board_digest(make_board("s", title="Integrity"))
+
+
+@pytest.mark.asyncio
+async def test_speculative_result_is_served_once():
+    """A finished speculation is returned for the same board, then consumed."""
+    calls = []
+    scheduled, _ = schedule_speculation(make_board("session-a"), "base_model", make_generator(calls))
+    assert scheduled
+
+    # Joins the in-flight generation
+    cards = await take_speculative_result(make_board("session-a", x=120.0), "base_model")
+    assert cards[0].title == "About Empathy"
+    assert await take_speculative_result(make_board("session-a"), "base_model") is None
+    assert calls == ["Empathy"]
+
+
+@pytest.mark.asyncio
+async def test_board_change_cancels_stale_speculation():
+    """A newer board for the same session cancels the speculation of the older one."""
+    calls = []
+    generate = make_generator(calls, delay=10)
+    schedule_speculation(make_board("session-b", title="Empathy"), "base_model", generate)
+    await asyncio.sleep(0)
+    schedule_speculation(make_board("session-b", title="Integrity"), "base_model", make_generator(calls))
+
+    assert await take_speculative_result(make_board("session-b", title="Empathy"), "base_model") is None
+    cards = await take_speculative_result(make_board("session-b", title="Integrity"), "base_model")
+    assert cards[0].title == "About Integrity"
+
+
+@pytest.mark.asyncio
+async def test_superseded_generation_cancels_session_speculation(monkeypatch):
+    """Speculations still running when a session's generation is superseded are dropped."""
+    calls = []
+    monkeypatch.setitem(cards_api.GENERATION_STRATEGIES, "base_model", make_generator(calls, delay=10))
+    schedule_speculation(make_board("session-c", title="Empathy"), "base_model", make_generator(calls, delay=10))
+    await asyncio.sleep(0)
+
+    first = asyncio.create_task(cards_api.run_generation(make_board("session-c", title="Integrity"), "base_model"))
+    await asyncio.sleep(0.01)
+    monkeypatch.setitem(cards_api.GENERATION_STRATEGIES, "base_model", make_generator(calls))
+    cards = await cards_api.run_generation(make_board("session-c", title="Honesty"), "base_model")
+    assert cards[0].title == "About Honesty"
+
+    with pytest.raises(GenerationCancelled, match="superseded"):
+        await first
+    await asyncio.sleep(0)
+    assert get_speculation_metrics()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_jobs_and_interactive_generations_do_not_supersede_each_other(monkeypatch):
+    calls = []
+    monkeypatch.setitem(cards_api.GENERATION_STRATEGIES, "base_model", make_generator(calls, delay=0.05))
+    job = asyncio.create_task(cards_api.run_generation(make_board("session-d", title="Integrity"), "base_model", scope="job"))
+    await asyncio.sleep(0.01)
+    cards = await cards_api.run_generation(make_board("session-d", title="Honesty"), "base_model")
+
+    assert cards[0].title == "About Honesty"
+    assert (await job)[0].title == "About Integrity"
+
+
+@pytest.mark.asyncio
+async def test_speculations_are_rate_limited_per_session(monkeypatch):
+    monkeypatch.setattr(speculation_service, "SPECULATION_MIN_INTERVAL_SECONDS", 60)
+    calls = []
+    assert schedule_speculation(make_board("session-e", title="Empathy"), "base_model", make_generator(calls))[0]
+    assert not schedule_speculation(make_board("session-e", title="Integrity"), "base_model", make_generator(calls))[0]
+    assert schedule_speculation(make_board("session-f", title="Integrity"), "base_model", make_generator(calls))[0]
+    await asyncio.sleep(0.01)
+    assert calls == ["Empathy", "Integrity"]
+    assert get_speculation_metrics()["rate_limited"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_speculate_endpoint_is_opt_in(monkeypatch):
+    calls = []
+    monkeypatch.setitem(cards_api.GENERATION_STRATEGIES, "base_model", make_generator(calls))
+    monkeypatch.setattr(cards_api, "SPECULATION_ENABLED", False)
+    board = make_board("session-g")
+    response = await cards_api.speculate_cards_endpoint(board, "base_model")
+    assert response == {"scheduled": False, "board_digest": board_digest(board)}
+
+    monkeypatch.setattr(cards_api, "SPECULATION_ENABLED", True)
+    assert (await cards_api.speculate_cards_endpoint(board, "base_model"))["scheduled"]
+    await asyncio.sleep(0.01)
+    assert calls == ["Empathy"]
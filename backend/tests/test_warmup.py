@@ -0,0 +1,51 @@
+"""
+Tests for the startup warmup and readiness reporting.
+"""
+import asyncio
+import services.warmup_service as warmup_service
+from config.default_card_types import DEFAULT_SIDEPANEL_CODE
+from services.code_service import get_card_types_from_code, get_card_types_cache_metrics
+
+
+def test_default_card_types_compile_and_are_cached():
+    generation_types = warmup_service.warm_card_types(DEFAULT_SIDEPANEL_CODE)
+    names = {card_class.__name__ for card_class in generation_types}
+    assert "FocusingCard" in names and "Idea" not in names  # Idea is user_only
+
+    hits = get_card_types_cache_metrics()["hits"]
+    _, _, card_types = get_card_types_from_code(DEFAULT_SIDEPANEL_CODE, generation=True)
+    assert list(card_types.values()) == generation_types
+    assert get_card_types_cache_metrics()["hits"] == hits + 1
+
+
+def test_worker_is_ready_only_after_warmup(monkeypatch):
+    monkeypatch.setattr(warmup_service, "LAZY_MODULES", [])
+    monkeypatch.setattr(warmup_service, "STRUCTURED_MODELS", ["test"])
+    monkeypatch.setattr(warmup_service, "load_encoding", lambda: True)
+    opened = asyncio.Event()
+
+    async def open_clients():
+        await opened.wait()
+
+    monkeypatch.setattr(warmup_service, "open_clients", open_clients)
+    monkeypatch.setattr(warmup_service, "WARMUP_ON_STARTUP", True)
+
+    async def scenario():
+        task = warmup_service.start_warmup()
+        await asyncio.sleep(0.05)
+        assert not warmup_service.get_readiness()["ready"]
+        opened.set()
+        await task
+        return warmup_service.get_readiness()
+
+    readiness = asyncio.run(scenario())
+    assert readiness["ready"]
+    assert readiness["errors"] == []
+    assert {"card_types:0", "agents:0", "tokenizer", "clients"} <= set(readiness["timings"])
+
+
+def test_worker_is_ready_immediately_without_warmup(monkeypatch):
+    monkeypatch.setattr(warmup_service, "WARMUP_ON_STARTUP", False)
+    monkeypatch.setitem(warmup_service._state, "ready", False)
+    assert warmup_service.start_warmup() is None
+    assert warmup_service.get_readiness()["ready"]
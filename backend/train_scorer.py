@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Train the distilled fluid type check scorer from the logged LLM verdicts.
+
+Holds out a share of the verdicts, reports how well the scorer agrees with the LLM on
+them, then retrains on every verdict and writes the model used by the server.
+
+Usage:
+    python train_scorer.py [--db data/verdicts.sqlite3] [--output data/fluid_scorer.json]
+                           [--holdout 0.2] [--epochs 10] [--confidence 0.9] [--dry-run]
+"""
+import argparse
+import json
+import random
+import time
+from config.settings import VERDICT_DB_PATH, SCORER_MODEL_PATH, SCORER_CONFIDENCE
+from services.scorer_service import VerdictStore, train, evaluate
+from services.validation_service import MIN_FIELD_SCORE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the distilled fluid type check scorer")
+    parser.add_argument("--db", default=VERDICT_DB_PATH, help="Verdict database to train from")
+    parser.add_argument("--output", default=SCORER_MODEL_PATH, help="Where to write the trained model")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Share of verdicts used for the agreement report")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--confidence", type=float, default=SCORER_CONFIDENCE,
+                        help="Pass probability margin above which the server skips the LLM")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the report, do not write the model")
+    args = parser.parse_args()
+
+    examples = VerdictStore(args.db).examples()
+    if len(examples) < 10:
+        raise SystemExit(f"Only {len(examples)} verdicts in {args.db}, not enough to train")
+
+    random.Random(0).shuffle(examples)
+    split = max(1, int(len(examples) * args.holdout))
+    held_out, training = examples[:split], examples[split:]
+
+    start = time.perf_counter()
+    scorer = train(training, MIN_FIELD_SCORE, epochs=args.epochs)
+    report = {
+        "trained_at": time.time(),
+        "training_examples": len(training),
+        "training_seconds": round(time.perf_counter() - start, 3),
+        "confidence": args.confidence,
+        "holdout": evaluate(scorer, held_out, MIN_FIELD_SCORE, args.confidence),
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.dry_run:
+        return
+    final = train(examples, MIN_FIELD_SCORE, epochs=args.epochs)
+    final.report = report
+    final.save(args.output)
+    print(f"Model trained on {len(examples)} verdicts written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,8 @@
 from .conversion import *
-from .type_checking import *
\ No newline at end of file
+from .type_checking import *
+from .offload import *
+from .observability import *
+from .fast_json import *
+from .compression import *
+from .sqlite import connect as connect_sqlite
+from .dedup import *
\ No newline at end of file
@@ -0,0 +1,238 @@
+"""
+Compact serialization of whiteboard cards for LLM prompts, with token accounting.
+"""
+import json
+import math
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+from models.cards import Card, ReactCard
+from config.settings import BOARD_LAYOUT, BOARD_COORDINATE_QUANTUM, BOARD_GROUP_GAP
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency
+    tiktoken = None
+
+GEOMETRY_FIELDS = ("x", "y", "w", "h")
+# Not useful to the model: images it cannot see, bookkeeping, and the type (rendered as "type")
+_OMITTED_FIELDS = {"id", "card_type", "img_source", "img_token", "createdAt", "repaired_fields", "extra_fields"}
+# Rough characters per token for English prose and JSON
+CHARS_PER_TOKEN = 4
+# The repr baseline used to report the savings is only built for one board in this many
+BASELINE_SAMPLE_EVERY = 20
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_loading = False
+_encoding_loading_lock = threading.Lock()
+_board_metrics = {"boards": 0, "cards": 0, "tokens": 0, "chars": 0}
+# Serialized and repr sizes of the sampled boards
+_baseline_sample = {"boards": 0, "chars": 0, "baseline_chars": 0}
+
+
+@dataclass
+class SerializedBoard:
+    text: str
+    tokens: int  # an estimate: Claude's tokenizer is not available locally
+    tokenized: bool  # counted with the cl100k_base tokenizer rather than from the length
+
+
+def quantize(value: float, quantum: int = BOARD_COORDINATE_QUANTUM) -> int:
+    """Round a coordinate or size to the closest multiple of `quantum`."""
+    return int(round(value / quantum) * quantum) if quantum > 1 else int(round(value))
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _compact(value: Any, quantum: int) -> Any:
+    if isinstance(value, BaseModel):
+        return compact_card(value, quantum)
+    if isinstance(value, (list, tuple)):
+        items = [_compact(item, quantum) for item in value]
+        return [item for item in items if not _is_empty(item)]
+    if isinstance(value, dict):
+        items = {key: _compact(item, quantum) for key, item in value.items()}
+        return {key: item for key, item in items.items() if not _is_empty(item)}
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else round(value, 2)
+    return value
+
+
+def compact_card(card: BaseModel, quantum: int = BOARD_COORDINATE_QUANTUM) -> Dict[str, Any]:
+    """
+    Return a card as a dict without empty or default fields, with its type under "type",
+    its extra fields inlined and its geometry quantized. Nested child cards are compacted too.
+    """
+    compact: Dict[str, Any] = {}
+    if isinstance(card, ReactCard):
+        compact["type"] = card.card_type
+    elif isinstance(card, Card):
+        compact["type"] = type(card).__name__
+
+    for name, field in type(card).model_fields.items():
+        if name in _OMITTED_FIELDS:
+            continue
+        value = getattr(card, name)
+        if _is_empty(value) or (field.default is not PydanticUndefined and value == field.default):
+            continue
+        if name in GEOMETRY_FIELDS and isinstance(value, (int, float)):
+            compact[name] = quantize(value, quantum)
+            continue
+        value = _compact(value, quantum)
+        if not _is_empty(value):
+            compact[name] = value
+
+    for name, value in (getattr(card, "extra_fields", None) or {}).items():
+        if not _is_empty(value) and name not in compact:
+            compact[name] = value
+    return compact
+
+
+def _box(card: Dict[str, Any]) -> Optional[Tuple[int, int, int, int]]:
+    if not all(name in card for name in ("x", "y")):
+        return None
+    return card["x"], card["y"], card["x"] + card.get("w", 0), card["y"] + card.get("h", 0)
+
+
+def _gap(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> int:
+    dx = max(0, max(a[0], b[0]) - min(a[2], b[2]))
+    dy = max(0, max(a[1], b[1]) - min(a[3], b[3]))
+    return max(dx, dy)
+
+
+def group_cards(cards: List[Dict[str, Any]], gap: int = BOARD_GROUP_GAP) -> List[Dict[str, Any]]:
+    """
+    Cluster compacted cards whose boxes are at most `gap` apart, and return one entry per
+    cluster with its bounding area and its cards (without coordinates) in reading order.
+    Cards without a position form a last group without an area.
+    """
+    placed = [(card, _box(card)) for card in cards]
+    boxes = [box for _, box in placed if box is not None]
+    positioned = [card for card, box in placed if box is not None]
+    unplaced = [card for card, box in placed if box is None]
+
+    # Union-find over card pairs; boards hold at most a few hundred cards
+    parent = list(range(len(boxes)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(boxes)):
+        for j in range(i + 1, len(boxes)):
+            if _gap(boxes[i], boxes[j]) <= gap:
+                parent[find(i)] = find(j)
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(boxes)):
+        clusters.setdefault(find(i), []).append(i)
+
+    groups = []
+    for members in clusters.values():
+        members.sort(key=lambda i: (boxes[i][1], boxes[i][0]))
+        x0 = min(boxes[i][0] for i in members)
+        y0 = min(boxes[i][1] for i in members)
+        x1 = max(boxes[i][2] for i in members)
+        y1 = max(boxes[i][3] for i in members)
+        members_cards = [
+            {key: value for key, value in positioned[i].items() if key not in GEOMETRY_FIELDS} for i in members
+        ]
+        groups.append({"area": [x0, y0, x1 - x0, y1 - y0], "cards": members_cards})
+    groups.sort(key=lambda group: (group["area"][1], group["area"][0]))
+    if unplaced:
+        groups.append({"cards": unplaced})
+    return groups
+
+
+def load_encoding() -> bool:
+    """
+    Load tiktoken's cl100k_base encoding. Blocking: it reads, and on a cold cache downloads,
+    its BPE file, so it runs in warmup or a background thread. Returns whether it is available.
+    """
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                if tiktoken is None:
+                    raise ImportError("tiktoken is not installed")
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                # The encoding file could not be loaded (e.g. offline without a cache)
+                print(f"Falling back to token estimates from the length: {e}")
+                _encoding = False
+    return bool(_encoding)
+
+
+def _get_encoding():
+    """Return the encoding if it is loaded. Otherwise start loading it in a background thread and return None."""
+    global _encoding_loading
+    if _encoding is None:
+        with _encoding_loading_lock:
+            start = not _encoding_loading
+            _encoding_loading = True
+        if start:
+            threading.Thread(target=load_encoding, name="tiktoken-load", daemon=True).start()
+    return _encoding or None
+
+
+def count_tokens(text: str) -> Tuple[int, bool]:
+    """
+    Estimate the tokens of a text. With tiktoken's cl100k_base encoding once it is loaded,
+    which is close to but not the Claude tokenizer, otherwise from the text length.
+
+    Returns:
+        (token estimate, whether it was counted with the cl100k_base tokenizer)
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=())), True
+    return math.ceil(len(text) / CHARS_PER_TOKEN), False
+
+
+def serialize_board(
+    cards: Sequence[BaseModel],
+    layout: str = BOARD_LAYOUT,
+    quantum: int = BOARD_COORDINATE_QUANTUM,
+) -> SerializedBoard:
+    """
+    Render cards as compact JSON, one card per line. With the "groups" layout, cards are
+    clustered by position and rendered as groups with a bounding area instead of coordinates.
+    """
+    compacted = [compact_card(card, quantum) for card in cards]
+    entries = group_cards(compacted) if layout == "groups" else compacted
+    lines = [json.dumps(entry, ensure_ascii=False, separators=(",", ":")) for entry in entries]
+    text = "[\n" + ",\n".join(lines) + "\n]" if lines else "[]"
+    tokens, tokenized = count_tokens(text)
+
+    _board_metrics["boards"] += 1
+    _board_metrics["cards"] += len(cards)
+    _board_metrics["tokens"] += tokens
+    _board_metrics["chars"] += len(text)
+    if (_board_metrics["boards"] - 1) % BASELINE_SAMPLE_EVERY == 0:
+        # What the prompts used to contain, to report the savings
+        _baseline_sample["boards"] += 1
+        _baseline_sample["chars"] += len(text)
+        _baseline_sample["baseline_chars"] += len(str(list(cards)))
+    return SerializedBoard(text, tokens, tokenized)
+
+
+def get_board_metrics() -> Dict[str, Any]:
+    """
+    Return board serialization totals and the size reduction over the Python repr, measured
+    on one board in BASELINE_SAMPLE_EVERY.
+    """
+    baseline = _baseline_sample["baseline_chars"]
+    return {
+        **_board_metrics,
+        "layout": BOARD_LAYOUT,
+        "tokenized": bool(_encoding),
+        "baseline_sampled_boards": _baseline_sample["boards"],
+        "size_ratio": _baseline_sample["chars"] / baseline if baseline else None,
+    }
@@ -0,0 +1,116 @@
+"""
+ASGI middleware compressing responses with brotli or gzip.
+"""
+import gzip
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from utils.offload import run_cpu_bound
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+# Content types that are already compressed or not worth compressing
+_SKIPPED_CONTENT_TYPES = ("image/", "video/", "audio/", "application/octet-stream", "application/zip", "text/event-stream")
+
+
+def select_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header, or None."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Compresses complete (non-streaming) responses of at least `minimum_size` bytes with the
+    encoding negotiated from Accept-Encoding. Streaming responses are passed through untouched.
+    Bodies of at least `offload_size` bytes are compressed in the CPU executor.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        offload_size: int = 256 * 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    def _should_compress(self, headers: MutableHeaders, body: bytes, status: int) -> bool:
+        if len(body) < self.minimum_size or status < 200 or status in (204, 304):
+            return False
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return not content_type.startswith(_SKIPPED_CONTENT_TYPES)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = select_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        pending_start: Optional[Message] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal pending_start
+            if message["type"] == "http.response.start":
+                # Hold the headers until we know whether the body is complete
+                pending_start = message
+                return
+            if pending_start is None:
+                await send(message)
+                return
+
+            start, pending_start = pending_start, None
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if (message["type"] != "http.response.body" or message.get("more_body", False)
+                    or not self._should_compress(headers, body, start["status"])):
+                await send(start)
+                await send(message)
+                return
+
+            if len(body) >= self.offload_size:
+                compressed = await run_cpu_bound(self._compress, body, encoding, label="compress")
+            else:
+                compressed = self._compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,46 @@
+"""
+Utilities for near-duplicate detection between short texts.
+"""
+import re
+from typing import FrozenSet, List, Sequence, Tuple
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def shingles(text: str, k: int = 3) -> FrozenSet[Tuple[str, ...]]:
+    """Return the set of k-word shingles of a text, ignoring case and punctuation."""
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) < k:
+        return frozenset([tuple(words)]) if words else frozenset()
+    return frozenset(tuple(words[i:i + k]) for i in range(len(words) - k + 1))
+
+
+def jaccard(a: FrozenSet, b: FrozenSet) -> float:
+    """Jaccard similarity of two sets (1.0 for two empty sets)."""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def find_novel(texts: Sequence[str], threshold: float, seen: Sequence[FrozenSet] = ()) -> Tuple[List[int], List[FrozenSet]]:
+    """
+    Greedily select the texts that are not near-duplicates of an earlier text.
+
+    A text is dropped when its shingle Jaccard similarity with a kept text (or with one of
+    the `seen` shingle sets) is at least `threshold`. Exact pairwise comparison is used:
+    the inputs are a handful of short completions, so MinHash sketches would not pay off.
+
+    Returns:
+        (indices of the kept texts, shingle sets of everything kept including `seen`)
+    """
+    kept_shingles = list(seen)
+    kept_indices = []
+    for index, text in enumerate(texts):
+        text_shingles = shingles(text)
+        if not text_shingles:
+            continue
+        if any(jaccard(text_shingles, other) >= threshold for other in kept_shingles):
+            continue
+        kept_indices.append(index)
+        kept_shingles.append(text_shingles)
+    return kept_indices, kept_shingles
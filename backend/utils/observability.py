@@ -0,0 +1,26 @@
+"""
+Lazy logfire configuration.
+"""
+import threading
+from config.settings import LOGFIRE_ENABLED
+
+_configured = False
+_lock = threading.Lock()
+
+
+def configure_observability() -> None:
+    """
+    Configure logfire and the pydantic-ai instrumentation once per worker.
+    Called right before the first agent run rather than at import time, since
+    both logfire and pydantic-ai are slow to import.
+    """
+    global _configured
+    if _configured or not LOGFIRE_ENABLED:
+        return
+    with _lock:
+        if _configured:
+            return
+        import logfire
+        logfire.configure()
+        logfire.instrument_pydantic_ai()
+        _configured = True
@@ -0,0 +1,131 @@
+"""
+Utilities for running CPU-bound work outside of the event loop.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+from config.settings import CPU_EXECUTOR_MAX_WORKERS, CPU_OFFLOAD_MIN_CARDS
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Per-label counters, exposed through get_offload_metrics()
+_metrics: Dict[str, Dict[str, float]] = {}
+_metrics_lock = threading.Lock()
+
+
+def get_cpu_executor() -> Optional[ThreadPoolExecutor]:
+    """
+    Return the shared executor used for CPU-bound work, creating it on first use.
+    Returns None when offloading is disabled.
+    """
+    global _executor
+    if CPU_EXECUTOR_MAX_WORKERS <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=CPU_EXECUTOR_MAX_WORKERS,
+                thread_name_prefix="butterfly-cpu",
+            )
+        return _executor
+
+
+def shutdown_cpu_executor(wait: bool = True) -> None:
+    """Shut down the shared executor. A new one is created on next use."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait, cancel_futures=not wait)
+            _executor = None
+
+
+def _record(label: str, offloaded: bool, queue_delay: float, run_time: float) -> None:
+    with _metrics_lock:
+        stats = _metrics.setdefault(label, {
+            "inline_calls": 0,
+            "offloaded_calls": 0,
+            "queue_delay_total_ms": 0.0,
+            "queue_delay_max_ms": 0.0,
+            "run_time_total_ms": 0.0,
+        })
+        if offloaded:
+            stats["offloaded_calls"] += 1
+            stats["queue_delay_total_ms"] += queue_delay * 1000
+            stats["queue_delay_max_ms"] = max(stats["queue_delay_max_ms"], queue_delay * 1000)
+        else:
+            stats["inline_calls"] += 1
+        stats["run_time_total_ms"] += run_time * 1000
+
+
+async def run_cpu_bound(
+    func: Callable[..., T],
+    *args: Any,
+    size: Optional[int] = None,
+    label: str = "default",
+    **kwargs: Any
+) -> T:
+    """
+    Run a CPU-bound callable without blocking the event loop.
+
+    Args:
+        func: The synchronous function to run
+        size: Number of cards the call works on. Calls below CPU_OFFLOAD_MIN_CARDS run
+            inline; None means the work is always offloaded (e.g. exec of sidepanel code)
+        label: Name under which queueing delay and run time are reported
+
+    Returns:
+        The return value of func
+    """
+    executor = get_cpu_executor()
+    if executor is None or (size is not None and size < CPU_OFFLOAD_MIN_CARDS):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _record(label, False, 0.0, time.perf_counter() - start)
+
+    submitted = time.perf_counter()
+    timings = {}
+
+    def timed_call() -> T:
+        timings["started"] = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings["finished"] = time.perf_counter()
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(executor, timed_call)
+    finally:
+        if "started" in timings:
+            _record(
+                label,
+                True,
+                timings["started"] - submitted,
+                timings.get("finished", timings["started"]) - timings["started"],
+            )
+
+
+def get_offload_metrics() -> Dict[str, Any]:
+    """
+    Return offload statistics per label, including average and max queueing delay.
+    """
+    with _metrics_lock:
+        labels = {}
+        for label, stats in _metrics.items():
+            offloaded = stats["offloaded_calls"]
+            labels[label] = {
+                **stats,
+                "queue_delay_avg_ms": stats["queue_delay_total_ms"] / offloaded if offloaded else 0.0,
+            }
+    return {
+        "max_workers": CPU_EXECUTOR_MAX_WORKERS,
+        "min_cards_to_offload": CPU_OFFLOAD_MIN_CARDS,
+        "labels": labels,
+    }
@@ -19,6 +19,7 @@ import { useTldrawEvents } from './hooks/useTldrawEvents'
 import { useTldrawRestrictions } from './hooks/useTldrawRestrictions'
 import { useCardTypesInitialization } from './hooks/useCardTypesInitialization'
 import { useAutoSave } from './hooks/useAutoSave'
+import { uploadInlineImages } from './services/cardApiService'
 import { updateCardTypes } from './utils/dynamicCardConfig'
 import { createShapeId } from 'tldraw'
 
@@ -103,8 +104,8 @@ export default function App() {
 	// Auto-initialize card types on app load
 	useCardTypesInitialization(sidepanelCode, handleUpdateTypes)
 
-	// Auto-save whiteboard state every 5 minutes when it changes
-	useAutoSave(editor, intention, sessionDuration)
+	// Auto-save whiteboard state every 10 seconds when it changes
+	useAutoSave(editor, intention, sessionDuration, sidepanelCode)
 
 	// Create buffered cards when session ends
 	React.useEffect(() => {
@@ -200,6 +201,8 @@ export default function App() {
 
 					editor.createShapes(shapesToCreate)
 					console.log(`Loaded ${boardState.cards.length} cards from file`)
+					// Boards saved with inline images are uploaded once, then referenced
+					uploadInlineImages(editor)
 				}
 			} catch (error) {
 				console.error('Error loading board state:', error)
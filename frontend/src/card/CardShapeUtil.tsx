@@ -14,7 +14,7 @@ import { getSelectedCardType } from './card-state'
 import { getCardTypeColor, getCardTypeLayout } from '../utils/dynamicCardConfig'
 import classes from '../styles/card.module.css'
 import { useSessionContext } from '../contexts/SessionContext'
-import { performFluidTypeChecking, generateImageForCard } from '../services/cardApiService'
+import { performFluidTypeChecking, generateImageForCard, cardImageUrl } from '../services/cardApiService'
 
 // Session start time for consistent timestamp calculation
 const SESSION_START_TIME = Date.now()
@@ -416,7 +416,7 @@ export class CardShapeUtil extends ShapeUtil<ICardShape> {
 					{layout.image && shape.props.img_source && (
 						<Image
 							alt="Card image"
-							src={shape.props.img_source}
+							src={cardImageUrl(shape.props.img_source)}
 							style={{
 								width: '100%',
 								maxHeight: '150px',
@@ -1,31 +1,47 @@
 import { useEffect, useRef } from 'react'
 import { Editor } from 'tldraw'
+import { SESSION_ID } from '../utils/constants'
+import { applyImageRefs } from '../services/cardApiService'
 
-interface BoardState {
-  intention: string
-  sessionDuration: number
-  timestamp: string
-  cards: any[]
+const SESSIONS_URL = 'http://localhost:8000/sessions'
+const SPECULATE_URL = 'http://localhost:8000/speculate?strategy=base_model'
+const SAVE_INTERVAL_MS = 10 * 1000
+// Speculate only once the board has stopped changing for this long (the backend also
+// rate-limits speculation per session and only runs it when enabled)
+const SPECULATION_IDLE_MS = 30 * 1000
+
+interface SessionSummary {
+  session_id: string
+  seq: number
+  card_count: number
+  image_refs: Record<string, string>
 }
 
 export const useAutoSave = (
   editor: Editor | null,
   intention: string,
-  sessionDuration: number
+  sessionDuration: number,
+  sidepanelCode: string
 ) => {
-  const lastStateRef = useRef<string>('')
+  // The last saved cards are kept to send only what changed
+  const savedCardsRef = useRef<Map<string, string> | null>(null)
+  const seqRef = useRef<number>(0)
+  const savingRef = useRef<boolean>(false)
   const intervalRef = useRef<NodeJS.Timeout | null>(null)
+  const lastChangeRef = useRef<number>(Date.now())
+  const speculatedRef = useRef<boolean>(false)
 
-  const getBoardState = (): BoardState | null => {
-    if (!editor) return null
+  const getCards = (): any[] => {
+    if (!editor) return []
 
     // Get all shapes from current page
     const shapes = editor.getCurrentPageShapes()
-    const cards = shapes
+    return shapes
       .filter(shape => shape.type === 'card')
       .map(shape => {
         const props = shape.props as any
         return {
+          id: shape.id,
           w: props.w || 300,
           h: props.h || 300,
           x: shape.x,
@@ -39,78 +55,97 @@ export const useAutoSave = (
           createdAt: props.createdAt || Math.floor(Date.now() / 1000)
         }
       })
-
-    return {
-      intention,
-      sessionDuration,
-      timestamp: new Date().toISOString(),
-      cards
-    }
   }
 
-  const saveToFile = async (boardState: BoardState) => {
-    try {
-      const dataStr = JSON.stringify(boardState, null, 2)
-      const timestamp = new Date().toISOString().replace(/[:.]/g, '-')
-      const filename = `butterfly-auto-save-${timestamp}.json`
-      
-      // For browser environment, we'll save to downloads folder
-      // since we can't directly write to specific folders
-      const dataBlob = new Blob([dataStr], { type: 'application/json' })
-      const url = URL.createObjectURL(dataBlob)
-      const link = document.createElement('a')
-      link.href = url
-      link.download = filename
-      link.style.display = 'none'
-      document.body.appendChild(link)
-      link.click()
-      document.body.removeChild(link)
-      URL.revokeObjectURL(url)
-      
-      console.log(`Auto-saved whiteboard state to ${filename}`)
-    } catch (error) {
-      console.error('Failed to auto-save whiteboard state:', error)
-    }
+  const post = async (path: string, body: object): Promise<Response> => {
+    return fetch(`${SESSIONS_URL}/${SESSION_ID}/${path}`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(body),
+    })
   }
 
-  const checkAndSave = () => {
-    const currentState = getBoardState()
-    if (!currentState) return
+  // Once the board is idle, let the backend start generating for it, so the next generation is instant
+  const speculateIfIdle = (cards: any[]) => {
+    if (speculatedRef.current || Date.now() - lastChangeRef.current < SPECULATION_IDLE_MS) return
+    if (!intention || !sidepanelCode) return
+    speculatedRef.current = true
+    fetch(SPECULATE_URL, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        cards: cards.map(({ id, ...card }) => card),
+        sidepanel_code: sidepanelCode,
+        intention,
+        session_id: SESSION_ID,
+      }),
+    }).catch(error => console.error('Failed to start speculative generation:', error))
+  }
 
-    const currentStateStr = JSON.stringify(currentState.cards)
-    
-    // Only save if the state has changed
-    if (currentStateStr !== lastStateRef.current) {
-      lastStateRef.current = currentStateStr
-      saveToFile(currentState)
+  const saveSnapshot = async (cards: any[]): Promise<boolean> => {
+    const response = await post('snapshot', { cards, intention })
+    if (!response.ok) {
+      console.error('Failed to save session snapshot:', response.status, await response.text())
+      return false
     }
+    const summary: SessionSummary = await response.json()
+    seqRef.current = summary.seq
+    if (editor) applyImageRefs(editor, summary.image_refs)
+    return true
   }
 
-  useEffect(() => {
-    if (!editor) return
+  const checkAndSave = async () => {
+    if (!editor || savingRef.current) return
+    savingRef.current = true
+    try {
+      const cards = getCards()
+      const current = new Map(cards.map(card => [card.id, JSON.stringify(card)]))
+      const saved = savedCardsRef.current
 
-    // Set up interval to check every 5 minutes (300,000 ms)
-    intervalRef.current = setInterval(checkAndSave, 5 * 60 * 1000)
+      if (saved === null) {
+        if (await saveSnapshot(cards)) savedCardsRef.current = current
+        return
+      }
 
-    // Initial state capture
-    const initialState = getBoardState()
-    if (initialState) {
-      lastStateRef.current = JSON.stringify(initialState.cards)
-    }
+      const upserts = cards.filter(card => saved.get(card.id) !== current.get(card.id))
+      const deletes = Array.from(saved.keys()).filter(id => !current.has(id))
+      if (upserts.length === 0 && deletes.length === 0) {
+        speculateIfIdle(cards)
+        return
+      }
+      lastChangeRef.current = Date.now()
+      speculatedRef.current = false
 
-    return () => {
-      if (intervalRef.current) {
-        clearInterval(intervalRef.current)
+      const response = await post('deltas', { upserts, deletes, intention, base_seq: seqRef.current })
+      if (response.status === 409) {
+        // Another tab or a lost response moved the session on; resync with the full board
+        if (await saveSnapshot(cards)) savedCardsRef.current = current
+        return
+      }
+      if (!response.ok) {
+        console.error('Failed to save session delta:', response.status, await response.text())
+        return
       }
+      const summary: SessionSummary = await response.json()
+      seqRef.current = summary.seq
+      applyImageRefs(editor, summary.image_refs)
+      savedCardsRef.current = current
+    } catch (error) {
+      console.error('Failed to auto-save whiteboard state:', error)
+    } finally {
+      savingRef.current = false
     }
-  }, [editor, intention, sessionDuration])
+  }
 
-  // Cleanup on unmount
   useEffect(() => {
+    if (!editor) return
+
+    intervalRef.current = setInterval(checkAndSave, SAVE_INTERVAL_MS)
+
     return () => {
       if (intervalRef.current) {
         clearInterval(intervalRef.current)
       }
     }
-  }, [])
-}
\ No newline at end of file
+  }, [editor, intention, sessionDuration, sidepanelCode])
+}
@@ -1,6 +1,6 @@
 import { Editor, createShapeId } from 'tldraw'
 import { GeneratedCard } from '../types/session'
-import { SESSION_START_TIME } from '../utils/constants'
+import { SESSION_START_TIME, SESSION_ID } from '../utils/constants'
 
 // Types for fluid type checking
 interface FluidTypeCheckingRequest {
@@ -25,9 +25,44 @@ interface FluidTypeCheckingResponse {
 	field_scores: Record<string, { score: number; reasoning: string }>
 }
 
+// Upload inline base64 images once and point their cards at the stored copy, so that
+// requests carry short image references instead of the image data
+export async function uploadInlineImages(editor: Editor): Promise<void> {
+	const shapes = editor.getCurrentPageShapes()
+		.filter(shape => shape.type === 'card' && ((shape.props as any).img_source || '').startsWith('data:'))
+	for (const shape of shapes) {
+		try {
+			const response = await fetch('http://localhost:8000/images', {
+				method: 'POST',
+				body: (shape.props as any).img_source,
+			})
+			if (!response.ok) {
+				console.error('Image upload error:', response.status, await response.text())
+				continue
+			}
+			const { url } = await response.json()
+			editor.updateShape({ id: shape.id, type: 'card', props: { img_source: url } })
+		} catch (error) {
+			console.error('Error uploading inline image:', error)
+		}
+	}
+}
+
+// Point cards at the image references the backend stored their inline images under
+export function applyImageRefs(editor: Editor, imageRefs: Record<string, string>): void {
+	for (const [id, url] of Object.entries(imageRefs)) {
+		const shape = editor.getShape(id as any)
+		if (shape && ((shape.props as any).img_source || '').startsWith('data:')) {
+			editor.updateShape({ id: shape.id, type: 'card', props: { img_source: url } })
+		}
+	}
+}
+
 // API function to generate cards
 export async function generateCard(editor: Editor, sidepanelCode: string, intention: string): Promise<GeneratedCard[] | null> {
 	try {
+		await uploadInlineImages(editor)
+
 		// Get current cards from the editor
 		const shapes = editor.getCurrentPageShapes()
 		const cards = shapes
@@ -52,7 +87,8 @@ export async function generateCard(editor: Editor, sidepanelCode: string, intent
 		const requestBody = { 
 			cards,
 			sidepanel_code: sidepanelCode,
-			intention: intention
+			intention: intention,
+			session_id: SESSION_ID
 		}
 		
 		console.log('Sending request to backend:', requestBody)
@@ -178,4 +214,15 @@ export async function generateImageForCard(prompt: string): Promise<string | nul
 		console.error('Error generating image:', error)
 		return null
 	}
-}
\ No newline at end of file
+}
+
+// Image store references end with /images/<sha256>, whatever base URL the backend is configured with
+const IMAGE_REF_PATTERN = /\/images\/[0-9a-f]{64}$/
+
+// Images served by the backend are requested as card-sized variants, in the best format the browser accepts
+export function cardImageUrl(src: string): string {
+	if (IMAGE_REF_PATTERN.test(src)) {
+		return `${src}?w=512&format=auto`
+	}
+	return src
+}
@@ -1,6 +1,9 @@
 // Session start time for calculating relative timestamps
 export const SESSION_START_TIME = Date.now()
 
+// Identifies this board on the backend (autosave, speculative generation, cancellation)
+export const SESSION_ID = crypto.randomUUID()
+
 // Default session configuration
 export const DEFAULT_SESSION_DURATION = 10 // in minutes
 export const CARD_POSITION_MARGIN = 5 // Margin for card positioning